@@ -0,0 +1,8 @@
+from change_capture import ChangeExporter, handle_stream_event
+from topic_schemas import ENV_SCHEMA
+
+# Appends the ENV table's stream records to the data lake as Parquet (see change_capture)
+exporter = ChangeExporter(ENV_SCHEMA)
+
+def lambda_handler(event, context):
+    return handle_stream_event(exporter, event)
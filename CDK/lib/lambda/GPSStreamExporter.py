@@ -0,0 +1,8 @@
+from change_capture import ChangeExporter, handle_stream_event
+from topic_schemas import GPS_SCHEMA
+
+# Appends the GPS table's stream records to the data lake as Parquet (see change_capture)
+exporter = ChangeExporter(GPS_SCHEMA)
+
+def lambda_handler(event, context):
+    return handle_stream_event(exporter, event)
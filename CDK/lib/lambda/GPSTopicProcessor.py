@@ -1,47 +1,24 @@
-import json
-import boto3
-from datetime import datetime
-from decimal import Decimal
+from batch_writer import BatchWriter
+from dedup import MessageDeduplicator
+from gps_buckets import BucketedGpsWriter, GPS_STORAGE_MODE
+from ingestion import handle_event
+from metrics import MetricsRecorder
+from topic_schemas import GPS_SCHEMA
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('GpsDataTable')
+# Batched writer for the GPS table (25-item BatchWriteItem chunks), or with
+# GPS_STORAGE_MODE=bucketed one packed item per elk per time bucket
+if GPS_STORAGE_MODE == 'bucketed':
+    writer = BucketedGpsWriter(GPS_SCHEMA.table_name)
+else:
+    writer = BatchWriter(GPS_SCHEMA.table_name)
 
-def lambda_handler(event, context):
-    # Log the entire incoming event to understand its structure
-    print(f"Received event: {json.dumps(event)}")
-    
-    # Safely access 'payload' and 'topic' from the event (since IoT Core sends data inside 'payload')
-    payload = event.get('payload', [])  # Extract GPS data list from 'payload'
-    topic = event.get('topic', 'unknown_topic')  # Extract 'topic'
-    timestamp = datetime.utcnow().isoformat()
-
-    # Check if payload contains GPS data
-    if payload:
-        try:
-            for gps_data in payload:
-                # Extract the individual elk data (lat, lon, elk_id)
-                elk_id = gps_data.get('elk_id')
-                lat = gps_data.get('lat')
-                lon = gps_data.get('lon')
+# Warm-container LRU of recent messageIds, backed by conditional marker writes
+dedup = MessageDeduplicator(GPS_SCHEMA.table_name)
 
-                # Convert float values to Decimal for DynamoDB
-                lat = Decimal(str(lat))
-                lon = Decimal(str(lon))
-                
-                # Store each elk's data in DynamoDB
-                table.put_item(
-                    Item={
-                        'ElkId': str(elk_id),  # Store elk_id as string
-                        'Topic': topic,
-                        'Timestamp': str(timestamp),
-                        'Latitude': lat,
-                        'Longitude': lon
-                    }
-                )
-                print(f"✅ ElkId {elk_id} GPS data written to DynamoDB (from IoT Topic: {topic})")
+# Device->Lambda lag, conversion time and write latency histograms (EMF)
+metrics = MetricsRecorder(GPS_SCHEMA.name)
 
-        except Exception as e:
-            print(f"Error storing data in DynamoDB: {str(e)}")
-    else:
-        print("No GPS data found in the event.")
+def lambda_handler(event, context):
+    # Validate, convert and store the payload using the GPS field schema
+    # (full events are logged for a sample of invocations and on errors, see structured_log)
+    return handle_event(GPS_SCHEMA, event, writer, dedup, metrics)
@@ -0,0 +1,8 @@
+from change_capture import ChangeExporter, handle_stream_event
+from topic_schemas import HEA_SCHEMA
+
+# Appends the HEA table's stream records to the data lake as Parquet (see change_capture)
+exporter = ChangeExporter(HEA_SCHEMA)
+
+def lambda_handler(event, context):
+    return handle_stream_event(exporter, event)
@@ -1,75 +1,23 @@
-import json
-import boto3
-import decimal
-from datetime import datetime
-from decimal import Decimal
-import traceback  # Added for better debugging
+from batch_writer import BatchWriter
+from dedup import MessageDeduplicator
+from health_stats import HealthAnomalyDetector
+from ingestion import handle_event
+from metrics import MetricsRecorder
+from topic_schemas import HEA_SCHEMA
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('HeaDataTable')  # Use the table for elk health data
+# Batched writer for the HEA table (25-item BatchWriteItem chunks)
+writer = BatchWriter(HEA_SCHEMA.table_name)
 
-# Safe Decimal conversion function
-def safe_decimal(value, default=0):
-    """Convert to Decimal safely, defaulting to a given value if conversion fails."""
-    try:
-        return Decimal(str(value))
-    except (ValueError, TypeError, decimal.InvalidOperation):
-        return Decimal(default)  # Default to 0 if invalid
+# Warm-container LRU of recent messageIds, backed by conditional marker writes
+dedup = MessageDeduplicator(HEA_SCHEMA.table_name)
 
-def lambda_handler(event, context):
-    # Log the entire incoming event to understand its structure
-    print(f"Received event: {json.dumps(event)}")
-    
-    # Safely access 'payload' and 'topic' from the event
-    payload = event.get('payload', [])  # Extract elk health data list
-    topic = event.get('topic', 'unknown_topic')  # Extract 'topic'
-    
-    # Check if payload contains elk health data
-    if payload:
-        try:
-            for elk_data in payload:
-                # Extract the individual elk's health data
-                sensor_id = elk_data.get('sensor_id')
-                elk_id = elk_data.get('elk_id')
-                timestamp = str(elk_data.get('timestamp'))  # Ensure this is a string!
-                
-                # Log values before storing
-                print(f"Processing ElkId {elk_id}:")
-                print(f"  - BodyTemperature: {elk_data.get('body_temperature')}")
-                print(f"  - HeartRate: {elk_data.get('heart_rate')}")
-                print(f"  - RespirationRate: {elk_data.get('respiration_rate')}")
-                print(f"  - ActivityLevel: {elk_data.get('activity_level')}")
-                print(f"  - HydrationLevel: {elk_data.get('hydration_level')}")
-                print(f"  - StressLevel: {elk_data.get('stress_level')}")
-
-                # Convert values safely
-                body_temperature = safe_decimal(elk_data.get('body_temperature'))
-                heart_rate = safe_decimal(elk_data.get('heart_rate'))
-                respiration_rate = safe_decimal(elk_data.get('respiration_rate'))
-                activity_level = safe_decimal(elk_data.get('activity_level'))
-                hydration_level = safe_decimal(elk_data.get('hydration_level'))
-                stress_level = safe_decimal(elk_data.get('stress_level'))
+# Device->Lambda lag, conversion time and write latency histograms (EMF)
+metrics = MetricsRecorder(HEA_SCHEMA.name)
 
-                # Store each elk's health data in DynamoDB
-                table.put_item(
-                    Item={
-                        'SensorId': str(sensor_id),  # Ensure this matches your table PK
-                        'ElkId': str(elk_id),  # Ensure IDs are stored as strings
-                        'Topic': topic,
-                        'Timestamp': timestamp,  # Ensure timestamp is stored as a string
-                        'BodyTemperature': body_temperature,
-                        'HeartRate': heart_rate,
-                        'RespirationRate': respiration_rate,
-                        'ActivityLevel': activity_level,
-                        'Posture': elk_data.get('posture', 'Unknown'),  # Default to 'Unknown' if missing
-                        'HydrationLevel': hydration_level,
-                        'StressLevel': stress_level
-                    }
-                )
-                print(f"✅ ElkId {elk_id} health data written to DynamoDB (from IoT Topic: {topic})")
+# Running per-elk vitals statistics; flags deviations on the items before they are written
+detector = HealthAnomalyDetector(HEA_SCHEMA.table_name, writer)
 
-        except Exception as e:
-            print(f"Error storing data in DynamoDB: {traceback.format_exc()}")  # Full error traceback
-    else:
-        print("No elk health data found in the event.")
+def lambda_handler(event, context):
+    # Validate, convert and store the payload using the HEA field schema
+    # (full events are logged for a sample of invocations and on errors, see structured_log)
+    return handle_event(HEA_SCHEMA, event, writer, dedup, metrics, detector.process)
@@ -0,0 +1,158 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+from structured_log import get_logger
+
+# DynamoDB limits a single BatchWriteItem call to 25 put/delete requests
+MAX_BATCH_SIZE = 25
+MAX_WORKERS = 4  # Number of chunks submitted in parallel
+MAX_RETRIES = 5  # Attempts per chunk before the remaining items are dropped
+BASE_BACKOFF_SECONDS = 0.05
+MAX_BACKOFF_SECONDS = 1.0
+
+# Errors worth retrying: the whole chunk is resubmitted after a backoff
+RETRYABLE_ERRORS = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+}
+
+# The low-level client is thread safe (the resource API is not), so all chunks share it
+dynamodb_client = boto3.client('dynamodb')
+serializer = TypeSerializer()
+logger = get_logger('batch_writer')
+
+# Reused across warm invocations so we don't pay for thread start-up on every message
+executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+
+class BatchWriteStats:
+    """Per-invocation counters for a batched write.
+
+    failed holds the indexes (into the list passed to write()) of items that
+    were dropped, so callers can map failures back to the messages they came from.
+    """
+
+    def __init__(self):
+        self.written = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = set()
+
+    def add(self, written, retried, dropped):
+        self.written += written
+        self.retried += retried
+        self.dropped += dropped
+
+    def as_dict(self):
+        return {'written': self.written, 'retried': self.retried, 'dropped': self.dropped}
+
+
+def chunk_items(items, size=MAX_BATCH_SIZE):
+    """Split a list of items into BatchWriteItem sized chunks."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt)))
+
+
+class BatchWriter:
+    """Writes items to one DynamoDB table using parallel 25-item BatchWriteItem calls.
+
+    UnprocessedItems are retried with backoff; anything still unprocessed after
+    MAX_RETRIES attempts is counted as dropped rather than raising, so one hot
+    partition can't fail the whole message.
+    """
+
+    def __init__(self, table_name, client=None, pool=None, max_retries=MAX_RETRIES, sleep=time.sleep,
+                 key_names=('SensorId', 'Timestamp')):
+        self.table_name = table_name
+        self.client = client or dynamodb_client
+        self.pool = pool or executor
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.key_names = key_names
+
+    def write(self, items):
+        """Write a list of python-typed items (Decimal, str, ...) and return the counters."""
+        stats = BatchWriteStats()
+        if not items:
+            return stats
+
+        # BatchWriteItem rejects a call that puts the same key twice, so the last
+        # item for a key wins, just like consecutive put_item calls would
+        latest = {}
+        for index, item in enumerate(items):
+            latest[self.key_of(item)] = index
+        indexes = {}
+        requests = []
+        for key, index in latest.items():
+            indexes[key] = index
+            requests.append({'PutRequest': {'Item': self.serialize(items[index])}})
+        stats.written += len(items) - len(requests)  # Superseded by a later item for the same key
+
+        chunks = chunk_items(requests)
+        if len(chunks) == 1:
+            results = [self.write_chunk(chunks[0])]
+        else:
+            results = self.pool.map(self.write_chunk, chunks)
+        for written, retried, dropped in results:
+            stats.add(written, retried, len(dropped))
+            for request in dropped:
+                stats.failed.add(indexes[self.key_of_request(request)])
+
+        if stats.failed:
+            # Items superseded by a dropped item for the same key are lost too
+            failed_keys = {self.key_of(items[index]) for index in stats.failed}
+            for index, item in enumerate(items):
+                if index not in stats.failed and self.key_of(item) in failed_keys:
+                    stats.failed.add(index)
+                    stats.written -= 1
+                    stats.dropped += 1
+        return stats
+
+    def key_of(self, item):
+        return tuple(str(item.get(name)) for name in self.key_names)
+
+    def key_of_request(self, request):
+        item = request['PutRequest']['Item']
+        return tuple(str(next(iter(item[name].values()))) if name in item else 'None' for name in self.key_names)
+
+    @staticmethod
+    def serialize(item):
+        return {key: serializer.serialize(value) for key, value in item.items()}
+
+    def write_chunk(self, requests):
+        """Submit one chunk, retrying UnprocessedItems. Returns (written, retried, dropped requests)."""
+        pending = requests
+        retried = 0
+
+        for attempt in range(self.max_retries):
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: pending})
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                if code not in RETRYABLE_ERRORS:
+                    logger.error('BatchWriteItem failed, dropping %d items', len(pending), table=self.table_name, code=code, error=str(e))
+                    return len(requests) - len(pending), retried, pending
+                unprocessed = pending
+            else:
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+
+            if not unprocessed:
+                return len(requests), retried, []
+
+            if attempt + 1 < self.max_retries:
+                retried += len(unprocessed)
+                self.sleep(backoff_delay(attempt))
+            pending = unprocessed
+
+        logger.warning('Dropping %d items after %d attempts', len(pending), self.max_retries, table=self.table_name)
+        return len(requests) - len(pending), retried, pending
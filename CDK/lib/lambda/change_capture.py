@@ -0,0 +1,182 @@
+import io
+import os
+import sys
+import time
+
+import boto3
+from structured_log import get_logger
+
+try:
+    from incremental_export import record_item
+    from parquet_output import COMPRESSION, TABLE_COLUMNS, arrow_schema, table_rows
+except ImportError:  # Run from a checkout (the local stand-ins): the shared modules live with the Glue scripts
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+    from incremental_export import record_item
+    from parquet_output import COMPRESSION, TABLE_COLUMNS, arrow_schema, table_rows
+
+# Change-data-capture path into the data lake: the <PREFIX>StreamExporter functions
+# read the tables' DynamoDB Streams in micro-batches (the event source mapping's batch
+# size and batching window bound the latency) and append each batch as snappy Parquet
+# to the same prefixes the Glue jobs write:
+#   s3://<results bucket>/gps_data/dt=2024-09-30/cdc-<first>-<last>.snappy.parquet
+# Stream records are read like incremental export records and typed into the same columns
+# (scripts/incremental_export.py and scripts/parquet_output.py, bundled with these
+# functions, see glue-job-factory.ts), so both land in one crawled table.
+# A file is named after the sequence numbers of the first and last stream record with
+# rows in it and lists all of them in its Parquet metadata. Once it is written, the
+# partition's other cdc files holding any of the same stream records are deleted: they
+# were written by a failed attempt at those records, whether retried whole (same name,
+# overwritten) or bisected into smaller batches. Sequence ranges of different shards may
+# interleave, so a file whose range merely overlaps is only deleted if its list matches.
+# A Glue rebuild (--export_mode full) replaces the whole prefix, stream files included:
+# disable the event source mapping while it runs, the stream holds changes for 24 hours.
+#
+#   OUTPUT_PATH     s3://<results bucket>/gps_data/
+#   PARTITION_KEYS  'dt' (default) or 'dt,SensorId', as the Glue jobs' --partition_keys
+OUTPUT_PATH = os.environ.get('OUTPUT_PATH', '')
+PARTITION_KEYS = os.environ.get('PARTITION_KEYS', 'dt')
+FILE_PREFIX = 'cdc-'
+SEQUENCE_METADATA = b'cdc_sequence_numbers'
+
+
+def sequence_range(key):
+    """'.../cdc-<first>-<last>.snappy.parquet' -> (first, last) as ints, or None for other files."""
+    name = key.rsplit('/', 1)[-1]
+    if not name.startswith(FILE_PREFIX):
+        return None
+    first, _, last = name[len(FILE_PREFIX):].split('.', 1)[0].partition('-')
+    return (int(first), int(last)) if first.isdigit() and last.isdigit() else None
+
+
+class ParquetFileWriter:
+    """Encodes rows as one Parquet file (pyarrow, from the AWS SDK for pandas layer)."""
+
+    def __init__(self, table_name, names, compression=COMPRESSION):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        table_schema = arrow_schema(table_name)
+        self.schema = pyarrow.schema([table_schema.field(name) for name in names])
+        self.compression = compression
+
+    def encode(self, rows, sequences):
+        names = self.schema.names
+        data = {name: [row[i] for row in rows] for i, name in enumerate(names)}
+        schema = self.schema.with_metadata({SEQUENCE_METADATA: ','.join(sequences).encode()})
+        table = self.pyarrow.Table.from_pydict(data, schema=schema)
+        buffer = io.BytesIO()
+        self.parquet.write_table(table, buffer, compression=self.compression)
+        return buffer.getvalue()
+
+    def sequences(self, body):
+        """The stream sequence numbers listed in a file written by encode (empty for other files)."""
+        metadata = self.parquet.read_metadata(io.BytesIO(body)).metadata or {}
+        return set(filter(None, metadata.get(SEQUENCE_METADATA, b'').decode().split(',')))
+
+
+class ChangeExporter:
+    """Turns one batch of stream records into Parquet files, one per partition."""
+
+    def __init__(self, schema, output_path=OUTPUT_PATH, partition_keys=PARTITION_KEYS, s3=None, file_writer=None,
+                 clock=time.time):
+        self.schema = schema
+        self.bucket, _, self.prefix = output_path[len('s3://'):].partition('/')
+        self.partition_keys = [key.strip() for key in partition_keys.split(',') if key.strip()]
+        self.s3 = s3 or boto3.client('s3')
+        self.clock = clock
+        columns = [name for name, _ in TABLE_COLUMNS[schema.table_name]] + ['dt']  # As parquet_output.table_rows
+        self.partition_columns = [columns.index(name) for name in self.partition_keys]
+        self.file_columns = [i for i, name in enumerate(columns) if name not in self.partition_keys]
+        names = [columns[i] for i in self.file_columns]
+        self.sort_columns = [names.index(name) for name in ('SensorId', 'Timestamp') if name in names]
+        self.file_writer = file_writer or ParquetFileWriter(schema.table_name, names)
+        self.logger = get_logger(f"{schema.name}StreamExporter")
+
+    def partitions(self, stream_records):
+        """{(key=value, ...): ([row tuple in file column order, ...], [sequence number, ...])}
+
+        The sequence numbers are those of the stream records with rows in the partition, in stream order.
+        """
+        partitions = {}
+        for stream_record in stream_records:
+            change = stream_record['dynamodb']
+            # Deletes and bookkeeping items give no item, GPS bucket items only their newly appended chunks
+            item = record_item(change)
+            if item is None:
+                continue
+            sequence = change['SequenceNumber']
+            for row in table_rows(self.schema.table_name, item):
+                key = tuple(f"{name}={row[i]}" for name, i in zip(self.partition_keys, self.partition_columns))
+                rows, sequences = partitions.setdefault(key, ([], []))
+                rows.append(tuple(row[i] for i in self.file_columns))
+                if not sequences or sequences[-1] != sequence:
+                    sequences.append(sequence)
+        return partitions
+
+    def object_key(self, partition, name):
+        return '/'.join([self.prefix.rstrip('/'), *partition, name]).lstrip('/')
+
+    def overlapping(self, partition, sequences):
+        """Keys of the partition's cdc files holding rows of any of these stream records."""
+        first, last = int(sequences[0]), int(sequences[-1])
+        wanted = set(sequences)
+        request = {'Bucket': self.bucket, 'Prefix': self.object_key(partition, FILE_PREFIX)}
+        keys = []
+        while True:
+            response = self.s3.list_objects_v2(**request)
+            for entry in response.get('Contents', []):
+                span = sequence_range(entry['Key'])
+                if not span or span[1] < first or last < span[0]:
+                    continue
+                body = self.s3.get_object(Bucket=self.bucket, Key=entry['Key'])['Body'].read()
+                if self.file_writer.sequences(body) & wanted:
+                    keys.append(entry['Key'])
+            if not response.get('IsTruncated'):
+                return keys
+            request['ContinuationToken'] = response['NextContinuationToken']
+
+    def export(self, stream_records):
+        """Write one batch. Returns a summary; raises if a file couldn't be written (the batch is retried)."""
+        if not stream_records:
+            return {'records': 0, 'rows': 0, 'files': 0}
+        files = 0
+        written = 0
+        replaced = 0
+        for partition, (rows, sequences) in sorted(self.partitions(stream_records).items()):
+            rows.sort(key=lambda row: [row[i] for i in self.sort_columns])  # As the Glue jobs sort their files
+            body = self.file_writer.encode(rows, sequences)
+            key = self.object_key(partition, f"{FILE_PREFIX}{sequences[0]}-{sequences[-1]}.{COMPRESSION}.parquet")
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body)
+            files += 1
+            written += len(rows)
+            # Only once the new file is in place, so readers may briefly see duplicates but never a gap
+            for stale in self.overlapping(partition, sequences):
+                if stale != key:
+                    self.s3.delete_object(Bucket=self.bucket, Key=stale)
+                    replaced += 1
+        oldest = min(record['dynamodb'].get('ApproximateCreationDateTime', self.clock()) for record in stream_records)
+        return {'records': len(stream_records), 'rows': written, 'files': files, 'replaced': replaced,
+                'lag_seconds': round(self.clock() - oldest, 1)}
+
+
+def handle_stream_event(exporter, event):
+    """Lambda entry point for a DynamoDB Streams batch.
+
+    On failure the whole batch is reported as failed from its first record, so the
+    event source retries it (bisecting on repeated errors); the files a failed attempt
+    left behind are replaced by the retry's (see ChangeExporter.overlapping).
+    """
+    records = event.get('Records', [])
+    logger = exporter.logger
+    logger.begin(event)
+    try:
+        summary = exporter.export(records)
+        logger.info('Exported %s change records', summary['records'], **summary)
+        return {'batchItemFailures': []}
+    except Exception as e:
+        logger.error('Change export failed', error=str(e))
+        return {'batchItemFailures': [{'itemIdentifier': records[0]['dynamodb']['SequenceNumber']}]}
+    finally:
+        logger.end()
@@ -0,0 +1,135 @@
+import os
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+from batch_writer import dynamodb_client
+from structured_log import get_logger
+
+# Marker items share the topic's table; the prefix keeps them clear of real sensor ids
+MESSAGE_MARKER_PREFIX = '__msg__#'
+MESSAGE_MARKER_SORT_KEY = 'message'
+
+DEFAULT_CACHE_SIZE = int(os.environ.get('DEDUP_CACHE_SIZE', '10000'))
+# Markers expire through the table's TTL attribute (ExpiresAt) once redeliveries are no longer possible
+DEFAULT_MARKER_TTL_SECONDS = int(os.environ.get('DEDUP_MARKER_TTL_SECONDS', str(24 * 60 * 60)))
+# Until its items are written a marker only holds for this long (above the topic processors'
+# 30 s timeout): if the invocation dies in between, a redelivery after that is processed again
+DEFAULT_CLAIM_SECONDS = int(os.environ.get('DEDUP_CLAIM_SECONDS', '60'))
+BATCH_SIZE = 25  # BatchWriteItem limit
+
+logger = get_logger('dedup')
+
+
+def is_message_marker(item):
+    """True for the dedup marker items, so readers/exports can skip them."""
+    return str(item.get('SensorId', '')).startswith(MESSAGE_MARKER_PREFIX)
+
+
+class MessageDeduplicator:
+    """Suppresses redelivered messages using the transmitter's messageId.
+
+    A bounded LRU of recently seen ids in the warm container answers most
+    redeliveries without any I/O. On a cache miss, a conditional put of a
+    marker item is the durable check, so duplicates that land on a cold or
+    different container are still caught.
+
+    claim() writes the marker with a short expiry (claim_seconds) and complete()
+    extends it to ttl_seconds once the message's items are written. A marker
+    whose ExpiresAt has passed no longer counts (TTL deletion lags by hours), so
+    a message claimed by an invocation that timed out or crashed before writing
+    is processed again when it is redelivered.
+    """
+
+    def __init__(self, table_name, capacity=DEFAULT_CACHE_SIZE, ttl_seconds=DEFAULT_MARKER_TTL_SECONDS, client=None,
+                 claim_seconds=DEFAULT_CLAIM_SECONDS, clock=time.time):
+        self.table_name = table_name
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.claim_seconds = claim_seconds
+        self.client = client or dynamodb_client
+        self.clock = clock
+        self.seen = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.durable_hits = 0
+
+    def claim(self, message_id):
+        """Return True if this message is new and should be processed."""
+        if message_id in self.seen:
+            self.seen.move_to_end(message_id)
+            self.cache_hits += 1
+            return False
+        self.cache_misses += 1
+
+        now = int(self.clock())
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item=self.marker(message_id, now + self.claim_seconds),
+                ConditionExpression='attribute_not_exists(SensorId) OR ExpiresAt < :now',
+                ExpressionAttributeValues={':now': {'N': str(now)}},
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                # Can't reach the durable check: process the message rather than risk losing it
+                logger.warning('Dedup check failed, processing anyway', message_id=message_id, error=str(e))
+                return True
+            self.durable_hits += 1
+            self.remember(message_id)
+            return False
+
+        self.remember(message_id)
+        return True
+
+    def complete(self, message_ids):
+        """Keep the markers of processed messages for the full TTL. Best effort: a marker
+        that isn't extended expires after claim_seconds and a later redelivery is written again."""
+        expires_at = int(self.clock()) + self.ttl_seconds
+        message_ids = list(message_ids)
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            requests = [{'PutRequest': {'Item': self.marker(message_id, expires_at)}}
+                        for message_id in message_ids[start:start + BATCH_SIZE]]
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            except ClientError as e:
+                logger.warning('Failed to complete dedup markers', count=len(requests), error=str(e))
+                continue
+            unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            if unprocessed:
+                logger.warning('Dedup markers left to expire early', count=len(unprocessed))
+
+    def release(self, message_id):
+        """Forget a claimed message (e.g. its writes failed) so a redelivery is processed again."""
+        self.seen.pop(message_id, None)
+        try:
+            self.client.delete_item(
+                TableName=self.table_name,
+                Key={
+                    'SensorId': {'S': MESSAGE_MARKER_PREFIX + message_id},
+                    'Timestamp': {'S': MESSAGE_MARKER_SORT_KEY},
+                },
+            )
+        except ClientError as e:
+            logger.warning('Failed to release dedup marker', message_id=message_id, error=str(e))
+
+    @staticmethod
+    def marker(message_id, expires_at):
+        return {
+            'SensorId': {'S': MESSAGE_MARKER_PREFIX + message_id},
+            'Timestamp': {'S': MESSAGE_MARKER_SORT_KEY},
+            'ExpiresAt': {'N': str(expires_at)},
+        }
+
+    def remember(self, message_id):
+        self.seen[message_id] = True
+        if len(self.seen) > self.capacity:
+            self.seen.popitem(last=False)
+
+    def stats(self):
+        return {
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'durable_hits': self.durable_hits,
+            'cache_size': len(self.seen),
+        }
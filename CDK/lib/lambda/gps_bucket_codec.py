@@ -0,0 +1,38 @@
+import base64
+import struct
+
+# Binary chunk layout of the bucketed GPS items (GPS_STORAGE_MODE=bucketed, written by
+# gps_buckets.py). No dependencies, so the same file also serves the Glue jobs
+# (scripts/parquet_output.py, shipped with --extra-py-files), the stream exporters and
+# the visualization backend.
+#
+# Each chunk is little-endian: uint32 n, then n uint32 ms offsets from BucketStart,
+# n int32 latitudes and n int32 longitudes (1e-7 degrees).
+LAYOUT = 'gps-bucket-v1'
+COORDINATE_SCALE = 10_000_000  # Fixed point, 1e-7 degrees (~1 cm)
+
+
+def encode_chunk(fixes, bucket_start):
+    """Pack [(epoch_seconds, lat, lon), ...] into one binary chunk."""
+    n = len(fixes)
+    offsets = [int(round((t - bucket_start) * 1000)) for t, _, _ in fixes]
+    lats = [int(round(float(lat) * COORDINATE_SCALE)) for _, lat, _ in fixes]
+    lons = [int(round(float(lon) * COORDINATE_SCALE)) for _, _, lon in fixes]
+    return struct.pack(f'<I{n}I{n}i{n}i', n, *offsets, *lats, *lons)
+
+
+def decode_chunk(chunk, bucket_start):
+    """Unpack one chunk into [(epoch_seconds, lat, lon), ...].
+
+    Accepts the raw bytes (low-level API), boto3's Binary wrapper (resource API)
+    or the base64 text of DynamoDB exports.
+    """
+    chunk = getattr(chunk, 'value', chunk)
+    data = chunk if isinstance(chunk, (bytes, bytearray)) else base64.b64decode(chunk)
+    n, = struct.unpack_from('<I', data, 0)
+    values = struct.unpack_from(f'<{n}I{n}i{n}i', data, 4)
+    offsets, lats, lons = values[:n], values[n:2 * n], values[2 * n:]
+    return [
+        (bucket_start + offset / 1000.0, lat / COORDINATE_SCALE, lon / COORDINATE_SCALE)
+        for offset, lat, lon in zip(offsets, lats, lons)
+    ]
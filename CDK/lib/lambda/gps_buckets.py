@@ -0,0 +1,137 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+from batch_writer import BatchWriteStats, dynamodb_client, executor, backoff_delay, MAX_RETRIES, RETRYABLE_ERRORS
+from gps_bucket_codec import LAYOUT, decode_chunk, encode_chunk
+from structured_log import get_logger
+
+# GPS_STORAGE_MODE: 'item' stores one item per fix (default),
+# 'bucketed' appends fixes into one item per animal per time bucket.
+GPS_STORAGE_MODE = os.environ.get('GPS_STORAGE_MODE', 'item')
+BUCKET_SECONDS = int(os.environ.get('GPS_BUCKET_SECONDS', '900'))
+
+BUCKET_KEY_PREFIX = 'bucket#'  # Sort key prefix, keeps bucket items apart from per-fix items
+
+logger = get_logger('gps_buckets')
+
+# Bucket items look like:
+#   SensorId    elk id (partition key)
+#   Timestamp   'bucket#<ISO bucket start>'
+#   Layout      'gps-bucket-v1'
+#   BucketStart bucket start, epoch seconds
+#   FixCount    number of fixes in the bucket
+#   Chunks      list of binary chunks, one appended per write (layout in gps_bucket_codec.py)
+#   ChunkIds    content hash of every appended chunk, so the same chunk is never appended twice
+
+
+def to_epoch(timestamp):
+    """ISO timestamp (as written by the processors, UTC) -> epoch seconds."""
+    parsed = datetime.fromisoformat(timestamp)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def bucket_start_for(epoch_seconds, bucket_seconds=BUCKET_SECONDS):
+    return int(epoch_seconds // bucket_seconds) * bucket_seconds
+
+
+class BucketedGpsWriter:
+    """Drop-in replacement for BatchWriter that appends fixes to per-animal bucket items.
+
+    The converted GPS items of one invocation are grouped by (animal, bucket) and
+    each group becomes a single UpdateItem appending one packed chunk, so the item
+    count (and WCUs, when an invocation carries several fixes per animal) drops
+    by the number of fixes per bucket.
+
+    list_append is not idempotent, so each append is conditional on its chunk's
+    hash not being in ChunkIds yet: a retry after a lost response, or a redelivered
+    message converted into the same chunk, is recognised and counted as written.
+    """
+
+    def __init__(self, table_name, bucket_seconds=BUCKET_SECONDS, client=None, pool=None,
+                 max_retries=MAX_RETRIES, sleep=time.sleep):
+        self.table_name = table_name
+        self.bucket_seconds = bucket_seconds
+        self.client = client or dynamodb_client
+        self.pool = pool or executor
+        self.max_retries = max_retries
+        self.sleep = sleep
+
+    def group(self, items):
+        groups = {}
+        for index, item in enumerate(items):
+            t = to_epoch(item['Timestamp'])
+            key = (item['SensorId'], bucket_start_for(t, self.bucket_seconds))
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {'topic': item.get('Topic'), 'fixes': [], 'indexes': []}
+            group['fixes'].append((t, item['Latitude'], item['Longitude']))
+            group['indexes'].append(index)
+        return groups
+
+    def write(self, items):
+        stats = BatchWriteStats()
+        if not items:
+            return stats
+        groups = list(self.group(items).items())
+        if len(groups) == 1:
+            results = [self.append(groups[0])]
+        else:
+            results = self.pool.map(self.append, groups)
+        for (_, group), (written, retried, dropped) in zip(groups, results):
+            stats.add(written, retried, dropped)
+            if dropped:
+                stats.failed.update(group['indexes'])
+        return stats
+
+    def append(self, entry):
+        """Append one (animal, bucket) group. Returns (written, retried, dropped) in fixes."""
+        (sensor_id, bucket_start), group = entry
+        fixes = sorted(group['fixes'])
+        n = len(fixes)
+        bucket_iso = datetime.fromtimestamp(bucket_start, tz=timezone.utc).replace(tzinfo=None).isoformat()
+        chunk = encode_chunk(fixes, bucket_start)
+        chunk_id = hashlib.sha1(chunk).hexdigest()[:20]
+        retried = 0
+
+        for attempt in range(self.max_retries):
+            try:
+                self.client.update_item(
+                    TableName=self.table_name,
+                    Key={'SensorId': {'S': sensor_id}, 'Timestamp': {'S': BUCKET_KEY_PREFIX + bucket_iso}},
+                    UpdateExpression=(
+                        'SET Chunks = list_append(if_not_exists(Chunks, :empty), :chunk), '
+                        'ChunkIds = list_append(if_not_exists(ChunkIds, :empty), :ids), '
+                        'FixCount = if_not_exists(FixCount, :zero) + :n, '
+                        'Layout = :layout, BucketStart = :start, Topic = :topic'
+                    ),
+                    ConditionExpression='NOT contains(ChunkIds, :id)',
+                    ExpressionAttributeValues={
+                        ':empty': {'L': []},
+                        ':chunk': {'L': [{'B': chunk}]},
+                        ':ids': {'L': [{'S': chunk_id}]},
+                        ':id': {'S': chunk_id},
+                        ':zero': {'N': '0'},
+                        ':n': {'N': str(n)},
+                        ':layout': {'S': LAYOUT},
+                        ':start': {'N': str(bucket_start)},
+                        ':topic': {'S': group['topic'] or 'unknown_topic'},
+                    },
+                )
+                return n, retried, 0
+            except ClientError as e:
+                code = e.response.get('Error', {}).get('Code')
+                if code == 'ConditionalCheckFailedException':
+                    logger.info('Chunk already appended', table=self.table_name, sensor_id=sensor_id, chunk_id=chunk_id)
+                    return n, retried, 0
+                if code not in RETRYABLE_ERRORS or attempt + 1 == self.max_retries:
+                    logger.error('Bucket append failed, dropping %d fixes', n, table=self.table_name,
+                                 sensor_id=sensor_id, code=code, error=str(e))
+                    return 0, retried, n
+                retried += n
+                self.sleep(backoff_delay(attempt))
+        return 0, retried, n
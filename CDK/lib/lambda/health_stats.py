@@ -0,0 +1,194 @@
+import math
+import os
+import time
+from array import array
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from batch_writer import MAX_RETRIES, RETRYABLE_ERRORS, backoff_delay, dynamodb_client
+from structured_log import get_logger
+
+# Vitals tracked per elk: item attribute -> whether 0 means "missing" (the schema defaults to 0)
+TRACKED_METRICS = (
+    ('BodyTemperature', True),
+    ('HeartRate', True),
+    ('RespirationRate', True),
+    ('StressLevel', False),
+)
+
+# Per metric we keep [count, mean, M2 (Welford), ewma] -> 16 doubles (128 bytes) per elk
+SLOTS = 4
+COUNT, MEAN, M2, EWMA = range(SLOTS)
+
+EWMA_ALPHA = float(os.environ.get('HEALTH_EWMA_ALPHA', '0.2'))
+MIN_SAMPLES = int(os.environ.get('HEALTH_MIN_SAMPLES', '10'))  # No flags until the baseline has settled
+SPIKE_Z = float(os.environ.get('HEALTH_SPIKE_Z', '3.0'))  # Single reading far from the elk's baseline
+DRIFT_Z = float(os.environ.get('HEALTH_DRIFT_Z', '1.5'))  # EWMA drifted from the baseline (e.g. fever onset)
+CHECKPOINT_SECONDS = int(os.environ.get('HEALTH_CHECKPOINT_SECONDS', '60'))
+
+STATE_KEY_PREFIX = '__stats__#'
+STATE_SORT_KEY = 'state'
+BATCH_GET_LIMIT = 100  # BatchGetItem key limit
+
+logger = get_logger('health_stats')
+deserializer = TypeDeserializer()
+
+
+def new_state():
+    return array('d', [0.0] * (SLOTS * len(TRACKED_METRICS)))
+
+
+def update_metric(state, offset, value):
+    """O(1) Welford + EWMA update. Returns (z, drift_z) against the baseline before this reading."""
+    count = state[offset + COUNT]
+    mean = state[offset + MEAN]
+    z = drift_z = None
+    if count >= MIN_SAMPLES:
+        std = math.sqrt(state[offset + M2] / (count - 1))
+        if std > 0:
+            z = (value - mean) / std
+            drift_z = (state[offset + EWMA] - mean) / std
+
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    state[offset + COUNT] = count
+    state[offset + MEAN] = mean
+    state[offset + M2] += delta * (value - mean)
+    state[offset + EWMA] = value if count == 1 else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * state[offset + EWMA]
+    return z, drift_z
+
+
+class HealthAnomalyDetector:
+    """Running per-elk vitals statistics with inline deviation flags.
+
+    State lives in a dict of compact arrays in the warm container. Elks not seen
+    by this container are loaded from their checkpoint item on first sight, and
+    changed states are checkpointed back to the table every CHECKPOINT_SECONDS.
+    Elks whose checkpoint can't be read (throttled past the retries) are left
+    unscored for the invocation rather than restarted from an empty baseline,
+    which the next checkpoint would otherwise write over the real one.
+    """
+
+    def __init__(self, table_name, writer, client=None, checkpoint_seconds=CHECKPOINT_SECONDS, clock=time.time,
+                 max_retries=MAX_RETRIES, sleep=time.sleep):
+        self.table_name = table_name
+        self.writer = writer
+        self.client = client or dynamodb_client
+        self.checkpoint_seconds = checkpoint_seconds
+        self.clock = clock
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.states = {}
+        self.dirty = set()
+        self.last_checkpoint = clock()
+
+    def process(self, items):
+        """Update the statistics from converted HEA items and tag anomalous ones in place."""
+        unavailable = self.load([item['ElkId'] for item in items if item.get('ElkId') not in self.states and 'ElkId' in item])
+
+        flagged = []
+        for item in items:
+            elk_id = item.get('ElkId')
+            if elk_id is None or elk_id in unavailable:
+                continue
+            state = self.states.get(elk_id)
+            if state is None:
+                state = self.states[elk_id] = new_state()
+
+            anomalies = []
+            for index, (name, zero_is_missing) in enumerate(TRACKED_METRICS):
+                value = item.get(name)
+                if value is None:
+                    continue
+                value = float(value)
+                if zero_is_missing and value <= 0:
+                    continue
+                z, drift_z = update_metric(state, index * SLOTS, value)
+                if z is not None and abs(z) >= SPIKE_Z:
+                    anomalies.append({'metric': name, 'kind': 'spike', 'z': round(z, 2)})
+                elif drift_z is not None and abs(drift_z) >= DRIFT_Z:
+                    anomalies.append({'metric': name, 'kind': 'drift', 'z': round(drift_z, 2)})
+            self.dirty.add(elk_id)
+
+            if anomalies:
+                item['Anomalies'] = [f"{a['metric']}:{a['kind']}" for a in anomalies]
+                flagged.append({'elk_id': elk_id, 'timestamp': item.get('Timestamp'), 'anomalies': anomalies})
+
+        if flagged:
+            logger.warning('Health anomalies detected', count=len(flagged), anomalies=flagged)
+
+        if self.clock() - self.last_checkpoint >= self.checkpoint_seconds:
+            self.checkpoint()
+        return flagged
+
+    def load(self, elk_ids):
+        """Restore checkpointed state for elks this container hasn't seen yet.
+
+        UnprocessedKeys are retried with backoff, as BatchWriter does for writes.
+        Returns the elks whose state could not be read.
+        """
+        elk_ids = list(dict.fromkeys(elk_ids))
+        unavailable = set()
+        for start in range(0, len(elk_ids), BATCH_GET_LIMIT):
+            pending = [
+                {'SensorId': {'S': STATE_KEY_PREFIX + elk_id}, 'Timestamp': {'S': STATE_SORT_KEY}}
+                for elk_id in elk_ids[start:start + BATCH_GET_LIMIT]
+            ]
+            for attempt in range(self.max_retries):
+                try:
+                    response = self.client.batch_get_item(RequestItems={self.table_name: {'Keys': pending}})
+                except ClientError as e:
+                    code = e.response.get('Error', {}).get('Code')
+                    if code not in RETRYABLE_ERRORS:
+                        logger.warning('Failed to load health state', code=code, error=str(e))
+                        break
+                else:
+                    self.restore(response.get('Responses', {}).get(self.table_name, []))
+                    pending = response.get('UnprocessedKeys', {}).get(self.table_name, {}).get('Keys', [])
+                    if not pending:
+                        break
+                if attempt + 1 < self.max_retries:
+                    self.sleep(backoff_delay(attempt))
+            if pending:
+                missing = [key['SensorId']['S'][len(STATE_KEY_PREFIX):] for key in pending]
+                logger.warning('Health state not loaded, skipping these elks for now', elks=missing)
+                unavailable.update(missing)
+        return unavailable
+
+    def restore(self, raw_items):
+        for raw in raw_items:
+            record = {key: deserializer.deserialize(value) for key, value in raw.items()}
+            state = array('d')
+            state.frombytes(bytes(getattr(record['State'], 'value', record['State'])))
+            if len(state) == SLOTS * len(TRACKED_METRICS):
+                self.states[record['SensorId'][len(STATE_KEY_PREFIX):]] = state
+
+    def checkpoint(self):
+        """Write changed elk states back to the table.
+
+        Elks whose state wasn't written (dropped after the writer's retries, or all
+        of them if the write raised) stay dirty and go out with the next checkpoint.
+        """
+        self.last_checkpoint = self.clock()
+        if not self.dirty:
+            return
+        now = int(self.last_checkpoint)
+        elk_ids = list(self.dirty)
+        items = [
+            {
+                'SensorId': STATE_KEY_PREFIX + elk_id,
+                'Timestamp': STATE_SORT_KEY,
+                'State': self.states[elk_id].tobytes(),
+                'UpdatedAt': now,
+            }
+            for elk_id in elk_ids
+        ]
+        try:
+            stats = self.writer.write(items)
+        except Exception as e:
+            # Never fails the invocation: the readings themselves are written separately
+            logger.warning('Health state checkpoint failed, retrying at the next one', elks=len(items), error=str(e))
+            return
+        self.dirty = {elk_ids[index] for index in stats.failed}
+        logger.info('Health state checkpointed', elks=len(items), stats=stats.as_dict(), pending=len(self.dirty))
@@ -0,0 +1,366 @@
+import base64
+import json
+import math
+import time
+import traceback
+import zlib
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from compact_codec import decode_payload
+from structured_log import get_logger
+
+# Field kinds understood by the record converter
+DECIMAL = 'decimal'  # Numbers, stored as DynamoDB N (Decimal)
+STRING = 'string'    # Anything, stored as str(value)
+RAW = 'raw'          # Stored as-is (already a str/bool/etc.)
+
+# Why a message was skipped -> the counter metric it goes to
+UNDECODABLE = 'undecodable'  # Unparseable queue record, payload or payload that isn't a list
+EMPTY = 'empty'              # No records in the payload
+DUPLICATE = 'duplicate'      # messageId already processed
+SKIP_METRICS = {UNDECODABLE: 'UndecodableMessages', EMPTY: 'EmptyMessages', DUPLICATE: 'DuplicateMessages'}
+
+
+class InvalidRecord(ValueError):
+    """Raised by a converter when a record can't be turned into an item."""
+
+
+def to_decimal(value):
+    """Convert a JSON number (or numeric string) to a finite Decimal."""
+    if isinstance(value, bool):
+        raise InvalidRecord(f"boolean is not a number: {value!r}")
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        # repr() gives the shortest round-tripping form, same as the old Decimal(str(x))
+        result = Decimal(repr(value))
+    elif isinstance(value, str):
+        try:
+            result = Decimal(value)
+        except InvalidOperation:
+            raise InvalidRecord(f"not a number: {value!r}")
+    else:
+        raise InvalidRecord(f"not a number: {value!r}")
+    if not result.is_finite():
+        raise InvalidRecord(f"non-finite number: {value!r}")  # DynamoDB rejects NaN/Infinity
+    return result
+
+
+CONVERTERS = {
+    DECIMAL: to_decimal,
+    STRING: str,
+    RAW: None,
+}
+
+
+class Field:
+    """One payload field: where it comes from, where it goes and how it is converted.
+
+    A required field that is missing or invalid rejects the record. An optional
+    field falls back to `default` (or is left out of the item when default is None).
+    """
+
+    __slots__ = ('source', 'target', 'kind', 'required', 'default')
+
+    def __init__(self, source, target, kind=DECIMAL, required=True, default=None):
+        if kind not in CONVERTERS:
+            raise ValueError(f"Unknown field kind: {kind}")
+        self.source = source
+        self.target = target
+        self.kind = kind
+        self.required = required
+        self.default = default
+
+
+def compile_converter(fields, timestamp_field=None):
+    """Build a record -> item function for a schema.
+
+    All per-field decisions (converter lookup, default conversion) are made here
+    once, so converting a record is a single pass over a tuple of plain values.
+    """
+    specs = []
+    for field in fields:
+        convert = CONVERTERS[field.kind]
+        default = field.default
+        if default is not None and convert is not None:
+            default = convert(default)
+        specs.append((field.source, field.target, convert, field.required, default))
+    specs = tuple(specs)
+
+    def converter(record, topic, timestamp):
+        if not isinstance(record, dict):
+            raise InvalidRecord(f"record is not an object: {record!r}")
+        get = record.get
+        item = {'Topic': topic}
+        for source, target, convert, required, default in specs:
+            value = get(source)
+            if value is not None and convert is not None:
+                try:
+                    value = convert(value)
+                except (InvalidRecord, TypeError, ValueError) as e:
+                    if required:
+                        raise InvalidRecord(f"{source}: {e}")
+                    value = None
+            if value is None:
+                if required:
+                    raise InvalidRecord(f"missing required field '{source}'")
+                if default is None:
+                    continue
+                value = default
+            item[target] = value
+
+        if timestamp_field is None:
+            item['Timestamp'] = timestamp
+        else:
+            record_timestamp = get(timestamp_field)
+            item['Timestamp'] = str(record_timestamp) if record_timestamp is not None else timestamp
+        return item
+
+    return converter
+
+
+class TopicSchema:
+    """Declares how one sensor topic is stored.
+
+    timestamp_field names the payload field holding each record's timestamp;
+    when it is None every record gets the ingestion time of the message.
+    """
+
+    def __init__(self, name, table_name, fields, timestamp_field=None):
+        self.name = name
+        self.table_name = table_name
+        self.fields = tuple(fields)
+        self.timestamp_field = timestamp_field
+        self.convert = compile_converter(self.fields, timestamp_field)
+
+    def build_items(self, payload, topic, timestamp=None):
+        """Validate and convert a payload list. Returns (items, rejected)."""
+        if timestamp is None:
+            timestamp = datetime.utcnow().isoformat()
+        convert = self.convert
+        items = []
+        rejected = []
+        for index, record in enumerate(payload):
+            try:
+                items.append(convert(record, topic, timestamp))
+            except InvalidRecord as e:
+                rejected.append((index, str(e)))
+        return items, rejected
+
+
+def device_timestamp(event):
+    """The transmitter's envelope timestamp (epoch seconds), or None if absent/invalid."""
+    value = event.get('timestamp')
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and 0 < value < 1e11:
+        return float(value)
+    return None
+
+
+def valid_for(event):
+    """Seconds a dead-banded reading stays current, or None.
+
+    The envelope's deadband.validFor covers the heartbeat's lateness and delivery;
+    transmitters that predate it only send deadband.maxSilence.
+    """
+    deadband = event.get('deadband')
+    if not isinstance(deadband, dict):
+        return None
+    for name in ('validFor', 'maxSilence'):
+        value = deadband.get(name)
+        if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+            return value
+    return None
+
+
+def handle_event(schema, event, writer, dedup=None, metrics=None, on_items=None):
+    """Common body of the topic processor Lambdas: convert the payload and batch write it.
+
+    Accepts either a single IoT message (IoT rule -> Lambda) or an SQS/Kinesis
+    style batch ({'Records': [...]}) carrying many IoT messages; batches return
+    {'batchItemFailures': [...]} so only the failed messages are redelivered.
+
+    When a MessageDeduplicator is given, messages whose messageId was already
+    processed are skipped. When a MetricsRecorder is given, device->Lambda lag,
+    per-record conversion time and write latency are recorded and flushed.
+    on_items, if given, is called with the converted items before they are
+    written and may annotate them in place.
+    """
+    logger = get_logger(schema.name)
+    logger.begin(event)
+    try:
+        if 'Records' in event:
+            return process_batch_event(schema, event, writer, dedup, metrics, logger, on_items)
+        return process_event(schema, event, writer, dedup, metrics, logger, on_items)
+    except Exception as e:
+        logger.error('Error storing data in DynamoDB: %s', e, traceback=traceback.format_exc)
+        raise
+    finally:
+        logger.end()
+        if metrics is not None:
+            metrics.flush()
+
+
+def decode_record(record):
+    """Return (identifier, IoT message) for an SQS or Kinesis event record."""
+    if 'kinesis' in record:
+        identifier = record['kinesis']['sequenceNumber']
+        body = base64.b64decode(record['kinesis']['data'])
+    else:
+        identifier = record['messageId']
+        body = record['body']
+    message = json.loads(body)
+    if not isinstance(message, dict):
+        raise ValueError('message is not an object')
+    return identifier, message
+
+
+def skip(reason, metrics):
+    """Count a skipped message and return its reason."""
+    if metrics is not None:
+        metrics.count(SKIP_METRICS[reason])
+    return reason
+
+
+def convert_message(schema, message, dedup, metrics, logger):
+    """Lag metric, duplicate check and conversion for one IoT message.
+
+    Returns (items, rejected, claimed_message_id), or the reason the message was
+    skipped (UNDECODABLE, EMPTY or DUPLICATE), which is also counted in the metrics.
+    """
+    try:
+        # IoT Core sends the sensor data list inside 'payload' (plain JSON or compact columnar)
+        payload = decode_payload(message)
+    except (ValueError, TypeError, zlib.error) as e:
+        logger.error('Undecodable %s payload', schema.name, content_type=message.get('contentType'), error=str(e))
+        return skip(UNDECODABLE, metrics)
+    topic = message.get('topic', 'unknown_topic')
+    message_id = message.get('messageId')
+    sent_at = device_timestamp(message)
+
+    if metrics is not None and sent_at is not None:
+        metrics.record('DeviceToLambdaLag', (time.time() - sent_at) * 1000.0)
+
+    if not payload:
+        logger.info('No %s data found in the event.', schema.name)
+        return skip(EMPTY, metrics)
+
+    if not isinstance(payload, list):
+        logger.error('%s payload is not a list', schema.name)
+        return skip(UNDECODABLE, metrics)
+
+    if dedup is not None and message_id:
+        if not dedup.claim(message_id):
+            logger.info('Skipping duplicate message', message_id=message_id, dedup=dedup.stats)
+            return skip(DUPLICATE, metrics)
+    else:
+        message_id = None
+
+    # Records are stamped with the device's send time when it has one, so redeliveries
+    # map onto the same keys and the stored time reflects when the reading was taken
+    timestamp = datetime.utcfromtimestamp(sent_at).isoformat() if sent_at is not None else None
+
+    started = time.perf_counter()
+    items, rejected = schema.build_items(payload, topic, timestamp)
+    if metrics is not None:
+        # One weighted sample (mean per record) keeps the cost independent of batch size
+        metrics.record('RecordConversionTime', (time.perf_counter() - started) * 1e6 / len(payload), len(payload))
+    ttl = valid_for(message)
+    if ttl is not None:
+        # Change-only publishing: a reading is the animal's last known value until the
+        # next one arrives, or ValidFor seconds pass without a heartbeat (device offline)
+        valid = Decimal(ttl)
+        for item in items:
+            item['ValidFor'] = valid
+    if rejected:
+        logger.warning('Rejected %d %s records', len(rejected), schema.name, rejected=rejected[:20])
+    return items, rejected, message_id
+
+
+def write_items(items, writer, dedup, metrics, claimed, on_items):
+    """Run the on_items hook and write. Releases the dedup claims if the write raises."""
+    if on_items is not None and items:
+        on_items(items)
+
+    started = time.perf_counter()
+    try:
+        stats = writer.write(items)
+    except Exception:
+        if dedup is not None:
+            for message_id in claimed:
+                dedup.release(message_id)
+        raise
+    if metrics is not None and items:
+        metrics.record('WriteLatency', (time.perf_counter() - started) * 1000.0)
+    return stats
+
+
+def process_event(schema, event, writer, dedup, metrics, logger, on_items):
+    converted = convert_message(schema, event, dedup, metrics, logger)
+    if isinstance(converted, str):
+        return {'written': 0, 'retried': 0, 'dropped': 0, 'rejected': 0, 'skipped': converted}
+    items, rejected, message_id = converted
+    claimed = [message_id] if message_id else []
+
+    result = write_items(items, writer, dedup, metrics, claimed, on_items)
+    stats = result.as_dict()
+    stats['rejected'] = len(rejected)
+
+    if claimed:
+        if result.dropped:
+            # Let a redelivery fill in the items we couldn't write
+            dedup.release(message_id)
+        else:
+            dedup.complete(claimed)
+        stats['dedup'] = dedup.stats()
+    logger.info('Batch written to DynamoDB', topic=event.get('topic'), records=len(items) + len(rejected), stats=stats)
+    return stats
+
+
+def process_batch_event(schema, event, writer, dedup, metrics, logger, on_items):
+    """Convert every message in a queue batch, write them together and report failures per message."""
+    messages = []  # (identifier, claimed message id, first item index, item count)
+    items = []
+    rejected_count = 0
+    skipped = {UNDECODABLE: 0, EMPTY: 0, DUPLICATE: 0}
+
+    for record in event.get('Records') or []:
+        try:
+            identifier, message = decode_record(record)
+        except (KeyError, TypeError, ValueError) as e:
+            # Redelivering a message we can't parse won't help, so it isn't reported as failed
+            logger.error('Undecodable queue record', error=str(e), record=record)
+            skipped[skip(UNDECODABLE, metrics)] += 1
+            continue
+
+        converted = convert_message(schema, message, dedup, metrics, logger)
+        if isinstance(converted, str):
+            skipped[converted] += 1
+            continue
+        message_items, rejected, message_id = converted
+        messages.append((identifier, message_id, len(items), len(message_items)))
+        items.extend(message_items)
+        rejected_count += len(rejected)
+
+    claimed = [message_id for _, message_id, _, _ in messages if message_id]
+    result = write_items(items, writer, dedup, metrics, claimed, on_items)
+
+    failures = []
+    completed = []
+    for identifier, message_id, first, count in messages:
+        if any(index in result.failed for index in range(first, first + count)):
+            failures.append({'itemIdentifier': identifier})
+            if message_id:
+                dedup.release(message_id)
+        elif message_id:
+            completed.append(message_id)
+    if completed:
+        dedup.complete(completed)
+
+    stats = result.as_dict()
+    stats.update({'messages': len(messages), 'duplicates': skipped[DUPLICATE], 'empty': skipped[EMPTY],
+                  'undecodable': skipped[UNDECODABLE], 'rejected': rejected_count, 'failed_messages': len(failures)})
+    if dedup is not None:
+        stats['dedup'] = dedup.stats()
+    logger.info('Queue batch written to DynamoDB', records=len(items) + rejected_count, stats=stats)
+    return {'batchItemFailures': failures}
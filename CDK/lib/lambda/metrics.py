@@ -0,0 +1,167 @@
+import json
+import math
+import os
+import time
+
+# METRICS_MODE: 'emf' prints CloudWatch Embedded Metric Format lines once per invocation,
+# 'local' keeps the histograms in memory for report() (tests/benchmarks), 'off' disables.
+METRICS_MODE = os.environ.get('METRICS_MODE', 'emf')
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'WildlifeSurveillance/Ingestion')
+
+# Log-spaced buckets, ~10% wide: percentiles are within ~5% with O(1) recording
+BUCKET_GROWTH = 1.1
+LOG_GROWTH = math.log(BUCKET_GROWTH)
+ZERO_BUCKET = -10_000  # Holds values <= 0 (e.g. device clock ahead of Lambda)
+
+# An EMF metric member is a number or an array of at most 100 numbers, so a flush is
+# split over several documents. Above EMF_MAX_SAMPLES samples per metric the emitted
+# values are thinned out proportionally (the percentiles stay, SampleCount is capped).
+EMF_MAX_VALUES = 100
+EMF_MAX_SAMPLES = 1000
+
+# Metric name -> CloudWatch unit
+UNITS = {
+    'DeviceToLambdaLag': 'Milliseconds',
+    'RecordConversionTime': 'Microseconds',
+    'WriteLatency': 'Milliseconds',
+    'UndecodableMessages': 'Count',
+    'EmptyMessages': 'Count',
+    'DuplicateMessages': 'Count',
+}
+
+
+def bucket_index(value):
+    if value <= 0:
+        return ZERO_BUCKET
+    return math.floor(math.log(value) / LOG_GROWTH)
+
+
+def bucket_value(index):
+    """Representative (geometric middle) value of a bucket."""
+    if index == ZERO_BUCKET:
+        return 0.0
+    return BUCKET_GROWTH ** (index + 0.5)
+
+
+class Histogram:
+    """Sparse log-bucketed histogram: a dict of bucket index -> count."""
+
+    __slots__ = ('counts', 'count', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, value, count=1):
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def samples(self, limit=EMF_MAX_SAMPLES):
+        """One value per recorded sample (its bucket's value), at most limit of them in proportion."""
+        scale = min(1.0, limit / self.count) if self.count else 1.0
+        values = []
+        seen = emitted = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            wanted = round(seen * scale)  # Cumulative rounding keeps every bucket's share
+            values.extend([round(min(bucket_value(index), self.max), 3)] * (wanted - emitted))
+            emitted = wanted
+        return values
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class MetricsRecorder:
+    """Per-topic latency histograms and message counters, flushed once per invocation.
+
+    In 'emf' mode flush() prints the samples as EMF lines of up to 100 values
+    per metric (CloudWatch gives them p50/p95/p99 statistics), the counters as
+    single values in the first line, and resets.
+    In 'local' mode both accumulate across invocations for report().
+    """
+
+    def __init__(self, topic, mode=METRICS_MODE, namespace=METRICS_NAMESPACE, emit=print):
+        self.topic = topic
+        self.mode = mode
+        self.namespace = namespace
+        self.emit = emit
+        self.histograms = {}
+        self.counters = {}
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def record(self, name, value, count=1):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(value, count)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def flush(self):
+        if self.mode != 'emf' or not (self.histograms or self.counters):
+            return
+        for document in self.documents():
+            self.emit(json.dumps(document))
+        self.histograms = {}
+        self.counters = {}
+
+    def documents(self):
+        samples = {name: histogram.samples() for name, histogram in self.histograms.items()}
+        timestamp = int(time.time() * 1000)
+        pages = max([math.ceil(len(values) / EMF_MAX_VALUES) for values in samples.values()] + [1])
+        for page in range(pages):
+            chunk = {name: values[page * EMF_MAX_VALUES:(page + 1) * EMF_MAX_VALUES] for name, values in samples.items()}
+            chunk = {name: values for name, values in chunk.items() if values}
+            if page == 0:
+                chunk.update(self.counters)
+            if not chunk:
+                continue
+            document = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [['Topic']],
+                        'Metrics': [{'Name': name, 'Unit': UNITS.get(name, 'None')} for name in chunk],
+                    }],
+                },
+                'Topic': self.topic,
+            }
+            document.update(chunk)
+            yield document
+
+    def report(self):
+        """p50/p95/p99 per histogram and the counters' totals ('local' mode)."""
+        report = {name: histogram.summary() for name, histogram in self.histograms.items()}
+        report.update(self.counters)
+        return report
@@ -0,0 +1,86 @@
+import json
+import os
+import random
+import sys
+import time
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Fraction of invocations whose full event is logged (errors always log it)
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+
+def write_line(line):
+    sys.stdout.write(line + '\n')
+
+
+class StructuredLogger:
+    """Level-aware JSON line logger for the topic processors.
+
+    Messages are only built when the level is enabled: `message % args` is
+    formatted lazily and callable field values are only called when the line is
+    written. Full events are logged for a sampled fraction of invocations, and
+    always alongside errors.
+    """
+
+    def __init__(self, name, level=LOG_LEVEL, sample_rate=LOG_SAMPLE_RATE, emit=write_line, rng=random.random):
+        self.name = name
+        self.level = LEVELS.get(level, LEVELS['INFO']) if isinstance(level, str) else level
+        self.sample_rate = sample_rate
+        self.emit = emit
+        self.rng = rng
+        self.sampled = False
+        self.event = None
+
+    def is_enabled(self, level):
+        return LEVELS[level] >= self.level
+
+    def begin(self, event):
+        """Start an invocation: decide whether it is sampled and log the event if so."""
+        self.event = event
+        self.sampled = self.rng() < self.sample_rate
+        if self.sampled:
+            self.log('INFO', 'Received event', event=event, sampled=True)
+
+    def end(self):
+        self.event = None
+        self.sampled = False
+
+    def log(self, level, message, *args, **fields):
+        if LEVELS[level] < self.level:
+            return
+        if args:
+            message = message % args
+        record = {'ts': round(time.time(), 3), 'level': level, 'logger': self.name, 'message': message}
+        for key, value in fields.items():
+            record[key] = value() if callable(value) else value
+        self.emit(json.dumps(record, default=str))
+
+    def debug(self, message, *args, **fields):
+        if self.level <= 10:
+            self.log('DEBUG', message, *args, **fields)
+
+    def info(self, message, *args, **fields):
+        if self.level <= 20:
+            self.log('INFO', message, *args, **fields)
+
+    def warning(self, message, *args, **fields):
+        self.log('WARNING', message, *args, **fields)
+
+    def error(self, message, *args, **fields):
+        """Errors are never sampled out and carry the current event if it wasn't logged already."""
+        if self.event is not None and not self.sampled and 'event' not in fields:
+            fields['event'] = self.event
+        self.log('ERROR', message, *args, **fields)
+
+
+loggers = {}
+
+
+def get_logger(name):
+    """One logger per name, shared across warm invocations."""
+    logger = loggers.get(name)
+    if logger is None:
+        logger = loggers[name] = StructuredLogger(name)
+    return logger
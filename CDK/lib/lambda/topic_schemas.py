@@ -0,0 +1,35 @@
+from ingestion import TopicSchema, Field, DECIMAL, STRING, RAW
+
+# One schema per sensor topic. Adding a sensor type means adding a schema here
+# plus a two-line <PREFIX>TopicProcessor.py that hands it to ingestion.handle_event.
+
+GPS_SCHEMA = TopicSchema('GPS', 'GpsDataTable', [
+    Field('elk_id', 'SensorId', STRING),  # Table partition key (see glue-job-factory.ts)
+    Field('elk_id', 'ElkId', STRING),
+    Field('lat', 'Latitude'),
+    Field('lon', 'Longitude'),
+])
+
+ENV_SCHEMA = TopicSchema('ENV', 'EnvDataTable', [
+    Field('sensor_id', 'SensorId', STRING),
+    Field('lat', 'Latitude'),
+    Field('lon', 'Longitude'),
+    Field('temperature', 'Temperature'),
+    Field('humidity', 'Humidity'),
+    Field('wind_direction', 'WindDirection', RAW, required=False),
+])
+
+# Health vitals default to 0 when missing or invalid rather than rejecting the record
+HEA_SCHEMA = TopicSchema('HEA', 'HeaDataTable', [
+    Field('sensor_id', 'SensorId', STRING),
+    Field('elk_id', 'ElkId', STRING, required=False),
+    Field('body_temperature', 'BodyTemperature', required=False, default=0),
+    Field('heart_rate', 'HeartRate', required=False, default=0),
+    Field('respiration_rate', 'RespirationRate', required=False, default=0),
+    Field('activity_level', 'ActivityLevel', required=False, default=0),
+    Field('posture', 'Posture', RAW, required=False, default='Unknown'),
+    Field('hydration_level', 'HydrationLevel', required=False, default=0),
+    Field('stress_level', 'StressLevel', required=False, default=0),
+], timestamp_field='timestamp')
+
+SCHEMAS = {schema.name: schema for schema in (GPS_SCHEMA, ENV_SCHEMA, HEA_SCHEMA)}
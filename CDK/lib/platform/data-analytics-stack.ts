@@ -31,6 +31,9 @@ export class DataAnalyticsStack extends Stack {
       },
     });
 
+    // Spark's commit markers, not data
+    const crawlerExclusions = ['**/_SUCCESS', '**/_temporary/**', '**/*.crc'];
+
     new glue.CfnCrawler(this, 'GlueS3Crawler', {
         role: glueCrawlerRole.roleArn,
         databaseName: glueDatabase.ref,
@@ -38,14 +41,38 @@ export class DataAnalyticsStack extends Stack {
           s3Targets: [
             {
               path: `s3://${s3OutputBucket.bucketName}/gps_data/`, // Point to the gps_data folder
+              exclusions: crawlerExclusions,
             },
             {
               path: `s3://${s3OutputBucket.bucketName}/env_data/`, // Point to the env_data folder
+              exclusions: crawlerExclusions,
+            },
+            {
+              path: `s3://${s3OutputBucket.bucketName}/hea_data/`, // Point to the hea_data folder
+              exclusions: crawlerExclusions,
             },
           ],
         },
         name: 'S3ResultsCrawler',
         tablePrefix: 'processed_', // Optional table prefix
+        // The ETL jobs write Parquet partitioned by day (gps_data/dt=2024-09-30/...): one table
+        // per folder with dt as a partition column. Later runs only list folders that are new
+        // since the last crawl, so each crawl just adds the new days' partitions.
+        recrawlPolicy: {
+          recrawlBehavior: 'CRAWL_NEW_FOLDERS_ONLY',
+        },
+        schemaChangePolicy: {
+          updateBehavior: 'LOG',  // Required by CRAWL_NEW_FOLDERS_ONLY
+          deleteBehavior: 'LOG',
+        },
+        configuration: JSON.stringify({
+          Version: 1.0,
+          Grouping: { TableGroupingPolicy: 'CombineCompatibleSchemas' },
+          CrawlerOutput: { Partitions: { AddOrUpdateBehavior: 'InheritFromTable' } },
+        }),
+        schedule: {
+          scheduleExpression: 'cron(0 13 * * ? *)',  // Daily, after the DynamoDB crawlers (noon)
+        },
       });
   }
 }
@@ -82,7 +82,11 @@ export class DataIngestionStack extends cdk.Stack {
     // Put the etl script into the bucket.
     new s3Deployment.BucketDeployment(this, 'DeployETLScripts', {
       destinationBucket: etlScriptBucket,
-      sources: [s3Deployment.Source.asset('./lib/scripts')],  // Path to local folder containing etl_GPStoDb.py
+      sources: [
+        s3Deployment.Source.asset('./lib/scripts'),  // Path to local folder containing etl_GPStoDb.py
+        // The GPS bucket chunk codec is shared with the Lambdas; only that file is needed next to the scripts
+        s3Deployment.Source.asset('./lib/lambda', { exclude: ['*', '!gps_bucket_codec.py'] }),
+      ],
       destinationKeyPrefix: 'scripts/',  // Place scripts in the "scripts/" folder in S3
     });
 
@@ -126,6 +130,48 @@ export class DataIngestionStack extends cdk.Stack {
     createGlueJob(this, lambdaDynamoDBAccessRole, etlScriptBucketName, glueTempS3BucketName, dynamoDbS3ResultsBucketName, 'etl_ENVtoDb.py', 'env');
     createGlueJob(this, lambdaDynamoDBAccessRole, etlScriptBucketName, glueTempS3BucketName, dynamoDbS3ResultsBucketName, 'etl_HEAtoDb.py', 'hea');
 
+    // Small-file compaction of the results bucket (scripts/compact_partitions.py). The incremental
+    // jobs and the stream exporters keep adding small files to each day's partition; this merges them.
+    const compactionRole = new Role(this, 'CompactionGlueRole', {
+      assumedBy: new ServicePrincipal('glue.amazonaws.com'),
+    });
+    compactionRole.addManagedPolicy(ManagedPolicy.fromAwsManagedPolicyName('service-role/AWSGlueServiceRole'));
+    s3BucketDynamoDb.grantReadWrite(compactionRole);  // Reads the small files, writes/deletes the merged ones, manifests and lock
+    etlScriptBucket.grantRead(compactionRole);
+
+    const compactionJob = new glue.CfnJob(this, 'CompactResultsGlueJob', {
+      role: compactionRole.roleArn,
+      command: {
+        name: 'pythonshell',  // One small Python process with pyarrow, no Spark cluster needed
+        scriptLocation: `s3://${etlScriptBucketName}/scripts/compact_partitions.py`,
+        pythonVersion: '3.9',
+      },
+      defaultArguments: {
+        'library-set': 'analytics',  // Ships pyarrow
+        '--additional-python-modules': 'boto3==1.35.14',  // The lock's conditional put (IfNoneMatch) needs a newer boto3 than Glue ships
+        '--extra-py-files': [
+          `s3://${etlScriptBucketName}/scripts/incremental_export.py`,
+          `s3://${etlScriptBucketName}/scripts/parquet_output.py`,
+          `s3://${etlScriptBucketName}/scripts/gps_bucket_codec.py`,
+        ].join(','),
+        '--output_path': `s3://${dynamoDbS3ResultsBucketName}/`,
+        '--target_mb': '128',
+        '--small_mb': '32',
+        '--min_age_minutes': '60',  // Never touches files a writer could still be retrying
+      },
+      glueVersion: '3.0',
+      maxCapacity: 1,  // 1 DPU (16 GB): enough for a 128 MB output file
+      timeout: 120,
+      name: 'compact-results',
+    });
+
+    new glue.CfnTrigger(this, 'CompactResultsTrigger', {
+      type: 'SCHEDULED',
+      schedule: 'cron(30 12 * * ? *)',  // Daily, before the results crawler (13:00) picks up the partitions
+      startOnCreation: true,
+      actions: [{ jobName: compactionJob.name! }],
+    }).addDependency(compactionJob);
+
     /* File upload Stack for field workers */
 
 
@@ -5,12 +5,16 @@ import * as lambda from 'aws-cdk-lib/aws-lambda';
 import * as iot from 'aws-cdk-lib/aws-iot';
 import * as iam from 'aws-cdk-lib/aws-iam';
 import * as dynamodb from 'aws-cdk-lib/aws-dynamodb';
+import * as sqs from 'aws-cdk-lib/aws-sqs';
+import { SqsEventSource, DynamoEventSource, SqsDlq } from 'aws-cdk-lib/aws-lambda-event-sources';
 import { CfnCrawler, CfnDatabase } from 'aws-cdk-lib/aws-glue';
 import { Role, ServicePrincipal, ManagedPolicy } from 'aws-cdk-lib/aws-iam';
 import { CfnParameter, CfnCondition, Fn } from 'aws-cdk-lib';
 import * as glue from 'aws-cdk-lib/aws-glue';
 import { Stack } from 'aws-cdk-lib';
 import { S3Client, HeadObjectCommand } from '@aws-sdk/client-s3';
+import * as fs from 'fs';
+import * as path from 'path';
 
 
 
@@ -60,6 +64,10 @@ export function createGlueJob(
 
         console.log(`dynamoDBTableName: ${dynamoDBTableName}`);
 
+        // Change capture (cdk deploy -c changeCapture=true): the table's stream feeds a Lambda that appends
+        // every change to the data lake as Parquet within about a minute, instead of waiting for a Glue run
+        const changeCapture = `${scope.node.tryGetContext('changeCapture')}` === 'true';
+
         // Create the DynamoDB Table (GpsDataTable)
         const dnyamoDataTable = new dynamodb.Table(scope, dynamoDBTableName, {
           tableName: dynamoDBTableName,
@@ -67,6 +75,9 @@ export function createGlueJob(
           sortKey: { name: 'Timestamp', type: dynamodb.AttributeType.STRING },  // Keeps Timestamp for ordering
           billingMode: dynamodb.BillingMode.PAY_PER_REQUEST, // On-demand billing
           removalPolicy: cdk.RemovalPolicy.DESTROY, // Automatically delete the table when the stack is destroyed
+          timeToLiveAttribute: 'ExpiresAt', // Expires the messageId dedup markers written by the topic processors
+          pointInTimeRecovery: true, // Required by the Glue job's point-in-time (incremental) exports
+          stream: changeCapture ? dynamodb.StreamViewType.NEW_AND_OLD_IMAGES : undefined, // Old images give the new GPS bucket chunks
         });
       
         // Create Lambda function for processing GPS data (Topic to DynamoDB)
@@ -76,6 +87,7 @@ export function createGlueJob(
           handler:  handlerLambda, // Assuming your Python file is named GPSTopicProcessor.py with a lambda_handler
           runtime: lambda.Runtime.PYTHON_3_12,
           role: lambdaDynamoDBAccessRole,
+          timeout: cdk.Duration.seconds(30), // Batched writes of large payloads/queue batches need more than the 3s default
           environment: {
             GpsDataTable: dnyamoDataTable.tableName, // Pass the table name to the Lambda function's environment variables
           },
@@ -84,24 +96,132 @@ export function createGlueJob(
         // Grant the Lambda function read/write permissions to the DynamoDB table
         dnyamoDataTable.grantReadWriteData(topicProcessorLambda);
     
+        // Buffered ingestion (cdk deploy -c bufferedIngestion=true): the IoT rule sends messages to an SQS queue
+        // and the processor receives them in batches, trading a few seconds of latency for far fewer invocations
+        const bufferedIngestion = `${scope.node.tryGetContext('bufferedIngestion')}` === 'true';
+        let ruleAction: iot.CfnTopicRule.ActionProperty;
+
+        if (bufferedIngestion) {
+          const ingestionDlq = new sqs.Queue(scope, `${prefix_upper}IngestionDLQ`, {
+            retentionPeriod: cdk.Duration.days(14),
+          });
+          const ingestionQueue = new sqs.Queue(scope, `${prefix_upper}IngestionQueue`, {
+            visibilityTimeout: cdk.Duration.seconds(180), // Must exceed the Lambda timeout
+            deadLetterQueue: { queue: ingestionDlq, maxReceiveCount: 3 },
+          });
+
+          // Allow IoT Core to send the topic's messages to the queue
+          const iotToSqsRole = new iam.Role(scope, `${prefix_upper}IotToSqsRole`, {
+            assumedBy: new iam.ServicePrincipal('iot.amazonaws.com'),
+          });
+          ingestionQueue.grantSendMessages(iotToSqsRole);
+
+          // Processors report failures per message (batchItemFailures) so successful writes aren't replayed
+          topicProcessorLambda.addEventSource(new SqsEventSource(ingestionQueue, {
+            batchSize: 100,
+            maxBatchingWindow: cdk.Duration.seconds(5),
+            reportBatchItemFailures: true,
+          }));
+
+          ruleAction = {
+            sqs: {
+              queueUrl: ingestionQueue.queueUrl,
+              roleArn: iotToSqsRole.roleArn,
+              useBase64: false,
+            },
+          };
+        } else {
+          ruleAction = {
+            lambda: {
+              functionArn: topicProcessorLambda.functionArn, // Trigger the Lambda function
+            },
+          };
+        }
+
+        if (changeCapture) {
+          const resultsBucket = s3.Bucket.fromBucketName(scope, `${prefix_upper}ChangeCaptureBucket`, s3BucketDynamoDbName);
+
+          // pyarrow comes from the AWS SDK for pandas layer; pass -c pyarrowLayerArn=... for another region/version
+          const pyarrowLayer = lambda.LayerVersion.fromLayerVersionArn(scope, `${prefix_upper}PyarrowLayer`,
+            scope.node.tryGetContext('pyarrowLayerArn') ??
+              `arn:aws:lambda:${stack.region}:336392948345:layer:AWSSDKPandas-Python312:13`);
+
+          // The exporters also import two of the Glue jobs' shared scripts (see change_capture.py): the
+          // Lambda code plus those files, copied at synth time (in the Python image if that fails)
+          const sharedScripts = ['incremental_export.py', 'parquet_output.py'];
+          const streamExporterCode = lambda.Code.fromAsset('lib', {
+            exclude: ['*', '!lambda', '!lambda/**', '!scripts', ...sharedScripts.map(f => `!scripts/${f}`)],
+            bundling: {
+              image: lambda.Runtime.PYTHON_3_12.bundlingImage,
+              command: ['bash', '-c', `cp -r /asset-input/lambda/. /asset-output/ && ` +
+                `cp ${sharedScripts.map(f => `/asset-input/scripts/${f}`).join(' ')} /asset-output/`],
+              local: {
+                tryBundle(outputDir: string) {
+                  fs.cpSync('lib/lambda', outputDir, { recursive: true });
+                  sharedScripts.forEach(f => fs.copyFileSync(path.join('lib/scripts', f), path.join(outputDir, f)));
+                  return true;
+                },
+              },
+            },
+          });
+
+          const streamExporterLambda = new lambda.Function(scope, `${prefix_upper}StreamExporterLambda`, {
+            functionName: `${prefix_upper}StreamExporter`,
+            code: streamExporterCode,
+            handler: `${prefix_upper}StreamExporter.lambda_handler`,
+            runtime: lambda.Runtime.PYTHON_3_12,
+            layers: [pyarrowLayer],
+            memorySize: 512,
+            timeout: cdk.Duration.seconds(60),
+            environment: {
+              OUTPUT_PATH: `s3://${s3BucketDynamoDbName}/${prefix_lower}_data/`,  // Same prefix as the Glue job's output
+              PARTITION_KEYS: 'dt',  // Must match the Glue job's --partition_keys
+            },
+          });
+          // Puts its files; lists, reads and deletes the ones a failed attempt left behind
+          resultsBucket.grantReadWrite(streamExporterLambda, `${prefix_lower}_data/*`);
+
+          // Batches of up to 1000 changes, at most a minute old: each shard writes about one file per partition per minute
+          const streamExporterDlq = new sqs.Queue(scope, `${prefix_upper}StreamExporterDLQ`, {
+            retentionPeriod: cdk.Duration.days(14),
+          });
+          streamExporterLambda.addEventSource(new DynamoEventSource(dnyamoDataTable, {
+            startingPosition: lambda.StartingPosition.TRIM_HORIZON,
+            batchSize: 1000,
+            maxBatchingWindow: cdk.Duration.seconds(60),
+            bisectBatchOnError: true,
+            retryAttempts: 5,
+            reportBatchItemFailures: true,
+            onFailure: new SqsDlq(streamExporterDlq),  // Stream position of batches that kept failing
+          }));
+
+          streamExporterLambda.applyRemovalPolicy(cdk.RemovalPolicy.DESTROY);
+        }
+
         // Create the IoT Rule
         const gpsIotRule = new iot.CfnTopicRule(scope, gpsIotRuleName, {
           topicRulePayload: {
             description: `Processes the ${prefix_upper} topic`,
             sql: `SELECT * FROM 'IoT/${prefix_upper}'`, // SQL query to select from 'IoT/GPS'
-            actions: [
-              {
-                lambda: {
-                  functionArn: topicProcessorLambda.functionArn, // Trigger the Lambda function
-                },
-              },
-            ],
+            actions: [ruleAction],
             ruleDisabled: false, // Enable the rule
           },
         });
     
         // EXPLICIT: Add Deletion Policy for the IoT Rule
         gpsIotRule.applyRemovalPolicy(cdk.RemovalPolicy.DESTROY);
+
+        // Fleet mode devices publish to their own topics ('IoT/GPS/<client id>', see IoTMockSensors/common/fleet.py).
+        // 'IoT/GPS/#' would not match the base topic the classic transmitters use, so they get a rule of their own.
+        const fleetIotRule = new iot.CfnTopicRule(scope, `${prefix_upper}FleetIotRule`, {
+          topicRulePayload: {
+            description: `Processes the per-device ${prefix_upper} topics of fleet mode`,
+            sql: `SELECT * FROM 'IoT/${prefix_upper}/+'`,
+            actions: [ruleAction],
+            ruleDisabled: false,
+          },
+        });
+        fleetIotRule.applyRemovalPolicy(cdk.RemovalPolicy.DESTROY);
     
         // Grant IoT Core permissions to invoke the Lambda function
         topicProcessorLambda.grantInvoke(new iam.ServicePrincipal('iot.amazonaws.com'));
@@ -138,6 +258,16 @@ export function createGlueJob(
         glueRole.addManagedPolicy(ManagedPolicy.fromAwsManagedPolicyName('service-role/AWSGlueServiceRole'));
         glueRole.addManagedPolicy(ManagedPolicy.fromAwsManagedPolicyName('AmazonDynamoDBReadOnlyAccess'));
         glueRole.addManagedPolicy(ManagedPolicy.fromAwsManagedPolicyName('AmazonS3FullAccess'));
+
+        // The Glue job reads the table through point-in-time exports (incremental_export.py) instead of scans
+        glueRole.addToPolicy(new iam.PolicyStatement({
+          actions: [
+            'dynamodb:ExportTableToPointInTime', // Start full/incremental exports of the table
+            'dynamodb:DescribeExport', // Poll them until they complete
+            'dynamodb:DescribeContinuousBackups', // Check the point-in-time window the watermark must fall in
+          ],
+          resources: [dnyamoDataTable.tableArn, `${dnyamoDataTable.tableArn}/export/*`],
+        }));
     
         // Step 2: Create AWS Glue Database (for storing the metadata from the crawler)
         const glueDatabase = new CfnDatabase(scope, glueDatabaseName, {
@@ -164,6 +294,7 @@ export function createGlueJob(
             dynamoDbTargets: [
               {
                 path: dynamoDBTableName,  // DynamoDB Table Name
+                scanAll: false,  // Infer the schema from a sample instead of scanning the whole (hot) table
               },
             ],
           },
@@ -189,14 +320,25 @@ export function createGlueJob(
             '--enable-metrics': '',  // Enables metrics tracking
             '--enable-continuous-cloudwatch-log': 'true',  // Logs to CloudWatch
             '--s3_output_path': `s3://${s3BucketDynamoDbName}/${prefix_lower}_data/`,  // Pass the S3 bucket path to your Glue job
+            '--export_bucket': glueTempBucketName,  // DynamoDB exports land here before the job reads them
+            // Only what changed since the last run; start a run with 'full' to rebuild. With change capture the
+            // stream keeps the output current and the job is only run to rebuild it
+            '--export_mode': changeCapture ? 'full' : 'incremental',
+            '--partition_keys': 'dt',  // Day partitions; 'dt,SensorId' adds one per animal/sensor (small herds only)
+            '--extra-py-files': [
+              `s3://${etlScriptBucketName}/scripts/incremental_export.py`,  // Shared export/watermark code
+              `s3://${etlScriptBucketName}/scripts/parquet_output.py`,  // Typed columns and partitioned Parquet writes
+              `s3://${etlScriptBucketName}/scripts/gps_bucket_codec.py`,  // Expands bucketed GPS items (from lib/lambda)
+            ].join(','),
+            '--additional-python-modules': 'boto3==1.35.14',  // Incremental exports need a newer boto3 than Glue ships
             '--Dlog4j2.formatMsgNoLookups': 'true',  // Disable Log4j lookups for security
             '--JOB_NAME': `${prefix}DnyamoDb-to-JSON`,  // Pass the job name dynamically
           },
           maxRetries: 0,  // Retry the job 3 times if it fails
-          glueVersion: '3.0',  // Glue version
+          glueVersion: '4.0',  // Glue version
           numberOfWorkers: 2,  // Number of workers (adjust as needed)
           workerType: 'G.1X',  // Worker type
-          timeout: 20,  // Job timeout in minutes
+          timeout: 60,  // Job timeout in minutes (exports take several minutes each, more when catching up)
         });
 
         
@@ -0,0 +1,284 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from botocore.exceptions import ClientError
+from incremental_export import split_s3_uri
+from parquet_output import COMPRESSION, arrow_schema
+
+# Small-file compaction for the results bucket. Incremental Glue runs, the stream
+# exporters and local_etl.py only ever add files, so partitions fill up with small
+# ones. Per partition (gps_data/dt=2024-09-30/...), files under --small-mb are packed
+# into --target-mb Parquet files with the tables' canonical column types, sorted by
+# SensorId and Timestamp within each row group.
+#
+# Each merge is swapped in through a manifest under s3://<bucket>/_compaction/<prefix>/:
+#   1. the merged file is staged under _compaction/ (outside the crawled prefixes)
+#   2. the manifest lists the inputs (key, ETag, size), the staged and the final key
+#   3. the staged file is copied to its final key, then the inputs are deleted in one
+#      batch, then the staged file and the manifest
+# A manifest left by a crashed run is finished on the next run: rolled forward if the
+# final file exists, otherwise rolled back. Until the batch delete, a query running
+# at that instant can count the merged rows twice; no rows are ever missing.
+#
+# Writers never rewrite a file, except a stream exporter replacing the files of a
+# failed batch within minutes; only files older than --min-age-minutes are merged, so
+# in-flight writes are never picked up. A lock object (a conditional put, which needs
+# boto3 1.35 or newer: the Glue job pins it) keeps compaction runs of the same prefix
+# apart. Don't run it while a Glue full rebuild is replacing the same prefix.
+#
+#   python compact_partitions.py --output_path s3://<results bucket>/ --prefixes gps_data,hea_data
+PREFIX_TABLES = {'gps_data': 'GpsDataTable', 'env_data': 'EnvDataTable', 'hea_data': 'HeaDataTable'}
+COMPACTION_PREFIX = '_compaction'
+TARGET_MB = 128
+SMALL_MB = 32
+MIN_AGE_MINUTES = 60
+LOCK_SECONDS = 3 * 3600  # A lock older than this is left over from a run that died
+ROW_GROUP_ROWS = 250_000
+
+
+def list_objects(s3, bucket, prefix):
+    request = {'Bucket': bucket, 'Prefix': prefix}
+    while True:
+        response = s3.list_objects_v2(**request)
+        yield from response.get('Contents', [])
+        if not response.get('IsTruncated'):
+            return
+        request['ContinuationToken'] = response['NextContinuationToken']
+
+
+def data_file(key):
+    name = key.rsplit('/', 1)[-1]
+    return name.endswith('.parquet') and not name.startswith(('_', '.'))
+
+
+def partition_values(directory, prefix):
+    """'gps_data/dt=2024-09-30/SensorId=7' -> ['dt', 'SensorId']."""
+    parts = directory[len(prefix):].strip('/').split('/')
+    return [part.split('=', 1)[0] for part in parts if '=' in part]
+
+
+def pack(files, target_bytes):
+    """Group small files, oldest first, into bins of about target_bytes (only bins of 2+ files)."""
+    bins, current, size = [], [], 0
+    for obj in sorted(files, key=lambda obj: (obj['LastModified'], obj['Key'])):
+        current.append(obj)
+        size += obj['Size']
+        if size >= target_bytes:
+            bins.append(current)
+            current, size = [], 0
+    bins.append(current)
+    return [group for group in bins if len(group) > 1]
+
+
+class PrefixLock:
+    """Exclusive lock on one prefix's compaction, taken with a conditional put."""
+
+    def __init__(self, s3, bucket, key, owner, lock_seconds=LOCK_SECONDS, now=lambda: datetime.now(timezone.utc)):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.owner = owner
+        self.lock_seconds = lock_seconds
+        self.now = now
+
+    def acquire(self):
+        body = json.dumps({'owner': self.owner, 'taken_at': self.now().isoformat()}).encode()
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body, IfNoneMatch='*')
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise
+        held = json.loads(self.s3.get_object(Bucket=self.bucket, Key=self.key)['Body'].read())
+        if self.now() - datetime.fromisoformat(held['taken_at']) < timedelta(seconds=self.lock_seconds):
+            return False
+        print(f"Taking over the stale lock of {held['owner']} on {self.key}")
+        self.s3.delete_object(Bucket=self.bucket, Key=self.key)
+        return self.acquire()
+
+    def release(self):
+        self.s3.delete_object(Bucket=self.bucket, Key=self.key)
+
+
+class Compactor:
+    def __init__(self, output_path, target_mb=TARGET_MB, small_mb=SMALL_MB, min_age_minutes=MIN_AGE_MINUTES,
+                 row_group_rows=ROW_GROUP_ROWS, s3=None, now=lambda: datetime.now(timezone.utc)):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.bucket, root = split_s3_uri(output_path)
+        self.root = root.strip('/') + '/' if root.strip('/') else ''
+        self.target_bytes = target_mb * 1024 * 1024
+        self.small_bytes = small_mb * 1024 * 1024
+        self.min_age = timedelta(minutes=min_age_minutes)
+        self.row_group_rows = row_group_rows
+        self.s3 = s3 or boto3.client('s3')
+        self.now = now
+        self.run_id = uuid.uuid4().hex[:12]
+
+    def manifest_prefix(self, prefix):
+        return f"{self.root}{COMPACTION_PREFIX}/{prefix}/"
+
+    def recover(self, prefix):
+        """Finish the merges a crashed run left half done. Returns how many manifests were found."""
+        leftovers = [obj['Key'] for obj in list_objects(self.s3, self.bucket, self.manifest_prefix(prefix))]
+        manifests = [key for key in leftovers if key.endswith('.json')]
+        for key in manifests:
+            manifest = json.loads(self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read())
+            if self.exists(manifest['output_key']):
+                print(f"Rolling forward {key}")
+                self.delete([item['key'] for item in manifest['inputs']])
+            else:
+                print(f"Rolling back {key}")
+            self.delete([manifest['staged_key'], key])
+        # Files staged by a run that died before writing their manifest
+        self.delete([key for key in leftovers if key.endswith('.parquet')])
+        return len(manifests)
+
+    def exists(self, key):
+        try:
+            self.s3.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def delete(self, keys):
+        for start in range(0, len(keys), 1000):
+            objects = [{'Key': key} for key in keys[start:start + 1000]]
+            self.s3.delete_objects(Bucket=self.bucket, Delete={'Objects': objects, 'Quiet': True})
+
+    def file_schema(self, prefix, directory):
+        schema = arrow_schema(PREFIX_TABLES[prefix])
+        keys = set(partition_values(directory, self.root + prefix)) | {'dt'}
+        return self.pyarrow.schema([field for field in schema if field.name not in keys])
+
+    def read(self, key, schema):
+        """One input file, with the canonical column types (Spark INT96 timestamps, missing columns...)."""
+        body = self.s3.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        table = self.parquet.read_table(io.BytesIO(body))
+        columns = []
+        for field in schema:
+            if field.name in table.column_names:
+                columns.append(table.column(field.name).cast(field.type))
+            else:
+                columns.append(self.pyarrow.nulls(table.num_rows, field.type))
+        return self.pyarrow.Table.from_arrays(columns, schema=schema)
+
+    def merge(self, group, schema, path):
+        """Write the group's rows to one local Parquet file. Returns the row count."""
+        rows = 0
+        buffered = []
+        with self.parquet.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+            def flush():
+                table = self.pyarrow.concat_tables(buffered)
+                sort_keys = [(name, 'ascending') for name in ('SensorId', 'Timestamp') if name in schema.names]
+                writer.write_table(table.sort_by(sort_keys), row_group_size=self.row_group_rows)
+
+            for obj in group:
+                table = self.read(obj['Key'], schema)
+                rows += table.num_rows
+                buffered.append(table)
+                if sum(t.num_rows for t in buffered) >= self.row_group_rows:
+                    flush()
+                    buffered = []
+            if buffered:
+                flush()
+        return rows
+
+    def compact_group(self, prefix, directory, group, sequence):
+        schema = self.file_schema(prefix, directory)
+        name = f"compacted-{self.run_id}-{sequence:05d}.{COMPRESSION}.parquet"
+        staged_key = f"{self.manifest_prefix(prefix)}{name}"
+        output_key = f"{directory}/{name}"
+        manifest_key = f"{self.manifest_prefix(prefix)}{self.run_id}-{sequence:05d}.json"
+        with tempfile.TemporaryDirectory(prefix='compact-') as work:
+            path = os.path.join(work, name)
+            rows = self.merge(group, schema, path)
+            written = self.parquet.read_metadata(path).num_rows
+            if written != rows:
+                raise RuntimeError(f"Merged file of {directory} has {written} rows, expected {rows}")
+            size = os.path.getsize(path)
+            with open(path, 'rb') as f:
+                self.s3.put_object(Bucket=self.bucket, Key=staged_key, Body=f)
+
+        manifest = {
+            'run': self.run_id,
+            'created_at': self.now().isoformat(),
+            'staged_key': staged_key,
+            'output_key': output_key,
+            'rows': rows,
+            'inputs': [{'key': obj['Key'], 'etag': obj.get('ETag'), 'size': obj['Size']} for obj in group],
+        }
+        self.s3.put_object(Bucket=self.bucket, Key=manifest_key, Body=json.dumps(manifest, indent=2).encode())
+        self.s3.copy_object(Bucket=self.bucket, Key=output_key, CopySource={'Bucket': self.bucket, 'Key': staged_key})
+        self.delete([obj['Key'] for obj in group])
+        self.delete([staged_key, manifest_key])
+        return size
+
+    def compact_prefix(self, prefix):
+        lock = PrefixLock(self.s3, self.bucket, f"{self.manifest_prefix(prefix)}lock", self.run_id, now=self.now)
+        if not lock.acquire():
+            return {'prefix': prefix, 'skipped': 'another compaction holds the lock'}
+        try:
+            started = time.monotonic()
+            recovered = self.recover(prefix)
+            directories = {}
+            for obj in list_objects(self.s3, self.bucket, f"{self.root}{prefix}/"):
+                if data_file(obj['Key']):
+                    directories.setdefault(obj['Key'].rsplit('/', 1)[0], []).append(obj)
+
+            before_files = sum(len(files) for files in directories.values())
+            before_bytes = sum(obj['Size'] for files in directories.values() for obj in files)
+            cutoff = self.now() - self.min_age
+            merged_files = merged_bytes = written_bytes = groups = 0
+            for directory, files in sorted(directories.items()):
+                small = [obj for obj in files if obj['Size'] < self.small_bytes and obj['LastModified'] <= cutoff]
+                for group in pack(small, self.target_bytes):
+                    groups += 1
+                    written_bytes += self.compact_group(prefix, directory, group, groups)
+                    merged_files += len(group)
+                    merged_bytes += sum(obj['Size'] for obj in group)
+
+            return {
+                'prefix': prefix,
+                'partitions': len(directories),
+                'recovered_manifests': recovered,
+                'merged_groups': groups,
+                'before': {'files': before_files, 'bytes': before_bytes},
+                'after': {'files': before_files - merged_files + groups,
+                          'bytes': before_bytes - merged_bytes + written_bytes},
+                'seconds': round(time.monotonic() - started, 2),
+            }
+        finally:
+            lock.release()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge small Parquet files in the results bucket')
+    parser.add_argument('--output_path', required=True, help='s3://<results bucket>/')
+    parser.add_argument('--prefixes', default=','.join(sorted(PREFIX_TABLES)), help='comma-separated, e.g. gps_data,hea_data')
+    parser.add_argument('--target_mb', type=int, default=TARGET_MB)
+    parser.add_argument('--small_mb', type=int, default=SMALL_MB)
+    parser.add_argument('--min_age_minutes', type=int, default=MIN_AGE_MINUTES)
+    # Run as a Glue job, the job arguments come with Glue's own ones mixed in
+    args, _ = parser.parse_known_args(argv)
+
+    compactor = Compactor(args.output_path, args.target_mb, args.small_mb, args.min_age_minutes)
+    for prefix in [name.strip() for name in args.prefixes.split(',') if name.strip()]:
+        print(json.dumps(compactor.compact_prefix(prefix)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
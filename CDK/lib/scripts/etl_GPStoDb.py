@@ -4,30 +4,42 @@ from awsglue.context import GlueContext
 from awsglue.job import Job
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
+from incremental_export import TableExporter, export_item  # Shipped with --extra-py-files
+from parquet_output import parse_keys, spark_schema, table_rows, write
 
 # Initialize Glue job
-args = getResolvedOptions(sys.argv, ['JOB_NAME', 's3_output_path'])  # Get the s3_output_path argument
+# export_mode: 'incremental' appends only what changed since the last run, 'full' rebuilds the output
+# partition_keys: 'dt' (one partition per day) or 'dt,SensorId' (see parquet_output.py)
+args = getResolvedOptions(sys.argv, ['JOB_NAME', 's3_output_path', 'export_bucket', 'export_mode', 'partition_keys'])
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 job = Job(glueContext)
 job.init(args['JOB_NAME'], args)
 
-# Read from DynamoDB table
-dynamo_frame = glueContext.create_dynamic_frame.from_options(
-    connection_type="dynamodb",
-    connection_options={
-        "dynamodb.input.tableName": "GpsDataTable",  # Replace with your table name
-        "dynamodb.throughput.read.percent": "1.0"   # Adjust throughput usage as needed
-    }
-)
-
-# Step 3: Combine all data into a single JSON file and write it to S3
 s3_output_path = args['s3_output_path']  # Use the passed S3 output path
-# Convert the AWS Glue DynamicFrame to a Spark DataFrame, reduce the output to a single partition 
-# (so the result is written as a single JSON file), and append the new data to the existing files 
-# in the specified S3 path without overwriting any existing data.
-dynamo_frame.toDF().coalesce(1).write.mode('overwrite').json(s3_output_path)
+exporter = TableExporter("GpsDataTable", s3_output_path, args['export_bucket'])
+partition_keys = parse_keys(args['partition_keys'])
+schema = spark_schema("GpsDataTable")
+
+# Read the table through DynamoDB point-in-time exports (no read capacity used):
+# the changes since the watermark, or everything when rebuilding (see incremental_export.py)
+for export in exporter.exports(args['export_mode']):
+    # Unwrap the DynamoDB JSON, drop the bookkeeping items (dedup markers, health stats)
+    # the topic processors keep in the same table and type the columns
+    items = sc.textFile(",".join(export.data_files)).map(export_item).filter(lambda item: item is not None)
+    frame = spark.createDataFrame(items.flatMap(lambda item: table_rows("GpsDataTable", item)), schema).cache()
+    rows = frame.count()
+
+    # Write day-partitioned Parquet from many tasks at once: appended as new files
+    # on incremental runs, replacing the whole output on a full rebuild
+    if rows:
+        partitions = write(frame, s3_output_path, export.full, rows, partition_keys)
+        print(f"Wrote {rows} rows into {partitions} partitions of {s3_output_path}")
+
+    # Only now move the watermark, so a failed write is exported again by the next run
+    exporter.commit(export, rows)
+    frame.unpersist()
 
-# Step 4: Commit the job to signal completion
+# Commit the job to signal completion
 job.commit()
@@ -0,0 +1,233 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import boto3
+
+try:
+    from gps_bucket_codec import LAYOUT as GPS_BUCKET_LAYOUT
+except ImportError:  # Run from a checkout (local_etl.py, gps_data_loader.py): the codec lives with the Lambdas
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+    from gps_bucket_codec import LAYOUT as GPS_BUCKET_LAYOUT
+
+# Shared by the etl_*toDb Glue jobs (shipped to them with --extra-py-files).
+#
+# Instead of scanning the whole table every run, the jobs read DynamoDB point-in-time
+# exports: an INCREMENTAL_EXPORT of only what changed since the last run (no RCUs
+# consumed, cost proportional to the new data), or a FULL_EXPORT when rebuilding.
+# Incremental exports carry each changed item's old and new image; only what the new one
+# adds is written (the appended chunks of a GPS bucket item, see record_item), so an item
+# updated in several windows isn't exported again each time.
+# The watermark - the point in time the last export reached - is kept per table in
+#   s3://<results bucket>/_export_state/<table>.json
+# and only advanced after the job has written that export's rows.
+#
+#   --export_mode incremental   append what changed since the watermark (full on the first run)
+#   --export_mode full          rebuild: overwrite the output from a full export
+#
+# Incremental export windows must span 15 minutes to 24 hours; a job that fell further
+# behind catches up in several windows. The tables need point-in-time recovery enabled.
+MIN_WINDOW = timedelta(minutes=15)
+MAX_WINDOW = timedelta(hours=24)
+POLL_SECONDS = 20
+STATE_PREFIX = '_export_state'
+EXPORT_PREFIX = 'dynamodb-exports'
+BOOKKEEPING_PREFIX = '__'  # Dedup markers and health stats the topic processors keep in the same table
+
+
+def split_s3_uri(uri):
+    """'s3://bucket/some/key' -> ('bucket', 'some/key')."""
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+def number(text):
+    try:
+        return int(text)
+    except ValueError:
+        value = Decimal(text)
+        return int(value) if value == value.to_integral_value() else float(value)
+
+
+def attribute(value):
+    """DynamoDB JSON attribute value -> plain JSON value (binary stays base64 text)."""
+    (kind, data), = value.items()
+    if kind == 'N':
+        return number(data)
+    if kind == 'NS':
+        return sorted(number(v) for v in data)
+    if kind in ('SS', 'BS'):
+        return sorted(data)
+    if kind == 'L':
+        return [attribute(v) for v in data]
+    if kind == 'M':
+        return {k: attribute(v) for k, v in data.items()}
+    if kind == 'NULL':
+        return None
+    return data  # S, B, BOOL
+
+
+def export_item(line):
+    """One line of an export data file -> the item as a plain dict, or None to skip it."""
+    return record_item(json.loads(line))
+
+
+def record_item(record):
+    """One parsed export record -> the item as a plain dict, or None to skip it.
+
+    Full exports hold {"Item": ...}; incremental exports hold {"Keys", "OldImage",
+    "NewImage"} and have no NewImage for deletions (TTL expiry included), which are
+    skipped: the exported history is append-only. An updated item is reduced to what
+    its old image didn't already have: a GPS bucket item to its newly appended chunks,
+    any other item to nothing when it was re-put unchanged.
+    """
+    image = record.get('Item', record.get('NewImage'))
+    if not image:
+        return None
+    item = {name: attribute(value) for name, value in image.items()}
+    if str(item.get('SensorId', '')).startswith(BOOKKEEPING_PREFIX):
+        return None
+    old_image = record.get('OldImage')
+    if not old_image:
+        return item
+    old = {name: attribute(value) for name, value in old_image.items()}
+    if item.get('Layout') == GPS_BUCKET_LAYOUT:
+        # Chunks are compared by content rather than position: a bucket that expired
+        # and was started again within the window shares no chunks with its old image
+        seen = set(old.get('Chunks') or [])
+        chunks = [chunk for chunk in item.get('Chunks') or [] if chunk not in seen]
+        return dict(item, Chunks=chunks) if chunks else None
+    return None if item == old else item
+
+
+class Export:
+    """One completed export: its data files and the point in time it covers up to."""
+
+    def __init__(self, full, export_to, data_files, description):
+        self.full = full
+        self.export_to = export_to
+        self.data_files = data_files
+        self.description = description
+
+
+class TableExporter:
+    def __init__(self, table_name, output_path, export_bucket, output_format='parquet', dynamodb=None, s3=None,
+                 sleep=time.sleep, now=lambda: datetime.now(timezone.utc)):
+        self.table_name = table_name
+        self.output_path = output_path
+        self.output_format = output_format
+        self.export_bucket = export_bucket
+        self.dynamodb = dynamodb or boto3.client('dynamodb')
+        self.s3 = s3 or boto3.client('s3')
+        self.sleep = sleep
+        self.now = now
+        self.state_bucket, _ = split_s3_uri(output_path)
+        self.state_key = f"{STATE_PREFIX}/{table_name}.json"
+
+    def load_state(self):
+        try:
+            body = self.s3.get_object(Bucket=self.state_bucket, Key=self.state_key)['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        return json.loads(body)
+
+    def save_state(self, state):
+        self.s3.put_object(Bucket=self.state_bucket, Key=self.state_key, Body=json.dumps(state, indent=2).encode())
+
+    def watermark(self):
+        state = self.load_state()
+        if not state:
+            return None
+        if state.get('format', 'json') != self.output_format:
+            # The output was written in another format (the JSON of earlier versions):
+            # rebuild it rather than appending files the crawler can't combine with it
+            print(f"Output of {self.table_name} is {state.get('format', 'json')}, rebuilding as {self.output_format}")
+            return None
+        return datetime.fromisoformat(state['watermark'])
+
+    def table_arn(self):
+        return self.dynamodb.describe_table(TableName=self.table_name)['Table']['TableArn']
+
+    def earliest_restorable(self):
+        backups = self.dynamodb.describe_continuous_backups(TableName=self.table_name)['ContinuousBackupsDescription']
+        recovery = backups.get('PointInTimeRecoveryDescription', {})
+        if recovery.get('PointInTimeRecoveryStatus') != 'ENABLED':
+            raise RuntimeError(f"Point-in-time recovery is not enabled on {self.table_name}")
+        return recovery['EarliestRestorableDateTime']
+
+    def plan(self, mode):
+        """[(full, export_from, export_to), ...] for this run; [] when less than MIN_WINDOW passed."""
+        now = self.now()
+        watermark = None if mode == 'full' else self.watermark()
+        if watermark is not None and watermark < self.earliest_restorable():
+            print(f"Watermark {watermark.isoformat()} is older than the point-in-time window, rebuilding")
+            watermark = None
+        if watermark is None:
+            return [(True, None, now)]
+        windows = []
+        while now - watermark >= MIN_WINDOW:
+            export_to = min(watermark + MAX_WINDOW, now)
+            windows.append((False, watermark, export_to))
+            watermark = export_to
+        return windows
+
+    def start(self, full, export_from, export_to):
+        request = {
+            'TableArn': self.table_arn(),
+            'S3Bucket': self.export_bucket,
+            'S3Prefix': f"{EXPORT_PREFIX}/{self.table_name}",
+            'ExportFormat': 'DYNAMODB_JSON',
+        }
+        if full:
+            request.update(ExportType='FULL_EXPORT', ExportTime=export_to)
+        else:
+            request.update(ExportType='INCREMENTAL_EXPORT', IncrementalExportSpecification={
+                'ExportFromTime': export_from,
+                'ExportToTime': export_to,
+                'ExportViewType': 'NEW_AND_OLD_IMAGES',
+            })
+        return self.dynamodb.export_table_to_point_in_time(**request)['ExportDescription']['ExportArn']
+
+    def wait(self, export_arn):
+        while True:
+            description = self.dynamodb.describe_export(ExportArn=export_arn)['ExportDescription']
+            status = description['ExportStatus']
+            if status == 'COMPLETED':
+                return description
+            if status == 'FAILED':
+                raise RuntimeError(f"Export {export_arn} failed: {description.get('FailureCode')} "
+                                   f"{description.get('FailureMessage')}")
+            self.sleep(POLL_SECONDS)
+
+    def data_files(self, description):
+        """s3:// URIs of the export's data files, from its manifest-files.json."""
+        manifest_key = description['ExportManifest'].rsplit('/', 1)[0] + '/manifest-files.json'
+        body = self.s3.get_object(Bucket=self.export_bucket, Key=manifest_key)['Body'].read().decode('utf-8')
+        return [f"s3://{self.export_bucket}/{json.loads(line)['dataFileS3Key']}" for line in body.splitlines() if line]
+
+    def exports(self, mode):
+        """Run this job's exports one at a time, oldest window first, yielding each completed Export."""
+        if mode not in ('incremental', 'full'):
+            raise ValueError(f"Unknown export mode {mode!r}, expected 'incremental' or 'full'")
+        for full, export_from, export_to in self.plan(mode):
+            started = time.monotonic()
+            description = self.wait(self.start(full, export_from, export_to))
+            files = self.data_files(description)
+            print(f"{'Full' if full else 'Incremental'} export of {self.table_name} up to {export_to.isoformat()}: "
+                  f"{description.get('ItemCount', 0)} items in {len(files)} files, {time.monotonic() - started:.0f} s")
+            yield Export(full, export_to, files, description)
+
+    def commit(self, export, rows):
+        """Advance the watermark once the export's rows are written."""
+        self.save_state({
+            'table': self.table_name,
+            'format': self.output_format,
+            'watermark': export.export_to.isoformat(),
+            'last_export': export.description['ExportArn'],
+            'last_export_type': 'FULL_EXPORT' if export.full else 'INCREMENTAL_EXPORT',
+            'last_rows': rows,
+            'updated_at': self.now().isoformat(),
+        })
@@ -0,0 +1,263 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import boto3
+from incremental_export import BOOKKEEPING_PREFIX, TableExporter, record_item, split_s3_uri
+from parquet_output import COMPRESSION, ROWS_PER_FILE, TABLE_COLUMNS, arrow_schema, parse_keys, table_rows
+
+# Glue-free version of the etl_*toDb jobs: the same item conversion, typed columns and
+# dt-partitioned snappy Parquet (incremental_export.py, parquet_output.py), run by a
+# single Python process with pyarrow. Items are streamed from the source and written
+# as row groups, so memory stays bounded by CHUNK_ROWS whatever the table size.
+#
+# Sources:
+#   --source export   DynamoDB point-in-time exports with the jobs' watermark, exactly
+#                     like the Glue jobs (needs an s3:// output; no read capacity used)
+#   --source scan     a paginated Scan of the table (uses read capacity, always a full rebuild)
+#   --source dump     local files: DynamoDB export data files (*.json.gz) or NDJSON items
+#
+#   python local_etl.py gps --source export --export-bucket <glue temp bucket> --output s3://<results>/gps_data/
+#   python local_etl.py hea --source dump --dump ./exports --output /tmp/lake/hea_data/
+#
+# A full run writes the new files first and then removes the old ones, so readers see
+# either the previous output or the new one. Files are sorted by SensorId and
+# Timestamp within each row group (the Glue jobs sort whole files).
+TABLES = {'gps': 'GpsDataTable', 'env': 'EnvDataTable', 'hea': 'HeaDataTable'}
+CHUNK_ROWS = 100_000  # Rows buffered over all partitions before they are written out as row groups
+MAX_OPEN_FILES = 64  # Partition files kept open at once; the least recently written one is closed first
+SCAN_PAGE_ITEMS = 1000
+
+
+def dump_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in sorted(os.walk(path)):
+                for name in sorted(names):
+                    if name.endswith(('.json', '.json.gz', '.ndjson', '.ndjson.gz')):
+                        yield os.path.join(folder, name)
+        else:
+            yield path
+
+
+def dump_items(paths):
+    """Items from local files, one JSON object per line: export records ({"Item": ...}) or plain items."""
+    for path in dump_files(paths):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'Item' in record or 'NewImage' in record or 'Keys' in record:
+                    item = record_item(record)
+                elif not str(record.get('SensorId', '')).startswith(BOOKKEEPING_PREFIX):
+                    item = record
+                else:
+                    item = None
+                if item is not None:
+                    yield item
+
+
+def scan_items(table_name, dynamodb=None, page_items=SCAN_PAGE_ITEMS):
+    """Items from a paginated Scan, one page in memory at a time."""
+    dynamodb = dynamodb or boto3.client('dynamodb')
+    for page in dynamodb.get_paginator('scan').paginate(TableName=table_name, PaginationConfig={'PageSize': page_items}):
+        for image in page.get('Items', []):
+            item = record_item({'Item': image})
+            if item is not None:
+                yield item
+
+
+def export_file_items(s3, uri):
+    """Items of one export data file, streamed (gzip) from S3."""
+    bucket, key = split_s3_uri(uri)
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    with gzip.open(body, 'rt', encoding='utf-8') as lines:
+        for line in lines:
+            if line.strip():
+                item = record_item(json.loads(line))
+                if item is not None:
+                    yield item
+
+
+class PartitionedParquetSink:
+    """Writes typed rows as Hive-partitioned Parquet, one row group per flush per partition.
+
+    Output is a local directory or an s3:// prefix (files are staged locally and
+    uploaded when closed). Each partition has at most one open file, rolled over at
+    rows_per_file rows.
+    """
+
+    def __init__(self, output, table_name, partition_keys, rows_per_file=ROWS_PER_FILE, chunk_rows=CHUNK_ROWS,
+                 max_open_files=MAX_OPEN_FILES, s3=None):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.output = output
+        self.remote = output.startswith('s3://')
+        self.s3 = (s3 or boto3.client('s3')) if self.remote else None
+        self.root = tempfile.mkdtemp(prefix='local-etl-') if self.remote else output
+        self.partition_keys = partition_keys
+        self.rows_per_file = rows_per_file
+        self.chunk_rows = chunk_rows
+        self.max_open_files = max_open_files
+        schema = arrow_schema(table_name)
+        names = [name for name, _ in TABLE_COLUMNS[table_name]] + ['dt']
+        self.key_indexes = [names.index(key) for key in partition_keys]
+        self.file_indexes = [i for i, name in enumerate(names) if name not in partition_keys]
+        self.file_schema = pyarrow.schema([schema.field(i) for i in self.file_indexes])
+        self.sort_indexes = [names.index('SensorId'), names.index('Timestamp')]
+        self.run_id = uuid.uuid4().hex[:12]
+        self.buffers = {}
+        self.buffered = 0
+        self.open_files = {}  # partition -> [writer, path, rows]; dicts keep insertion order, oldest first
+        self.sequence = 0
+        self.written = []  # Relative paths of the finished files
+        self.rows = 0
+        self.bytes = 0
+
+    def add(self, rows):
+        for row in rows:
+            partition = tuple(f"{key}={row[i]}" for key, i in zip(self.partition_keys, self.key_indexes))
+            self.buffers.setdefault(partition, []).append(row)
+        self.buffered += len(rows)
+        if self.buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        for partition, rows in self.buffers.items():
+            rows.sort(key=lambda row: [row[i] for i in self.sort_indexes])
+            columns = {field.name: [row[i] for row in rows] for field, i in zip(self.file_schema, self.file_indexes)}
+            table = self.pyarrow.Table.from_pydict(columns, schema=self.file_schema)
+            entry = self.open_file(partition)
+            entry[0].write_table(table)
+            entry[2] += len(rows)
+            self.rows += len(rows)
+            if entry[2] >= self.rows_per_file:
+                self.close_file(partition)
+        self.buffers = {}
+        self.buffered = 0
+
+    def open_file(self, partition):
+        entry = self.open_files.pop(partition, None)
+        if entry is None:
+            if len(self.open_files) >= self.max_open_files:
+                self.close_file(next(iter(self.open_files)))
+            self.sequence += 1
+            relative = '/'.join([*partition, f"part-{self.run_id}-{self.sequence:05d}.{COMPRESSION}.parquet"])
+            path = os.path.join(self.root, *relative.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = self.parquet.ParquetWriter(path + '.writing', self.file_schema, compression=COMPRESSION)
+            entry = [writer, relative, 0]
+        self.open_files[partition] = entry  # Re-inserted last: most recently written
+        return entry
+
+    def close_file(self, partition):
+        writer, relative, _ = self.open_files.pop(partition)
+        writer.close()
+        path = os.path.join(self.root, *relative.split('/'))
+        os.replace(path + '.writing', path)  # Local readers never see a partial file
+        self.bytes += os.path.getsize(path)
+        if self.remote:
+            bucket, prefix = split_s3_uri(self.output)
+            self.s3.upload_file(path, bucket, prefix.rstrip('/') + '/' + relative)
+            os.remove(path)
+        self.written.append(relative)
+
+    def close(self):
+        self.flush()
+        for partition in list(self.open_files):
+            self.close_file(partition)
+        if self.remote:
+            shutil.rmtree(self.root, ignore_errors=True)
+        return self.written
+
+    def replace_previous(self):
+        """After a full run: remove every file under the output that this run didn't write."""
+        keep = set(self.written)
+        removed = 0
+        if self.remote:
+            bucket, prefix = split_s3_uri(self.output)
+            prefix = prefix.rstrip('/') + '/'
+            stale = []
+            for page in self.s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+                stale += [{'Key': obj['Key']} for obj in page.get('Contents', []) if obj['Key'][len(prefix):] not in keep]
+            for start in range(0, len(stale), 1000):
+                self.s3.delete_objects(Bucket=bucket, Delete={'Objects': stale[start:start + 1000], 'Quiet': True})
+            return len(stale)
+        for folder, _, names in os.walk(self.output):
+            for name in names:
+                relative = os.path.relpath(os.path.join(folder, name), self.output).replace(os.sep, '/')
+                if relative not in keep:
+                    os.remove(os.path.join(folder, name))
+                    removed += 1
+        return removed
+
+
+def run(table_name, items, sink, full, batch_items=1000):
+    """Convert and write one stream of items. Returns the run's numbers."""
+    started = time.monotonic()
+    count = 0
+    batch = []
+    for item in items:
+        count += 1
+        batch.extend(table_rows(table_name, item))
+        if len(batch) >= batch_items:
+            sink.add(batch)
+            batch = []
+    sink.add(batch)
+    files = sink.close()
+    removed = sink.replace_previous() if full and sink.rows else 0  # Like the jobs, an empty run leaves the output alone
+    seconds = time.monotonic() - started
+    return {'items': count, 'rows': sink.rows, 'files': len(files), 'bytes': sink.bytes, 'removed_files': removed,
+            'seconds': round(seconds, 3), 'rows_per_second': round(sink.rows / seconds, 1) if seconds else 0}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a DynamoDB -> partitioned Parquet ETL job without Glue')
+    parser.add_argument('table', choices=sorted(TABLES))
+    parser.add_argument('--source', choices=['export', 'scan', 'dump'], default='export')
+    parser.add_argument('--output', required=True, help='Local directory or s3://bucket/<table>_data/')
+    parser.add_argument('--dump', nargs='+', default=[], help='Files or directories for --source dump')
+    parser.add_argument('--export-bucket', help='Bucket the DynamoDB exports are written to (--source export)')
+    parser.add_argument('--mode', choices=['incremental', 'full'], default='incremental',
+                        help='--source export only; scans and dumps always rebuild')
+    parser.add_argument('--partition-keys', default='dt')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--rows-per-file', type=int, default=ROWS_PER_FILE)
+    args = parser.parse_args(argv)
+
+    table_name = TABLES[args.table]
+    partition_keys = parse_keys(args.partition_keys)
+
+    def sink():
+        return PartitionedParquetSink(args.output, table_name, partition_keys, rows_per_file=args.rows_per_file,
+                                      chunk_rows=args.chunk_rows)
+
+    if args.source != 'export':
+        items = scan_items(table_name) if args.source == 'scan' else dump_items(args.dump)
+        print(json.dumps(run(table_name, items, sink(), full=True)))
+        return
+
+    if not args.output.startswith('s3://') or not args.export_bucket:
+        sys.exit('--source export needs an s3:// --output (the watermark is kept there) and --export-bucket')
+    s3 = boto3.client('s3')
+    exporter = TableExporter(table_name, args.output, args.export_bucket, s3=s3)
+    for export in exporter.exports(args.mode):
+        items = (item for uri in export.data_files for item in export_file_items(s3, uri))
+        result = run(table_name, items, sink(), full=export.full)
+        exporter.commit(export, result['rows'])  # Only after the rows are written, as the Glue jobs do
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import math
+import os
+import sys
+from datetime import datetime, timezone
+
+try:
+    from gps_bucket_codec import LAYOUT as GPS_BUCKET_LAYOUT, decode_chunk
+except ImportError:  # Run from a checkout (local_etl.py, gps_data_loader.py): the codec lives with the Lambdas
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+    from gps_bucket_codec import LAYOUT as GPS_BUCKET_LAYOUT, decode_chunk
+
+# Shared by the etl_*toDb Glue jobs (shipped to them with --extra-py-files).
+#
+# The jobs write snappy-compressed Parquet, Hive-partitioned by day:
+#   s3://<results bucket>/gps_data/dt=2024-09-30/part-....snappy.parquet
+# Columns are typed (doubles, ints, timestamps) instead of the strings the DynamoDB
+# JSON carried, so Athena/Metabase read only the columns and days a query touches.
+# Within each file the rows are sorted by SensorId then Timestamp, so per-animal
+# queries also skip most row groups without a partition per animal.
+#
+#   --partition_keys dt            one partition per day (default)
+#   --partition_keys dt,SensorId   also one per animal/sensor - only for small herds,
+#                                  thousands of animals means thousands of tiny files a day
+PARTITION_KEYS = 'dt'
+ROWS_PER_FILE = 1_000_000  # Roughly 20-40 MB of snappy Parquet for these narrow rows
+COMPRESSION = 'snappy'
+
+# Columns per table, in file order: (column, type). Types are Spark SQL / Glue catalog
+# names. Mirrors the topic schemas of the processors (lambda/topic_schemas.py).
+COMMON_COLUMNS = [('SensorId', 'string'), ('Topic', 'string'), ('Timestamp', 'timestamp'), ('ValidFor', 'int')]
+TABLE_COLUMNS = {
+    'GpsDataTable': COMMON_COLUMNS + [
+        ('ElkId', 'string'),
+        ('Latitude', 'double'),
+        ('Longitude', 'double'),
+    ],
+    'EnvDataTable': COMMON_COLUMNS + [
+        ('Latitude', 'double'),
+        ('Longitude', 'double'),
+        ('Temperature', 'double'),
+        ('Humidity', 'double'),
+        ('WindDirection', 'string'),
+    ],
+    'HeaDataTable': COMMON_COLUMNS + [
+        ('ElkId', 'string'),
+        ('BodyTemperature', 'double'),
+        ('HeartRate', 'double'),
+        ('RespirationRate', 'double'),
+        ('ActivityLevel', 'double'),
+        ('Posture', 'string'),
+        ('HydrationLevel', 'double'),
+        ('StressLevel', 'double'),
+        ('Anomalies', 'array<string>'),  # Inline health flags ('HeartRate:spike', ...), see lambda/health_stats.py
+    ],
+}
+
+# Bucketed GPS items (GPS_STORAGE_MODE=bucketed, see lambda/gps_buckets.py) hold many
+# fixes each; they are expanded back into one row per fix (lambda/gps_bucket_codec.py,
+# shipped to the jobs with --extra-py-files).
+
+
+def parse_keys(text):
+    """'dt,SensorId' -> ['dt', 'SensorId']."""
+    return [key.strip() for key in (text or PARTITION_KEYS).split(',') if key.strip()]
+
+
+def parse_timestamp(value):
+    """Timestamp as the processors store it (ISO text, 'YYYY-MM-DD HH:MM:SS' or epoch) -> naive UTC datetime."""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    text = str(value).strip()
+    try:
+        return datetime.fromtimestamp(float(text), tz=timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        pass
+    parsed = datetime.fromisoformat(text[:-1] + '+00:00' if text.endswith('Z') else text)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def cast(value, kind):
+    if value is None:
+        return None
+    try:
+        if kind == 'double':
+            return float(value)
+        if kind == 'int':
+            return int(value)
+        if kind == 'timestamp':
+            return parse_timestamp(value)
+        if kind == 'array<string>':
+            return [str(v) for v in value] if isinstance(value, (list, tuple, set)) else [str(value)]
+    except (TypeError, ValueError):
+        return None  # A bad value becomes a null cell rather than failing the job
+    return value if isinstance(value, str) else str(value)
+
+
+def expand(item):
+    """One exported item -> the records it holds (several for a GPS bucket item)."""
+    if item.get('Layout') != GPS_BUCKET_LAYOUT:
+        return [item]
+    records = []
+    for chunk in item.get('Chunks') or []:
+        for t, lat, lon in decode_chunk(chunk, item['BucketStart']):
+            records.append({'SensorId': item['SensorId'], 'ElkId': item['SensorId'], 'Topic': item.get('Topic'),
+                            'Timestamp': t, 'Latitude': lat, 'Longitude': lon})
+    return records
+
+
+def table_rows(table_name, item):
+    """One exported item -> typed row tuples in column order, plus the dt partition column."""
+    columns = TABLE_COLUMNS[table_name]
+    rows = []
+    for record in expand(item):
+        row = [cast(record.get(name), kind) for name, kind in columns]
+        timestamp = row[2]
+        if timestamp is None:
+            continue  # Without a timestamp the row has no partition
+        rows.append(tuple(row) + (timestamp.date().isoformat(),))
+    return rows
+
+
+def spark_schema(table_name):
+    from pyspark.sql import types
+
+    kinds = {'string': types.StringType(), 'double': types.DoubleType(), 'int': types.IntegerType(),
+             'timestamp': types.TimestampType(), 'array<string>': types.ArrayType(types.StringType())}
+    fields = [types.StructField(name, kinds[kind], True) for name, kind in TABLE_COLUMNS[table_name]]
+    return types.StructType(fields + [types.StructField('dt', types.StringType(), False)])
+
+
+def arrow_schema(table_name):
+    """The same columns as spark_schema, for the pyarrow engine (local_etl.py)."""
+    import pyarrow
+
+    kinds = {'string': pyarrow.string(), 'double': pyarrow.float64(), 'int': pyarrow.int32(),
+             'timestamp': pyarrow.timestamp('us'), 'array<string>': pyarrow.list_(pyarrow.string())}
+    fields = [pyarrow.field(name, kinds[kind]) for name, kind in TABLE_COLUMNS[table_name]]
+    return pyarrow.schema(fields + [pyarrow.field('dt', pyarrow.string(), nullable=False)])
+
+
+def write(frame, path, full, rows, partition_keys, rows_per_file=ROWS_PER_FILE):
+    """Write one export's rows as partitioned Parquet, in parallel.
+
+    Rows are hash-partitioned on the partition keys plus a salt on SensorId, so each
+    day is split over about rows_per_file-sized files written by separate tasks, and
+    each animal's rows of a day stay together in one file.
+    """
+    from pyspark.sql import functions
+
+    partitions = frame.select(*partition_keys).distinct().count()
+    files_per_partition = max(1, math.ceil(rows / max(partitions, 1) / rows_per_file))
+    salt = functions.pmod(functions.hash('SensorId'), functions.lit(files_per_partition))
+    (frame.repartition(partitions * files_per_partition, *[functions.col(key) for key in partition_keys], salt)
+        .sortWithinPartitions('SensorId', 'Timestamp')
+        .write.mode('overwrite' if full else 'append')
+        .partitionBy(*partition_keys)
+        .option('compression', COMPRESSION)
+        .parquet(path))
+    return partitions
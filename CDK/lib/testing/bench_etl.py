@@ -0,0 +1,185 @@
+import argparse
+import gzip
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Benchmark of the Glue-free ETL engine (scripts/local_etl.py) against the Glue jobs.
+# It writes synthetic DynamoDB export data files for a table, converts them with the
+# engine in a child process (so its peak memory is measured on its own) and prices the
+# run on Fargate next to a Glue run of the same rows. Run from CDK/:
+#   python lib/testing/bench_etl.py --tables gps hea --items 100000 1000000 --output etl.json
+# Needs pyarrow. The Glue side is a model: pass the rows/s and start-up time of one of
+# your job runs (the jobs log "Wrote N rows ...") for a like-for-like comparison.
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.join(HERE, '..', 'scripts')
+sys.path.insert(0, SCRIPTS)
+
+# us-east-1 list prices
+GLUE_DPU_HOUR = 0.44
+GLUE_WORKERS = 2  # As deployed by glue-job-factory.ts: 2 x G.1X, one DPU each
+GLUE_MIN_SECONDS = 60  # Glue 4.0 bills per second with a one-minute minimum
+FARGATE_VCPU_HOUR = 0.04048
+FARGATE_GB_HOUR = 0.004445
+FARGATE_VCPU = 1
+FARGATE_GB = 2
+FARGATE_MIN_SECONDS = 60
+BOOKKEEPING_SHARE = 0.02  # Dedup markers among the items, dropped by the conversion
+
+
+def attribute_value(name, kind, animal, when):
+    if name == 'SensorId' or name == 'ElkId':
+        return {'S': str(animal)}
+    if kind == 'timestamp':
+        return {'S': when.isoformat()}
+    if kind == 'double':
+        return {'N': repr(round(random.uniform(-180, 180), 7))}
+    if kind == 'int':
+        return {'N': '300'}
+    if kind == 'array<string>':
+        return {'L': [{'S': 'HeartRate:spike'}]} if random.random() < 0.01 else {'NULL': True}
+    if name == 'Topic':
+        return {'S': 'IoT/BENCH'}
+    return {'S': random.choice(['Standing', 'Lying', 'Walking'])}
+
+
+def write_dump(table_name, items, animals, days, directory, items_per_file=100_000):
+    """Export-format data files (gzip, one {"Item": ...} per line) spread over `days` days."""
+    from parquet_output import TABLE_COLUMNS
+
+    columns = TABLE_COLUMNS[table_name]
+    start = datetime(2024, 9, 1)
+    step = timedelta(days=days) / max(items, 1)
+    handle = None
+    for index in range(items):
+        if index % items_per_file == 0:
+            if handle:
+                handle.close()
+            handle = gzip.open(os.path.join(directory, f"data-{index // items_per_file:05d}.json.gz"), 'wt', compresslevel=1)
+        animal = index % animals
+        if random.random() < BOOKKEEPING_SHARE:
+            item = {'SensorId': {'S': f"__msg#{index}"}, 'Timestamp': {'S': 'marker'}}
+        else:
+            when = start + step * index
+            item = {name: attribute_value(name, kind, animal, when) for name, kind in columns}
+        handle.write(json.dumps({'Item': item}) + '\n')
+    if handle:
+        handle.close()
+
+
+def child(args):
+    """Runs in the child process: one engine run over the dump, with its own peak RSS."""
+    from local_etl import PartitionedParquetSink, dump_items, run
+    from parquet_output import parse_keys
+
+    sink = PartitionedParquetSink(args.child_output, args.child_table, parse_keys('dt'), chunk_rows=args.chunk_rows)
+    result = run(args.child_table, dump_items([args.child_dump]), sink, full=True)
+    result['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    print(json.dumps(result))
+
+
+def glue_model(rows, rows_per_second, startup_seconds):
+    processing = rows / rows_per_second
+    billed = max(GLUE_MIN_SECONDS, processing)
+    return {
+        'assumed_rows_per_second': rows_per_second,
+        'latency_seconds': round(startup_seconds + processing, 1),
+        'billed_seconds': round(billed, 1),
+        'cost_usd': round(billed / 3600 * GLUE_WORKERS * GLUE_DPU_HOUR, 5),
+    }
+
+
+def fargate_cost(seconds):
+    billed = max(FARGATE_MIN_SECONDS, seconds)
+    return round(billed / 3600 * (FARGATE_VCPU * FARGATE_VCPU_HOUR + FARGATE_GB * FARGATE_GB_HOUR), 5)
+
+
+def run_case(table, items, animals, days, chunk_rows, glue_rows_per_second, glue_startup_seconds):
+    from local_etl import TABLES
+
+    table_name = TABLES[table]
+    with tempfile.TemporaryDirectory(prefix='bench-etl-') as work:
+        dump = os.path.join(work, 'dump')
+        output = os.path.join(work, 'out')
+        os.makedirs(dump)
+        write_dump(table_name, items, animals, days, dump)
+        dump_bytes = sum(os.path.getsize(os.path.join(dump, name)) for name in os.listdir(dump))
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child-table', table_name, '--child-dump', dump,
+             '--child-output', output, '--chunk-rows', str(chunk_rows)],
+            check=True, capture_output=True, text=True)
+        engine = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    return {
+        'table': table_name,
+        'items': items,
+        'animals': animals,
+        'days': days,
+        'chunk_rows': chunk_rows,
+        'dump_bytes': dump_bytes,
+        'rows': engine['rows'],
+        'files': engine['files'],
+        'parquet_bytes': engine['bytes'],
+        'seconds': engine['seconds'],
+        'rows_per_second': engine['rows_per_second'],
+        'peak_rss_mb': engine['peak_rss_mb'],
+        'local_cost_usd': fargate_cost(engine['seconds']),
+        'glue': glue_model(engine['rows'], glue_rows_per_second, glue_startup_seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the local ETL engine against the Glue jobs')
+    parser.add_argument('--tables', nargs='+', choices=['gps', 'env', 'hea'], default=['gps'])
+    parser.add_argument('--items', nargs='+', type=int, default=[100_000, 1_000_000])
+    parser.add_argument('--animals', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--chunk-rows', type=int, default=100_000)
+    parser.add_argument('--glue-rows-per-second', type=float, default=50_000,
+                        help='throughput of the Glue job (2 x G.1X), from a real run')
+    parser.add_argument('--glue-startup-seconds', type=float, default=30)
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    parser.add_argument('--child-table', help=argparse.SUPPRESS)
+    parser.add_argument('--child-dump', help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_table:
+        child(args)
+        return
+
+    random.seed(7)
+    results = []
+    for table in args.tables:
+        for items in args.items:
+            result = run_case(table, items, args.animals, args.days, args.chunk_rows, args.glue_rows_per_second,
+                              args.glue_startup_seconds)
+            results.append(result)
+            print(f"{table} items={items}: {result['rows_per_second']} rows/s, {result['files']} files, "
+                  f"peak {result['peak_rss_mb']} MB, ${result['local_cost_usd']} local vs "
+                  f"${result['glue']['cost_usd']} Glue", file=sys.stderr)
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
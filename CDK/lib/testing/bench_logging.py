@@ -0,0 +1,99 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+# Benchmarks the topic processors' logging overhead: the old full-event/per-record
+# print() calls against the sampled structured logger. Run from CDK/:
+#   python lib/testing/bench_logging.py --records 8 1000 --invocations 200
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+from structured_log import StructuredLogger
+
+
+def make_event(num_records):
+    payload = [
+        {
+            "sensor_id": i,
+            "elk_id": i + 1,
+            "timestamp": "2025-01-01 00:00:00",
+            "body_temperature": round(random.uniform(36.5, 39.5), 1),
+            "heart_rate": random.randint(30, 50),
+            "respiration_rate": random.randint(10, 35),
+            "activity_level": round(random.uniform(0, 1), 2),
+            "posture": "Standing",
+            "hydration_level": round(random.uniform(50, 100), 1),
+            "stress_level": round(random.uniform(0, 10), 2),
+        }
+        for i in range(num_records)
+    ]
+    return {"messageId": "bench", "topic": "IoT/HEA", "timestamp": time.time(), "payload": payload}
+
+
+def log_before(event):
+    # What HEATopicProcessor used to log on every invocation
+    print(f"Received event: {json.dumps(event)}")
+    for elk_data in event['payload']:
+        elk_id = elk_data.get('elk_id')
+        print(f"Processing ElkId {elk_id}:")
+        print(f"  - BodyTemperature: {elk_data.get('body_temperature')}")
+        print(f"  - HeartRate: {elk_data.get('heart_rate')}")
+        print(f"  - RespirationRate: {elk_data.get('respiration_rate')}")
+        print(f"  - ActivityLevel: {elk_data.get('activity_level')}")
+        print(f"  - HydrationLevel: {elk_data.get('hydration_level')}")
+        print(f"  - StressLevel: {elk_data.get('stress_level')}")
+        print(f"✅ ElkId {elk_id} health data written to DynamoDB (from IoT Topic: {event['topic']})")
+
+
+def make_log_after(sample_rate):
+    logger = StructuredLogger('HEA', level='INFO', sample_rate=sample_rate, emit=lambda line: print(line))
+
+    def log_after(event):
+        # What the processors log now: a sampled event plus one summary line
+        logger.begin(event)
+        logger.debug('Converted records', records=lambda: event['payload'])
+        logger.info('Batch written to DynamoDB', topic=event['topic'], records=len(event['payload']),
+                    stats={'written': len(event['payload']), 'retried': 0, 'dropped': 0, 'rejected': 0})
+        logger.end()
+
+    return log_after
+
+
+def run(log_fn, event, invocations):
+    sink = io.StringIO()
+    with contextlib.redirect_stdout(sink):
+        started = time.perf_counter()
+        for _ in range(invocations):
+            log_fn(event)
+        elapsed = time.perf_counter() - started
+    records = invocations * len(event['payload'])
+    return {
+        'us_per_record': round(elapsed * 1e6 / records, 3),
+        'bytes_per_record': round(len(sink.getvalue().encode()) / records, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark topic processor logging overhead')
+    parser.add_argument('--records', type=int, nargs='+', default=[8, 100, 1000], help='Records per message')
+    parser.add_argument('--invocations', type=int, default=200)
+    parser.add_argument('--sample-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    random.seed(1)
+    results = []
+    for num_records in args.records:
+        event = make_event(num_records)
+        before = run(log_before, event, args.invocations)
+        after = run(make_log_after(args.sample_rate), event, args.invocations)
+        results.append({'records': num_records, 'before': before, 'after': after})
+        print(f"{num_records:>6} records/msg  before: {before['us_per_record']:>8} us/record {before['bytes_per_record']:>8} B/record"
+              f"  after: {after['us_per_record']:>8} us/record {after['bytes_per_record']:>8} B/record")
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
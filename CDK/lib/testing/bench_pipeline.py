@@ -0,0 +1,217 @@
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import sys
+import time
+
+# End-to-end load benchmark of the ingestion pipeline, entirely local:
+#   transmitter logic + create_topic (IoTMockSensors) -> LocalBroker (IoT Core + rule)
+#   -> GPS/ENV/HEA TopicProcessor.lambda_handler, directly or through LocalQueue
+#   -> LocalDynamoDB
+# It sweeps device counts, records per message, payload encodings and ingestion paths,
+# and writes one machine-readable result per combination. Run from CDK/:
+#   python lib/testing/bench_pipeline.py --devices 10 100 --records 1 8 64 --messages 2000 --output baseline.json
+# Needs the Lambda and transmitter dependencies (boto3, numpy), but no AWS access.
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.abspath(os.path.join(HERE, '..', '..', '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(REPO, 'IoTMockSensors'))
+
+# Quiet, sampled-off logging and no real AWS calls from the processors
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from local_broker import LocalBroker
+from local_dynamodb import LocalDynamoDB
+from local_queue import LocalQueue
+
+TOPICS = {'gps': 'IoT/GPS', 'env': 'IoT/ENV', 'hea': 'IoT/HEA'}
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_transmitter(kind):
+    """The transmitter's configuration (create_topic) and sensor logic, loaded side by side."""
+    folder = os.path.join(REPO, 'IoTMockSensors', {'gps': 'IoT_GPS', 'env': 'IoT_Env', 'hea': 'IoT_HEA'}[kind])
+    configuration = load_module(f'{kind}_configuration', os.path.join(folder, 'configuration.py'))
+    logic_file = {'gps': 'gps_collar_logic.py', 'env': 'env_logic.py', 'hea': 'hea_logic.py'}[kind]
+    logic = load_module(f'{kind}_logic', os.path.join(folder, logic_file))
+    # setup_config() would read the topic from SSM
+    setattr(configuration, f'{kind.upper()}_TOPIC_NAME', TOPICS[kind])
+    return configuration, logic
+
+
+def load_processor(kind, db):
+    """Import the real processor module and point its clients at the local table."""
+    processor = load_module(f'{kind.upper()}TopicProcessor',
+                            os.path.join(HERE, '..', 'lambda', f'{kind.upper()}TopicProcessor.py'))
+    processor.writer.client = db
+    processor.dedup.client = db
+    if hasattr(processor, 'detector'):
+        processor.detector.client = db
+    processor.metrics.emit = lambda line: None  # Still computed, just not printed
+    return processor
+
+
+class MessageSource:
+    """Generates messages with the transmitter logic: `devices` devices, `records` records each."""
+
+    def __init__(self, kind, configuration, logic, devices, records):
+        self.kind = kind
+        self.configuration = configuration
+        self.logic = logic
+        self.devices = devices
+        self.records = records
+        self.animals = devices * records
+        if kind == 'gps':
+            self.herd = logic.HerdModel(self.animals, seed=1)
+            self.positions = None
+        elif kind == 'env':
+            self.sensor_positions = [logic.initial_position() for _ in range(self.animals)]
+        else:
+            self.health = logic.HealthModel(self.animals, seed=1)
+
+    def start_round(self):
+        if self.kind == 'gps':
+            self.herd.step()
+            self.positions = self.herd.positions()
+        elif self.kind == 'hea':
+            self.health.step()
+
+    def message(self, device):
+        first = device * self.records
+        ids = range(first, first + self.records)
+        if self.kind == 'gps':
+            payload = self.positions[first:first + self.records]
+        elif self.kind == 'env':
+            payload = [self.logic.sensor_reading(*self.sensor_positions[i]) for i in ids]
+        else:
+            payload = self.health.records(first, first + self.records)
+        return self.configuration.create_topic(payload, topic=TOPICS[self.kind], first_id=first)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_case(kind, transmitter, devices, records, encoding, path, messages, batch_size):
+    configuration, logic = transmitter
+    configuration.COMPACT_ENCODING = encoding == 'compact'
+    db = LocalDynamoDB()
+    processor = load_processor(kind, db)
+    broker = LocalBroker()
+    latencies = []
+
+    def invoke(event):
+        response = processor.lambda_handler(event, None)
+        now = time.time()
+        for message in ([json.loads(record['body']) for record in event['Records']] if 'Records' in event else [event]):
+            latencies.append(now - message['timestamp'])
+        return response
+
+    queue = None
+    if path == 'buffered':
+        queue = LocalQueue(batch_size=batch_size, batching_window=float('inf'))
+        broker.add_rule(f"{TOPICS[kind]}/#", queue.send)
+    else:
+        broker.add_rule(f"{TOPICS[kind]}/#", invoke)
+
+    source = MessageSource(kind, configuration, logic, devices, records)
+    transmitter_cpu = 0.0
+    sent = 0
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    while sent < messages:
+        source.start_round()
+        for device in range(min(devices, messages - sent)):
+            cpu = time.process_time()
+            payload = json.dumps(source.message(device))
+            transmitter_cpu += time.process_time() - cpu
+            broker.publish(TOPICS[kind], payload, 1)
+            sent += 1
+            if queue is not None and queue.ready():
+                queue.invoke(lambda event, context: invoke(event))
+    if queue is not None:
+        queue.drain(lambda event, context: invoke(event))
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    latencies.sort()
+    table = processor.writer.table_name
+    return {
+        'topic': kind,
+        'path': path,
+        'devices': devices,
+        'records_per_message': records,
+        'encoding': encoding,
+        'messages': sent,
+        'records': sent * records,
+        'messages_per_second': round(sent / wall, 1),
+        'records_per_second': round(sent * records / wall, 1),
+        'p50_latency_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_latency_ms': round(percentile(latencies, 99) * 1000, 3),
+        'cpu_us_per_message': round(cpu / sent * 1e6, 1),
+        'pipeline_cpu_us_per_message': round((cpu - transmitter_cpu) / sent * 1e6, 1),
+        'bytes_per_message': round(broker.bytes / sent, 1),
+        'items_stored': db.count(table),
+        'dynamodb_calls': db.stats()['calls'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local end-to-end ingestion pipeline benchmark')
+    parser.add_argument('--topics', nargs='+', choices=sorted(TOPICS), default=sorted(TOPICS))
+    parser.add_argument('--devices', nargs='+', type=int, default=[10, 100, 1000])
+    parser.add_argument('--records', nargs='+', type=int, default=[1, 8, 64], help='records per message')
+    parser.add_argument('--encodings', nargs='+', choices=['json', 'compact'], default=['json'])
+    parser.add_argument('--paths', nargs='+', choices=['direct', 'buffered'], default=['direct'])
+    parser.add_argument('--messages', type=int, default=2000, help='messages per combination')
+    parser.add_argument('--batch-size', type=int, default=100, help='queue batch size on the buffered path')
+    parser.add_argument('--output', help='write the JSON baseline here instead of stdout')
+    args = parser.parse_args()
+
+    results = []
+    for kind in args.topics:
+        transmitter = load_transmitter(kind)
+        for path in args.paths:
+            for encoding in args.encodings:
+                for devices in args.devices:
+                    for records in args.records:
+                        result = run_case(kind, transmitter, devices, records, encoding, path, args.messages, args.batch_size)
+                        results.append(result)
+                        print(f"{kind} {path} {encoding} devices={devices} records={records}: "
+                              f"{result['messages_per_second']} msg/s, p99 {result['p99_latency_ms']} ms, "
+                              f"{result['cpu_us_per_message']} us CPU/msg", file=sys.stderr)
+
+    baseline = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'messages_per_case': args.messages,
+        'results': results,
+    }
+    text = json.dumps(baseline, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import json
+import time
+
+# Local stand-in for AWS IoT Core: an MQTT broker plus topic rules. It exposes
+# publish/publishAsync like AWSIoTMQTTClient, so transmitter code can publish to it
+# unchanged, and routes each message to the rules whose topic filter matches
+# ('+' and '#' wildcards, '#' also matching the parent level, as in the IoT rules).
+#
+#   broker = LocalBroker()
+#   broker.add_rule("IoT/GPS/#", lambda message: GPSTopicProcessor.lambda_handler(message, None))
+#   broker.publish("IoT/GPS", json.dumps(configuration.create_topic(...)), 1)
+#
+# A rule action receives the parsed message (SELECT * FROM ...); for the buffered
+# path pass LocalQueue.send as the action and drain the queue into the handler.
+
+
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for index, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if index >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[index]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class LocalBroker:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.rules = []  # (topic filter, action)
+        self.published = 0
+        self.unrouted = 0
+        self.bytes = 0
+        self.latencies = []  # Seconds from publish to the rule actions returning
+
+    def add_rule(self, topic_filter, action):
+        self.rules.append((topic_filter, action))
+
+    def publish(self, topic, payload, qos=1):
+        """Route one message synchronously; returns True like AWSIoTMQTTClient.publish."""
+        started = self.clock()
+        self.published += 1
+        self.bytes += len(payload)
+        actions = [action for topic_filter, action in self.rules if topic_matches(topic_filter, topic)]
+        if not actions:
+            self.unrouted += 1
+            return True
+        message = json.loads(payload)
+        for action in actions:
+            action(message)
+        self.latencies.append(self.clock() - started)
+        return True
+
+    def publishAsync(self, topic, payload, qos=1, ackCallback=None):
+        self.publish(topic, payload, qos)
+        if ackCallback:
+            ackCallback(self.published)
+        return self.published
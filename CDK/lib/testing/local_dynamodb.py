@@ -0,0 +1,236 @@
+import json
+import math
+import re
+import threading
+import time
+import zlib
+
+from botocore.exceptions import ClientError
+
+# Local stand-in for the low-level DynamoDB client, covering the calls the topic
+# processors make (batch_write_item, conditional put_item for dedup markers,
+# delete_item, conditional update_item for GPS buckets, batch_get_item). Items are kept in
+# attribute-value form keyed by (table, SensorId, Timestamp).
+#
+# write_capacity, when set, is a per-table WCU/s budget: writes beyond it come back
+# as UnprocessedItems (or ProvisionedThroughputExceededException), like a
+# provisioned table being throttled. read_capacity does the same for scan (RCU/s,
+# eventually consistent: half a unit per 4 KB). latency adds a fixed delay per call.
+# Every change is passed to the listeners as (table, old item, new item); that is
+# how local_stream.LocalStream stands in for the tables' DynamoDB Streams.
+#
+#   client = LocalDynamoDB(write_capacity=1000, latency=0.005)
+#   GPSTopicProcessor.writer.client = client
+
+KEY_NAMES = ('SensorId', 'Timestamp')
+SET_ASSIGNMENT = re.compile(r'\s*(\w+)\s*=\s*(.+?)\s*(?:,(?=\s*\w+\s*=)|$)')
+LIST_APPEND = re.compile(r'list_append\(\s*if_not_exists\(\s*(\w+)\s*,\s*(:\w+)\s*\)\s*,\s*(:\w+)\s*\)$')
+ADD_DEFAULT = re.compile(r'if_not_exists\(\s*(\w+)\s*,\s*(:\w+)\s*\)\s*\+\s*(:\w+)$')
+NOT_CONTAINS = re.compile(r'NOT contains\(\s*(\w+)\s*,\s*(:\w+)\s*\)$')
+EXPIRED_OR_NEW = re.compile(r'attribute_not_exists\(SensorId\) OR (\w+) < (:\w+)$')
+
+
+def client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+def item_size(item):
+    """Rough DynamoDB item size in bytes (names + JSON of the values)."""
+    return sum(len(name) + len(json.dumps(value, default=len)) for name, value in item.items())
+
+
+def write_units(item):
+    return max(1, math.ceil(item_size(item) / 1024))
+
+
+class LocalDynamoDB:
+    def __init__(self, write_capacity=None, latency=0.0, clock=time.monotonic, read_capacity=None):
+        self.write_capacity = write_capacity
+        self.read_capacity = read_capacity
+        self.read_window_start = {}
+        self.read_window_units = {}
+        self.latency = latency
+        self.clock = clock
+        self.tables = {}  # table -> {(pk, sk): item}
+        self.lock = threading.Lock()  # BatchWriter submits chunks from a thread pool
+        self.window_start = {}
+        self.window_units = {}
+        self.calls = {}
+        self.consumed_units = 0
+        self.throttled_requests = 0
+        self.listeners = []  # Called with (table, old item or None, new item or None) under the lock
+
+    def changed(self, table_name, old, new):
+        for listener in self.listeners:
+            listener(table_name, old, new)
+
+    def call(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def take_capacity(self, table, units):
+        """Consume write units from the table's current one-second window; False when throttled."""
+        if self.write_capacity is None:
+            self.consumed_units += units
+            return True
+        now = self.clock()
+        if now - self.window_start.get(table, -1.0) >= 1.0:
+            self.window_start[table] = now
+            self.window_units[table] = 0
+        if self.window_units[table] + units > self.write_capacity:
+            return False
+        self.window_units[table] += units
+        self.consumed_units += units
+        return True
+
+    @staticmethod
+    def key_of(item):
+        return tuple(next(iter(item[name].values())) for name in KEY_NAMES)
+
+    def table(self, name):
+        return self.tables.setdefault(name, {})
+
+    def batch_write_item(self, RequestItems):
+        self.call('BatchWriteItem')
+        unprocessed = {}
+        with self.lock:
+            for table_name, requests in RequestItems.items():
+                if len(requests) > 25:
+                    raise client_error('ValidationException', 'BatchWriteItem')
+                keys = [self.key_of(request['PutRequest']['Item']) for request in requests]
+                if len(set(keys)) != len(keys):
+                    raise client_error('ValidationException', 'BatchWriteItem')  # Duplicate keys in one batch
+                table = self.table(table_name)
+                for request, key in zip(requests, keys):
+                    item = request['PutRequest']['Item']
+                    if self.take_capacity(table_name, write_units(item)):
+                        self.changed(table_name, table.get(key), item)
+                        table[key] = item
+                    else:
+                        self.throttled_requests += 1
+                        unprocessed.setdefault(table_name, []).append(request)
+        return {'UnprocessedItems': unprocessed}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None):
+        """Supports the conditions attribute_not_exists(SensorId) and
+        attribute_not_exists(SensorId) OR <number attribute> < :value."""
+        self.call('PutItem')
+        with self.lock:
+            table = self.table(TableName)
+            key = self.key_of(Item)
+            if ConditionExpression is not None and key in table:
+                match = EXPIRED_OR_NEW.match(ConditionExpression)
+                if ConditionExpression != 'attribute_not_exists(SensorId)' and match is None:
+                    raise client_error('ValidationException', 'PutItem')
+                current = table[key].get(match.group(1)) if match else None
+                if not (current and float(current['N']) < float(ExpressionAttributeValues[match.group(2)]['N'])):
+                    raise client_error('ConditionalCheckFailedException', 'PutItem')
+            if not self.take_capacity(TableName, write_units(Item)):
+                self.throttled_requests += 1
+                raise client_error('ProvisionedThroughputExceededException', 'PutItem')
+            self.changed(TableName, table.get(key), Item)
+            table[key] = Item
+        return {}
+
+    def delete_item(self, TableName, Key):
+        self.call('DeleteItem')
+        with self.lock:
+            old = self.table(TableName).pop(self.key_of(Key), None)
+            if old is not None:
+                self.changed(TableName, old, None)
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None):
+        """Supports SET with plain values, list_append(if_not_exists(a, :x), :y) and if_not_exists(a, :x) + :n,
+        with an optional NOT contains(list, :v) condition."""
+        self.call('UpdateItem')
+        values = ExpressionAttributeValues
+        if not UpdateExpression.startswith('SET '):
+            raise client_error('ValidationException', 'UpdateItem')
+        with self.lock:
+            table = self.table(TableName)
+            key = self.key_of(Key)
+            item = dict(table.get(key, Key))
+            if ConditionExpression is not None:
+                match = NOT_CONTAINS.match(ConditionExpression)
+                if match is None:
+                    raise client_error('ValidationException', 'UpdateItem')
+                if values[match.group(2)] in item.get(match.group(1), {}).get('L', []):
+                    raise client_error('ConditionalCheckFailedException', 'UpdateItem')
+            for name, expression in SET_ASSIGNMENT.findall(UpdateExpression[4:]):
+                if match := LIST_APPEND.match(expression):
+                    current = item.get(match.group(1), values[match.group(2)])
+                    item[name] = {'L': current['L'] + values[match.group(3)]['L']}
+                elif match := ADD_DEFAULT.match(expression):
+                    current = item.get(match.group(1), values[match.group(2)])
+                    item[name] = {'N': str(float(current['N']) + float(values[match.group(3)]['N'])).removesuffix('.0')}
+                elif expression in values:
+                    item[name] = values[expression]
+                else:
+                    raise client_error('ValidationException', 'UpdateItem')
+            if not self.take_capacity(TableName, write_units(item)):
+                self.throttled_requests += 1
+                raise client_error('ProvisionedThroughputExceededException', 'UpdateItem')
+            self.changed(TableName, table.get(key), item)
+            table[key] = item
+        return {}
+
+    def batch_get_item(self, RequestItems):
+        self.call('BatchGetItem')
+        responses = {}
+        with self.lock:
+            for table_name, request in RequestItems.items():
+                table = self.table(table_name)
+                responses[table_name] = [table[self.key_of(key)] for key in request['Keys'] if self.key_of(key) in table]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def scan(self, TableName, Segment=0, TotalSegments=1, ExclusiveStartKey=None, Limit=None,
+             ReturnConsumedCapacity='NONE'):
+        """Parallel-scan aware: items are split over segments by partition key, pages stop at Limit or 1 MB."""
+        self.call('Scan')
+        with self.lock:
+            if self.read_capacity is not None:
+                now = self.clock()
+                if now - self.read_window_start.get(TableName, -1.0) >= 1.0:
+                    self.read_window_start[TableName] = now
+                    self.read_window_units[TableName] = 0.0
+                if self.read_window_units[TableName] >= self.read_capacity:
+                    self.throttled_requests += 1
+                    raise client_error('ProvisionedThroughputExceededException', 'Scan')
+            keys = sorted(key for key in self.table(TableName) if zlib.crc32(str(key[0]).encode()) % TotalSegments == Segment)
+            if ExclusiveStartKey is not None:
+                start = self.key_of(ExclusiveStartKey)
+                keys = [key for key in keys if key > start]
+            items = []
+            size = 0
+            for key in keys:
+                if (Limit is not None and len(items) >= Limit) or size >= 1024 * 1024:
+                    break
+                item = self.table(TableName)[key]
+                items.append(item)
+                size += item_size(item)
+            units = max(0.5, math.ceil(size / 4096) / 2)
+            if self.read_capacity is not None:
+                self.read_window_units[TableName] += units
+        response = {'Items': items, 'Count': len(items), 'ScannedCount': len(items)}
+        if len(items) < len(keys):
+            response['LastEvaluatedKey'] = {name: items[-1][name] for name in KEY_NAMES}
+        if ReturnConsumedCapacity != 'NONE':
+            response['ConsumedCapacity'] = {'TableName': TableName, 'CapacityUnits': units}
+        return response
+
+    def count(self, table_name, include_markers=False):
+        items = self.tables.get(table_name, {})
+        if include_markers:
+            return len(items)
+        return sum(1 for pk, _ in items if not str(pk).startswith('__'))
+
+    def stats(self):
+        return {
+            'calls': dict(self.calls),
+            'consumed_write_units': self.consumed_units,
+            'throttled_requests': self.throttled_requests,
+            'items': {name: len(items) for name, items in self.tables.items()},
+        }
@@ -0,0 +1,82 @@
+import json
+import time
+import uuid
+from collections import deque
+
+# Local stand-in for the SQS queue between the IoT rule and a topic processor.
+# It batches messages the way the SQS event source does (batch size + batching
+# window), invokes the handler with an SQS-shaped event and requeues whatever
+# the handler reports in batchItemFailures.
+#
+#   queue = LocalQueue(batch_size=100, batching_window=5)
+#   queue.send(configuration.create_topic(...))
+#   queue.drain(GPSTopicProcessor.lambda_handler)
+
+
+class LocalQueue:
+    def __init__(self, batch_size=100, batching_window=5.0, max_receives=3, clock=time.monotonic):
+        self.batch_size = batch_size
+        self.batching_window = batching_window
+        self.max_receives = max_receives  # After this many failed receives a message goes to the DLQ
+        self.clock = clock
+        self.messages = deque()
+        self.dead_letters = []
+        self.invocations = 0
+        self.delivered = 0
+
+    def send(self, message):
+        """Enqueue one IoT message (the dict the transmitter publishes)."""
+        self.messages.append({'messageId': str(uuid.uuid4()), 'body': json.dumps(message), 'receives': 0, 'sent': self.clock()})
+
+    def ready(self):
+        """A batch is due when it is full or its oldest message has waited out the batching window."""
+        if not self.messages:
+            return False
+        return len(self.messages) >= self.batch_size or self.clock() - self.messages[0]['sent'] >= self.batching_window
+
+    def receive_batch(self):
+        batch = [self.messages.popleft() for _ in range(min(self.batch_size, len(self.messages)))]
+        for message in batch:
+            message['receives'] += 1
+        return batch
+
+    @staticmethod
+    def to_event(batch):
+        return {
+            'Records': [
+                {
+                    'messageId': message['messageId'],
+                    'body': message['body'],
+                    'attributes': {'ApproximateReceiveCount': str(message['receives'])},
+                    'eventSource': 'aws:sqs',
+                }
+                for message in batch
+            ]
+        }
+
+    def invoke(self, handler, context=None):
+        """Deliver one batch to the handler and requeue its reported failures."""
+        batch = self.receive_batch()
+        if not batch:
+            return None
+        self.invocations += 1
+        try:
+            response = handler(self.to_event(batch), context) or {}
+            failed_ids = {failure['itemIdentifier'] for failure in response.get('batchItemFailures', [])}
+        except Exception:
+            failed_ids = {message['messageId'] for message in batch}  # The whole batch is retried
+
+        for message in batch:
+            if message['messageId'] not in failed_ids:
+                self.delivered += 1
+            elif message['receives'] >= self.max_receives:
+                self.dead_letters.append(message)
+            else:
+                self.messages.append(message)
+        return failed_ids
+
+    def drain(self, handler, context=None):
+        """Invoke the handler until the queue is empty (ignores the batching window)."""
+        while self.messages:
+            self.invoke(handler, context)
+        return {'invocations': self.invocations, 'delivered': self.delivered, 'dead_letters': len(self.dead_letters)}
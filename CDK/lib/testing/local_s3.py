@@ -0,0 +1,121 @@
+import hashlib
+import io
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+# Local stand-in for the S3 client calls the data lake writers and the compaction job
+# make (put_object, get_object, head_object, copy_object, delete_object(s),
+# list_objects_v2). Objects are plain files under a directory, laid out
+# as <directory>/<bucket>/<key>, so the Parquet they write can be opened with any
+# local tool:
+#
+#   s3 = LocalS3('/tmp/lake')
+#   GPSStreamExporter.exporter.s3 = s3
+#   pyarrow.dataset.dataset('/tmp/lake/<bucket>/gps_data', partitioning='hive')
+
+
+class LocalS3:
+    def __init__(self, directory):
+        self.directory = directory
+        self.calls = {}
+        self.lock = threading.Lock()  # Makes conditional puts atomic
+
+    def call(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def path(self, bucket, key):
+        return os.path.join(self.directory, bucket, *key.split('/'))
+
+    def missing(self, key, operation):
+        return ClientError({'Error': {'Code': 'NoSuchKey', 'Message': key}}, operation)
+
+    def put_object(self, Bucket, Key, Body, IfNoneMatch=None):
+        self.call('PutObject')
+        path = self.path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{threading.get_ident()}.uploading"
+        with open(temporary, 'wb') as f:
+            if hasattr(Body, 'read'):
+                shutil.copyfileobj(Body, f)
+            else:
+                f.write(Body if isinstance(Body, bytes) else Body.encode())
+        with self.lock:
+            if IfNoneMatch == '*' and os.path.exists(path):
+                os.remove(temporary)
+                raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': Key}}, 'PutObject')
+            os.replace(temporary, path)  # Readers never see a partial object
+        return {}
+
+    def get_object(self, Bucket, Key):
+        self.call('GetObject')
+        try:
+            with open(self.path(Bucket, Key), 'rb') as f:
+                return {'Body': io.BytesIO(f.read())}
+        except FileNotFoundError:
+            raise self.missing(Key, 'GetObject')
+
+    def head_object(self, Bucket, Key):
+        self.call('HeadObject')
+        path = self.path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+        return self.describe(path)
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self.call('CopyObject')
+        source = self.path(CopySource['Bucket'], CopySource['Key'])
+        if not os.path.isfile(source):
+            raise self.missing(CopySource['Key'], 'CopyObject')
+        with open(source, 'rb') as f:
+            self.put_object(Bucket, Key, f)
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self.call('DeleteObject')
+        try:
+            os.remove(self.path(Bucket, Key))
+        except FileNotFoundError:
+            pass  # S3 deletes are idempotent
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        self.call('DeleteObjects')
+        for obj in Delete['Objects']:
+            try:
+                os.remove(self.path(Bucket, obj['Key']))
+            except FileNotFoundError:
+                pass
+        return {}
+
+    def describe(self, path):
+        with open(path, 'rb') as f:
+            etag = hashlib.md5(f.read()).hexdigest()
+        modified = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+        return {'Size': os.path.getsize(path), 'ETag': f'"{etag}"', 'LastModified': modified}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000):
+        self.call('ListObjectsV2')
+        root = os.path.join(self.directory, Bucket)
+        keys = []
+        for folder, _, names in os.walk(root):
+            for name in names:
+                if name.endswith('.uploading'):
+                    continue
+                key = os.path.relpath(os.path.join(folder, name), root).replace(os.sep, '/')
+                if key.startswith(Prefix):
+                    keys.append(key)
+        keys.sort()
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        contents = [dict(self.describe(os.path.join(root, *key.split('/'))), Key=key) for key in page]
+        response = {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': start + MaxKeys < len(keys)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def stats(self):
+        return {'calls': dict(self.calls)}
@@ -0,0 +1,88 @@
+import time
+from collections import deque
+
+# Local stand-in for a table's DynamoDB Stream (NEW_AND_OLD_IMAGES) and the event
+# source mapping in front of a stream exporter. It listens to a LocalDynamoDB,
+# batches the change records the way the event source does (batch size + batching
+# window), invokes the handler with a Streams-shaped event and, when the handler
+# reports a batchItemFailure, retries the batch from that record on.
+#
+#   db = LocalDynamoDB()
+#   stream = LocalStream(db, 'GpsDataTable', batch_size=1000, batching_window=60)
+#   ... run a topic processor against db ...
+#   stream.drain(GPSStreamExporter.lambda_handler)
+
+
+class LocalStream:
+    def __init__(self, db, table_name, batch_size=1000, batching_window=60.0, max_attempts=3, clock=time.monotonic):
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.batching_window = batching_window
+        self.max_attempts = max_attempts  # After this many failed attempts a batch goes to the on-failure destination
+        self.clock = clock
+        self.records = deque()
+        self.sequence = 0
+        self.dead_letters = []
+        self.invocations = 0
+        self.delivered = 0
+        self.arn = f"arn:aws:dynamodb:local:000000000000:table/{table_name}/stream/local"
+        db.listeners.append(self.record)
+
+    def record(self, table_name, old, new):
+        if table_name != self.table_name:
+            return
+        self.sequence += 1
+        image = new if new is not None else old
+        change = {
+            'ApproximateCreationDateTime': time.time(),
+            'Keys': {'SensorId': image['SensorId'], 'Timestamp': image['Timestamp']},
+            'SequenceNumber': f"{self.sequence:021d}",
+            'SizeBytes': 0,
+            'StreamViewType': 'NEW_AND_OLD_IMAGES',
+        }
+        if new is not None:
+            change['NewImage'] = new
+        if old is not None:
+            change['OldImage'] = old
+        event_name = 'REMOVE' if new is None else 'INSERT' if old is None else 'MODIFY'
+        self.records.append({'eventName': event_name, 'eventSource': 'aws:dynamodb', 'eventSourceARN': self.arn,
+                             'dynamodb': change, 'arrived': self.clock()})
+
+    def ready(self):
+        """A batch is due when it is full or its oldest record has waited out the batching window."""
+        if not self.records:
+            return False
+        return len(self.records) >= self.batch_size or self.clock() - self.records[0]['arrived'] >= self.batching_window
+
+    def to_event(self, batch):
+        return {'Records': [{key: value for key, value in record.items() if key != 'arrived'} for record in batch]}
+
+    def invoke(self, handler, context=None):
+        """Deliver one batch (with retries, in shard order) and return the number of attempts it took."""
+        batch = [self.records.popleft() for _ in range(min(self.batch_size, len(self.records)))]
+        attempts = 0
+        while batch:
+            attempts += 1
+            self.invocations += 1
+            try:
+                response = handler(self.to_event(batch), context) or {}
+                failures = [failure['itemIdentifier'] for failure in response.get('batchItemFailures', [])]
+            except Exception:
+                failures = [batch[0]['dynamodb']['SequenceNumber']]
+            if not failures:
+                self.delivered += len(batch)
+                return attempts
+            first_failed = min(failures)
+            done = [record for record in batch if record['dynamodb']['SequenceNumber'] < first_failed]
+            self.delivered += len(done)
+            batch = batch[len(done):]
+            if attempts >= self.max_attempts:
+                self.dead_letters.extend(batch)
+                return attempts
+        return attempts
+
+    def drain(self, handler, context=None):
+        """Invoke the handler until the stream is read to the end (ignores the batching window)."""
+        while self.records:
+            self.invoke(handler, context)
+        return {'invocations': self.invocations, 'delivered': self.delivered, 'dead_letters': len(self.dead_letters)}
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.dataset  # noqa: E402
+
+from change_capture import ChangeExporter  # noqa: E402
+from local_s3 import LocalS3  # noqa: E402
+from topic_schemas import GPS_SCHEMA  # noqa: E402
+
+BUCKET = 'results'
+
+
+def change(sequence, elk, day=30):
+    fix = {'SensorId': {'S': elk}, 'ElkId': {'S': elk}, 'Topic': {'S': 'IoT/GPS'},
+           'Timestamp': {'S': f'2024-09-{day}T12:00:{sequence % 60:02d}Z'},
+           'Latitude': {'N': '45.1'}, 'Longitude': {'N': '-110.2'}}
+    return {'eventName': 'INSERT', 'dynamodb': {'SequenceNumber': f'{sequence:021d}', 'NewImage': fix}}
+
+
+class FailingS3(LocalS3):
+    """Fails the put of the n-th file."""
+
+    def __init__(self, directory, fail_at):
+        super().__init__(directory)
+        self.fail_at = fail_at
+        self.puts = 0
+
+    def put_object(self, **kwargs):
+        self.puts += 1
+        if self.puts == self.fail_at:
+            raise RuntimeError('put failed')
+        return super().put_object(**kwargs)
+
+
+def rows(tmp_path):
+    table = pyarrow.dataset.dataset(str(tmp_path / BUCKET / 'gps_data'), partitioning='hive').to_table()
+    return sorted(zip(table.column('SensorId').to_pylist(), table.column('Timestamp').to_pylist()))
+
+
+def exporter(s3):
+    return ChangeExporter(GPS_SCHEMA, output_path=f's3://{BUCKET}/gps_data/', s3=s3)
+
+
+def test_bisected_retry_replaces_the_files_of_the_failed_attempt(tmp_path):
+    batch = [change(i, f'elk-{i % 3}', day=29 + i % 2) for i in range(1, 11)]  # Two partitions
+    with pytest.raises(RuntimeError):
+        exporter(FailingS3(str(tmp_path), fail_at=2)).export(batch)  # Leaves the first day's file behind
+
+    s3 = LocalS3(str(tmp_path))
+    first_half = exporter(s3).export(batch[:5])  # As the event source bisects the failed batch
+    exporter(s3).export(batch[5:])
+
+    assert first_half['replaced'] == 1
+
+    written = rows(tmp_path)
+    assert len(written) == 10
+    assert len(set(written)) == 10
+
+
+def test_interleaved_shards_keep_each_others_files(tmp_path):
+    s3 = LocalS3(str(tmp_path))
+    exporter(s3).export([change(i, 'elk-1') for i in (1, 5, 9)])
+    summary = exporter(s3).export([change(i, 'elk-2') for i in (3, 7)])  # Range 3-7 overlaps 1-9, no shared record
+
+    assert summary['replaced'] == 0
+    assert len(rows(tmp_path)) == 5
+
+
+def test_retried_batch_overwrites_its_own_file(tmp_path):
+    s3 = LocalS3(str(tmp_path))
+    batch = [change(i, 'elk-1') for i in range(1, 4)]
+    exporter(s3).export(batch)
+    exporter(s3).export(batch)
+    assert len(rows(tmp_path)) == 3
@@ -0,0 +1,60 @@
+import base64
+import json
+import os
+import sys
+import zlib
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from compact_codec import CONTENT_TYPE, decode_records, encode_records
+
+RECORDS = [{'elk_id': str(i), 'lat': round(45.1234567 + i, 7), 'lon': -110.5 - i, 'posture': 'Standing'}
+           for i in range(20)]
+RAW = zlib.decompress(encode_records(RECORDS, {'lat': 7, 'lon': 7}))
+
+
+def truncated(length):
+    """Valid zlib around the first `length` bytes of the columnar content."""
+    return zlib.compress(RAW[:length])
+
+
+def test_round_trip():
+    assert decode_records(encode_records(RECORDS, {'lat': 7, 'lon': 7})) == RECORDS
+
+
+def test_truncated_payload_raises_value_error():
+    # Cuts in the header, a column header (struct.error before) and a column name (IndexError before)
+    for length in range(1, len(RAW)):
+        with pytest.raises(ValueError):
+            decode_records(truncated(length))
+
+
+def test_trailing_bytes_are_rejected():
+    with pytest.raises(ValueError):
+        decode_records(zlib.compress(RAW + b'\0'))
+
+
+def test_truncated_message_is_dropped_alone_from_a_queue_batch():
+    from batch_writer import BatchWriter
+    from ingestion import handle_event
+    from local_dynamodb import LocalDynamoDB
+    from topic_schemas import GPS_SCHEMA
+
+    db = LocalDynamoDB()
+    writer = BatchWriter(GPS_SCHEMA.table_name, client=db)
+    good = {'messageId': 'good', 'topic': 'IoT/GPS',
+            'payload': [{'elk_id': '1', 'lat': 45.0, 'lon': -110.0}]}
+    bad = {'messageId': 'bad', 'topic': 'IoT/GPS', 'contentType': CONTENT_TYPE,
+           'payload': base64.b64encode(truncated(5)).decode('ascii')}
+    event = {'Records': [{'messageId': name, 'body': json.dumps(message)}
+                         for name, message in (('q-good', good), ('q-bad', bad))]}
+
+    assert handle_event(GPS_SCHEMA, event, writer) == {'batchItemFailures': []}
+    assert db.count(GPS_SCHEMA.table_name) == 1
@@ -0,0 +1,69 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.abspath(os.path.join(HERE, '..', '..', '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, os.path.join(REPO, 'IoTMockSensors'))
+sys.path.insert(0, os.path.join(REPO, 'gps-visualization-app', 'backend'))
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from common.deadband import Deadband
+from ingestion import valid_for
+from last_known import fill_forward, latest_per_animal
+
+START = datetime(2024, 9, 30, 12, 0, 0)
+RESTING = {'elk_id': 7, 'lat': 45.0, 'lon': -110.0}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_moves_and_heartbeats_get_through():
+    clock = Clock()
+    deadband = Deadband('elk_id', distance=25, max_silence=300, clock=clock)
+    assert deadband.filter([RESTING]) == ([RESTING], 0)
+    clock.now = 60
+    assert deadband.filter([dict(RESTING, lat=45.0001)]) == ([], 1)  # ~11 m
+    clock.now = 120
+    moved = dict(RESTING, lat=45.0005)  # ~55 m from the last *published* fix
+    assert deadband.filter([moved]) == ([moved], 0)
+    clock.now = 420
+    assert deadband.filter([moved]) == ([moved], 0)  # Heartbeat
+
+
+def test_resting_elk_never_goes_stale_between_heartbeats():
+    # Readings every 45 s: with maxSilence 300 the heartbeat goes out at 315 s, 630 s, ...,
+    # and reaches the table 5 s later
+    interval, latency, max_silence = 45, 5, 300
+    clock = Clock()
+    deadband = Deadband('elk_id', distance=25, max_silence=max_silence, clock=clock)
+    stored = []  # (arrives at, item)
+    for tick in range(40):
+        clock.now = tick * interval
+        records, suppressed = deadband.filter([dict(RESTING)])
+        if records:
+            message = deadband.annotate({'payload': records}, suppressed)
+            stored.append((clock.now + latency, {'ElkId': '7', 'ValidFor': valid_for(message),
+                                                 'Timestamp': (START + timedelta(seconds=clock.now)).isoformat()}))
+    assert len(stored) == 6  # The first reading plus a heartbeat every 315 s
+
+    for second in range(latency, 40 * interval):
+        visible = [item for arrived, item in stored if arrived <= second]
+        at = START + timedelta(seconds=second)
+        assert not latest_per_animal(visible, now=at)[0]['Stale'], second
+        assert len(fill_forward(visible, [at])) == 1, second
+
+
+def test_valid_for_prefers_the_margin_over_max_silence():
+    assert valid_for({'deadband': {'maxSilence': 300, 'validFor': 375}}) == 375
+    assert valid_for({'deadband': {'maxSilence': 300}}) == 300  # Older transmitters
+    assert valid_for({'payload': []}) is None
@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from batch_writer import BatchWriter
+from dedup import MESSAGE_MARKER_PREFIX, MESSAGE_MARKER_SORT_KEY, MessageDeduplicator
+from ingestion import handle_event
+from local_dynamodb import LocalDynamoDB
+from topic_schemas import GPS_SCHEMA
+
+TABLE = GPS_SCHEMA.table_name
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Crash(BaseException):
+    """Stands in for a timeout or out-of-memory kill: nothing after it runs."""
+
+
+class CrashingWriter:
+    def write(self, items):
+        raise Crash()
+
+
+def message(message_id='m-1', elk='1'):
+    return {'messageId': message_id, 'topic': 'IoT/GPS', 'timestamp': 1_700_000_000,
+            'payload': [{'elk_id': elk, 'lat': 45.0, 'lon': -110.0}]}
+
+
+def container(db, clock):
+    """A fresh Lambda container: its own LRU, the shared table."""
+    return MessageDeduplicator(TABLE, client=db, claim_seconds=60, ttl_seconds=3600, clock=clock)
+
+
+def marker_expiry(db, message_id):
+    return int(db.tables[TABLE][(MESSAGE_MARKER_PREFIX + message_id, MESSAGE_MARKER_SORT_KEY)]['ExpiresAt']['N'])
+
+
+def test_redelivery_after_a_crash_between_claim_and_write_is_processed():
+    db, clock = LocalDynamoDB(), Clock()
+    with pytest.raises(Crash):
+        handle_event(GPS_SCHEMA, message(), CrashingWriter(), container(db, clock))
+    assert db.count(TABLE) == 0
+
+    clock.now += 30  # Redelivered while the crashed invocation could still be running: skipped
+    assert handle_event(GPS_SCHEMA, message(), BatchWriter(TABLE, client=db), container(db, clock))['written'] == 0
+
+    clock.now += 31  # The claim has lapsed
+    assert handle_event(GPS_SCHEMA, message(), BatchWriter(TABLE, client=db), container(db, clock))['written'] == 1
+    assert db.count(TABLE) == 1
+
+
+def test_written_message_keeps_its_marker_for_the_full_ttl():
+    db, clock = LocalDynamoDB(), Clock()
+    handle_event(GPS_SCHEMA, message(), BatchWriter(TABLE, client=db), container(db, clock))
+    assert marker_expiry(db, 'm-1') == clock.now + 3600
+
+    clock.now += 600
+    assert handle_event(GPS_SCHEMA, message(), BatchWriter(TABLE, client=db), container(db, clock))['written'] == 0
+
+
+def test_queue_batch_completes_only_the_written_messages():
+    db, clock = LocalDynamoDB(), Clock()
+    dedup = container(db, clock)
+    event = {'Records': [{'messageId': f'q-{i}', 'body': json.dumps(message(f'm-{i}', str(i)))} for i in range(3)]}
+    assert handle_event(GPS_SCHEMA, event, BatchWriter(TABLE, client=db), dedup) == {'batchItemFailures': []}
+    assert [marker_expiry(db, f'm-{i}') for i in range(3)] == [clock.now + 3600] * 3
+
+    # Same batch redelivered: the warm LRU, then a cold container's markers, skip all of it
+    handle_event(GPS_SCHEMA, event, BatchWriter(TABLE, client=db), dedup)
+    handle_event(GPS_SCHEMA, event, BatchWriter(TABLE, client=db), container(db, clock))
+    assert db.count(TABLE) == 3
+    assert dedup.stats()['cache_hits'] == 3
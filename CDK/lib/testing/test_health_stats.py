@@ -0,0 +1,120 @@
+import os
+import sys
+from decimal import Decimal
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from botocore.exceptions import ClientError
+
+from batch_writer import BatchWriter
+from health_stats import STATE_KEY_PREFIX, STATE_SORT_KEY, HealthAnomalyDetector
+from local_dynamodb import LocalDynamoDB
+
+TABLE = 'HeaDataTable'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyClient:
+    """LocalDynamoDB that leaves the puts of some keys unprocessed, or raises on every batch write."""
+
+    def __init__(self, db, unprocessed=(), error=None):
+        self.db = db
+        self.unprocessed = set(unprocessed)
+        self.error = error
+
+    def batch_write_item(self, RequestItems):
+        if self.error:
+            raise ClientError({'Error': {'Code': self.error, 'Message': 'flaky'}}, 'BatchWriteItem')
+        kept, left = {}, {}
+        for table, requests in RequestItems.items():
+            for request in requests:
+                target = left if request['PutRequest']['Item']['SensorId']['S'] in self.unprocessed else kept
+                target.setdefault(table, []).append(request)
+        if kept:
+            self.db.batch_write_item(RequestItems=kept)
+        return {'UnprocessedItems': left}
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def reading(elk, heart_rate):
+    return {'ElkId': elk, 'SensorId': f'collar-{elk}', 'Timestamp': 't', 'BodyTemperature': Decimal('38.5'),
+            'HeartRate': Decimal(heart_rate), 'RespirationRate': Decimal('20'), 'StressLevel': Decimal('1')}
+
+
+def detector(client, clock, checkpoint_seconds=60):
+    writer = BatchWriter(TABLE, client=client, max_retries=1, sleep=lambda s: None)
+    return HealthAnomalyDetector(TABLE, writer, client=client, checkpoint_seconds=checkpoint_seconds, clock=clock,
+                                 max_retries=2, sleep=lambda s: None)
+
+
+def baseline(elks, count=20):
+    return [reading(elk, 60 + (i % 5)) for i in range(count) for elk in elks]
+
+
+def test_spike_is_flagged_and_state_survives_a_cold_start():
+    db, clock = LocalDynamoDB(), Clock()
+    warm = detector(db, clock)
+    warm.process(baseline(['1']))
+    clock.now += 61
+    warm.process([reading('1', 62)])  # Checkpoints
+    assert (STATE_KEY_PREFIX + '1', STATE_SORT_KEY) in db.tables[TABLE]
+
+    cold = detector(db, clock)  # Another container picks up the checkpointed baseline
+    spike = reading('1', 140)
+    assert [a['anomalies'][0]['kind'] for a in cold.process([spike])] == ['spike']
+    assert spike['Anomalies'] == ['HeartRate:spike']
+
+
+def test_dropped_checkpoints_stay_dirty_until_written():
+    db, clock = LocalDynamoDB(), Clock()
+    client = FlakyClient(db, unprocessed={STATE_KEY_PREFIX + '2'})
+    health = detector(client, clock)
+    health.process(baseline(['1', '2']))
+
+    clock.now += 61
+    health.checkpoint()
+    assert health.dirty == {'2'}
+    assert (STATE_KEY_PREFIX + '1', STATE_SORT_KEY) in db.tables[TABLE]
+
+    client.unprocessed.clear()
+    health.checkpoint()  # No new readings for elk 2, its state still goes out
+    assert health.dirty == set()
+    assert (STATE_KEY_PREFIX + '2', STATE_SORT_KEY) in db.tables[TABLE]
+
+
+def test_checkpoint_that_raises_keeps_every_elk_dirty():
+    db, clock = LocalDynamoDB(), Clock()
+    client = FlakyClient(db, error='ValidationException')
+    health = detector(client, clock)
+    health.process(baseline(['1', '2']))
+    health.checkpoint()
+    assert health.dirty == {'1', '2'}
+
+
+def test_elk_whose_state_cannot_be_read_is_left_unscored():
+    db, clock = LocalDynamoDB(), Clock()
+    detector(db, clock, checkpoint_seconds=0).process(baseline(['1']))  # Checkpointed right away
+
+    class Unreadable(FlakyClient):
+        def batch_get_item(self, RequestItems):
+            (table, request), = RequestItems.items()
+            return {'Responses': {}, 'UnprocessedKeys': {table: request}}
+
+    cold = detector(Unreadable(db), clock)
+    item = reading('1', 140)
+    assert cold.process([item]) == []
+    assert 'Anomalies' not in item and '1' not in cold.dirty  # Its real baseline is not overwritten
@@ -0,0 +1,49 @@
+import base64
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, os.path.join(HERE, '..', 'scripts'))
+
+from gps_bucket_codec import LAYOUT, encode_chunk
+from incremental_export import record_item
+
+BUCKET_START = 1727654400
+
+
+def chunk(first):
+    fixes = [(BUCKET_START + first + i, 45.0 + i / 100, -110.0) for i in range(3)]
+    return {'B': base64.b64encode(encode_chunk(fixes, BUCKET_START)).decode('ascii')}
+
+
+def bucket(*chunks):
+    return {'SensorId': {'S': 'elk-1'}, 'BucketStart': {'N': str(BUCKET_START)}, 'Layout': {'S': LAYOUT},
+            'Topic': {'S': 'IoT/GPS'}, 'Chunks': {'L': list(chunks)}}
+
+
+def test_bucket_update_keeps_only_the_appended_chunks():
+    old = bucket(chunk(0), chunk(10))
+    new = bucket(chunk(0), chunk(10), chunk(20))
+    item = record_item({'Keys': {}, 'OldImage': old, 'NewImage': new})
+    assert item['Chunks'] == [chunk(20)['B']]
+
+
+def test_bucket_without_new_chunks_is_skipped():
+    old = bucket(chunk(0), chunk(10))
+    assert record_item({'Keys': {}, 'OldImage': old, 'NewImage': old}) is None
+
+
+def test_restarted_bucket_keeps_all_its_chunks():
+    item = record_item({'Keys': {}, 'OldImage': bucket(chunk(0), chunk(10)), 'NewImage': bucket(chunk(30))})
+    assert item['Chunks'] == [chunk(30)['B']]
+
+
+def test_plain_items():
+    fix = {'SensorId': {'S': 'elk-1'}, 'Timestamp': {'S': '2024-09-30T00:00:00Z'}, 'Latitude': {'N': '45.1'}}
+    moved = dict(fix, Latitude={'N': '45.2'})
+    assert record_item({'Keys': {}, 'NewImage': fix}) == {'SensorId': 'elk-1', 'Timestamp': '2024-09-30T00:00:00Z',
+                                                          'Latitude': 45.1}
+    assert record_item({'Keys': {}, 'OldImage': fix, 'NewImage': fix}) is None  # Re-put unchanged
+    assert record_item({'Keys': {}, 'OldImage': fix, 'NewImage': moved})['Latitude'] == 45.2
+    assert record_item({'Keys': {}, 'OldImage': fix}) is None  # Deleted
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from batch_writer import BatchWriter
+from dedup import MESSAGE_MARKER_PREFIX, MessageDeduplicator
+from ingestion import handle_event
+from local_dynamodb import LocalDynamoDB
+from metrics import MetricsRecorder
+from topic_schemas import GPS_SCHEMA
+
+TABLE = GPS_SCHEMA.table_name
+
+
+class HotPartitionClient:
+    """LocalDynamoDB that never accepts the puts for one SensorId (as a throttled hot partition)."""
+
+    def __init__(self, db, hot):
+        self.db = db
+        self.hot = hot
+
+    def batch_write_item(self, RequestItems):
+        kept, left = {}, {}
+        for table, requests in RequestItems.items():
+            for request in requests:
+                target = left if request['PutRequest']['Item']['SensorId']['S'] == self.hot else kept
+                target.setdefault(table, []).append(request)
+        if kept:
+            self.db.batch_write_item(RequestItems=kept)
+        return {'UnprocessedItems': left}
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def message(message_id, *elks):
+    return {'messageId': message_id, 'topic': 'IoT/GPS', 'timestamp': 1_700_000_000,
+            'payload': [{'elk_id': elk, 'lat': 45.0, 'lon': -110.0} for elk in elks]}
+
+
+def queue_event(*bodies):
+    return {'Records': [{'messageId': f'q-{i}', 'body': body if isinstance(body, str) else json.dumps(body)}
+                        for i, body in enumerate(bodies)]}
+
+
+def test_only_the_message_with_dropped_items_is_redelivered():
+    db = LocalDynamoDB()
+    client = HotPartitionClient(db, hot='3')
+    dedup = MessageDeduplicator(TABLE, client=db)
+    writer = BatchWriter(TABLE, client=client, max_retries=2, sleep=lambda s: None)
+    event = queue_event(message('m-0', '1', '2'), message('m-1', '3', '4'), message('m-2', '5'))
+
+    assert handle_event(GPS_SCHEMA, event, writer, dedup) == {'batchItemFailures': [{'itemIdentifier': 'q-1'}]}
+    assert db.count(TABLE) == 4
+    # The failed message's claim is released, so its redelivery isn't taken for a duplicate
+    markers = {key[0] for key in db.tables[TABLE] if key[0].startswith(MESSAGE_MARKER_PREFIX)}
+    assert markers == {MESSAGE_MARKER_PREFIX + 'm-0', MESSAGE_MARKER_PREFIX + 'm-2'}
+
+    client.hot = None
+    assert handle_event(GPS_SCHEMA, event, writer, dedup) == {'batchItemFailures': []}
+    assert db.count(TABLE) == 5
+
+
+def test_skipped_messages_are_counted_by_reason():
+    db = LocalDynamoDB()
+    metrics = MetricsRecorder('GPS', mode='local')
+    dedup = MessageDeduplicator(TABLE, client=db)
+    writer = BatchWriter(TABLE, client=db)
+    event = queue_event(message('m-0', '1'), message('m-0', '1'), '{not json', dict(message('m-1'), payload=[]),
+                        dict(message('m-2'), payload={'elk_id': '1'}))
+
+    assert handle_event(GPS_SCHEMA, event, writer, dedup, metrics) == {'batchItemFailures': []}
+    report = metrics.report()
+    assert (report['DuplicateMessages'], report['UndecodableMessages'], report['EmptyMessages']) == (1, 2, 1)
+    assert db.count(TABLE) == 1
+
+
+def test_counters_are_emitted_as_emf():
+    lines = []
+    metrics = MetricsRecorder('GPS', mode='emf', emit=lines.append)
+    handle_event(GPS_SCHEMA, queue_event('{not json'), BatchWriter(TABLE, client=LocalDynamoDB()), metrics=metrics)
+
+    document, = [json.loads(line) for line in lines]
+    assert document['UndecodableMessages'] == 1
+    assert {'Name': 'UndecodableMessages', 'Unit': 'Count'} in document['_aws']['CloudWatchMetrics'][0]['Metrics']
@@ -0,0 +1,124 @@
+import os
+import sys
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+sys.path.insert(0, os.path.join(REPO, 'IoTMockSensors'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from botocore.exceptions import ClientError
+
+from common.log_shipper import MAX_BATCH_EVENTS, MAX_BATCH_SPAN_MS, MAX_EVENT_BYTES, CloudWatchLogShipper
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'PutLogEvents')
+
+
+class FakeLogs:
+    """PutLogEvents stand-in that fails with the queued error codes before succeeding."""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.batches = []
+        self.created = []
+
+    def create_log_group(self, logGroupName):
+        self.created.append(logGroupName)
+
+    def create_log_stream(self, logGroupName, logStreamName):
+        self.created.append(logStreamName)
+
+    def put_log_events(self, logGroupName, logStreamName, logEvents):
+        if self.failures:
+            raise client_error(self.failures.pop(0))
+        self.batches.append(list(logEvents))
+
+
+def shipper(client, **kwargs):
+    sleeps = []
+    shipper = CloudWatchLogShipper('/iot/test', 'gps', client=client, flush_interval=0, sleep=sleeps.append, **kwargs)
+    return shipper, sleeps
+
+
+def drain(shipper, events):
+    """Queue events without starting the worker and return the batches next_batch() cuts from them."""
+    for event in events:
+        shipper.queue.put(event)
+    batches = []
+    while not shipper.queue.empty() or shipper.carry is not None:
+        batch, _ = shipper.next_batch()
+        batches.append(batch)
+    return batches
+
+
+def test_batches_respect_the_event_count_limit():
+    logs = FakeLogs()
+    batches = drain(shipper(logs, queue_size=0)[0], [(1000, f'line {i}') for i in range(MAX_BATCH_EVENTS + 1)])
+    assert [len(batch) for batch in batches] == [MAX_BATCH_EVENTS, 1]
+
+
+def test_batches_respect_the_byte_limit():
+    # 10 x (100000 + 26) bytes fits in 1 MiB, an 11th doesn't
+    batches = drain(shipper(FakeLogs())[0], [(1000, 'x' * 100_000)] * 12)
+    assert [len(batch) for batch in batches] == [10, 2]
+
+
+def test_batches_respect_the_24_hour_span():
+    batches = drain(shipper(FakeLogs())[0], [(0, 'a'), (1, 'b'), (MAX_BATCH_SPAN_MS, 'c')])
+    assert [[event['message'] for event in batch] for batch in batches] == [['a', 'b'], ['c']]
+
+
+def test_throttling_is_retried_with_backoff():
+    logs = FakeLogs(['ThrottlingException', 'ServiceUnavailableException'])
+    ship, sleeps = shipper(logs)
+    assert ship.send([{'timestamp': 2, 'message': 'b'}, {'timestamp': 1, 'message': 'a'}])
+    assert len(sleeps) == 2 and 0.1 <= sleeps[0] <= 0.2 <= sleeps[1] <= 0.4  # Jittered exponential backoff
+    assert logs.batches == [[{'timestamp': 1, 'message': 'a'}, {'timestamp': 2, 'message': 'b'}]]
+    assert ship.stats()['sent'] == 2 and ship.stats()['dropped_failed'] == 0
+
+
+def test_retries_give_up_and_count_the_dropped_lines():
+    logs = FakeLogs(['ThrottlingException'] * 10)
+    ship, sleeps = shipper(logs, max_attempts=3)
+    assert not ship.send([{'timestamp': 1, 'message': 'a'}])
+    assert len(sleeps) == 2 and logs.batches == []
+    assert ship.stats()['dropped_failed'] == 1
+
+
+def test_non_retryable_errors_are_not_retried():
+    logs = FakeLogs(['InvalidParameterException', 'ThrottlingException'])
+    ship, sleeps = shipper(logs)
+    assert not ship.send([{'timestamp': 1, 'message': 'a'}])
+    assert sleeps == [] and logs.failures == ['ThrottlingException']
+
+
+def test_deleted_stream_is_recreated():
+    logs = FakeLogs()
+    ship, _ = shipper(logs)
+    assert ship.send([{'timestamp': 1, 'message': 'a'}])
+    assert logs.created == ['/iot/test', 'gps']
+
+    logs.failures = ['ResourceNotFoundException']
+    assert ship.send([{'timestamp': 2, 'message': 'b'}])
+    assert logs.created == ['/iot/test', 'gps'] * 2
+    assert len(logs.batches) == 2
+
+
+def test_log_and_flush_go_through_the_worker():
+    logs = FakeLogs()
+    ship, _ = shipper(logs)
+    assert ship.log('hello')
+    assert ship.log('é' * MAX_EVENT_BYTES)  # Truncated to the event limit on a character boundary
+    assert ship.flush(timeout=5)
+    messages = [event['message'] for batch in logs.batches for event in batch]
+    assert messages[0] == 'hello'
+    assert len(messages[1].encode('utf-8')) <= MAX_EVENT_BYTES
+    assert ship.stats()['sent'] == 2 and ship.stats()['pending'] == 0
+
+
+def test_full_queue_drops_instead_of_blocking():
+    ship, _ = shipper(FakeLogs(), queue_size=1)
+    ship.worker = object()  # Pretend the worker is running so nothing drains the queue
+    assert ship.log('first')
+    assert not ship.log('second')
+    assert ship.stats()['dropped_full'] == 1
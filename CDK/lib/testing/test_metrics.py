@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+from metrics import EMF_MAX_SAMPLES, EMF_MAX_VALUES, MetricsRecorder
+
+
+def check_emf(document):
+    """The shape the CloudWatch EMF specification requires for metrics to be extracted."""
+    metadata = document['_aws']
+    assert isinstance(metadata['Timestamp'], int)
+    for directive in metadata['CloudWatchMetrics']:
+        assert isinstance(directive['Namespace'], str) and directive['Namespace']
+        for dimension_set in directive['Dimensions']:
+            for dimension in dimension_set:
+                assert isinstance(document[dimension], str)
+        assert 1 <= len(directive['Metrics']) <= 100
+        for metric in directive['Metrics']:
+            value = document[metric['Name']]
+            if isinstance(value, list):
+                assert 1 <= len(value) <= EMF_MAX_VALUES
+                assert all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+            else:
+                assert isinstance(value, (int, float))
+
+
+def emitted(recorder):
+    lines = []
+    recorder.emit = lines.append
+    recorder.flush()
+    return [json.loads(line) for line in lines]
+
+
+def test_flush_emits_valid_emf_documents():
+    recorder = MetricsRecorder('GPS', mode='emf')
+    for i in range(250):
+        recorder.record('DeviceToLambdaLag', 10 + i)
+    recorder.record('WriteLatency', 35.0)
+
+    documents = emitted(recorder)
+    assert len(documents) == 3
+    for document in documents:
+        check_emf(document)
+    assert sum(len(d.get('DeviceToLambdaLag', [])) for d in documents) == 250
+    assert sum(len(d.get('WriteLatency', [])) for d in documents) == 1
+    assert recorder.histograms == {}
+
+
+def test_large_counts_are_thinned_in_proportion():
+    recorder = MetricsRecorder('HEA', mode='emf')
+    recorder.record('RecordConversionTime', 5.0, count=9000)
+    recorder.record('RecordConversionTime', 500.0, count=1000)
+
+    documents = emitted(recorder)
+    for document in documents:
+        check_emf(document)
+    values = [v for d in documents for v in d['RecordConversionTime']]
+    assert len(values) == EMF_MAX_SAMPLES
+    assert sum(1 for v in values if v > 100) == EMF_MAX_SAMPLES // 10
+
+
+def test_local_and_off_modes_emit_nothing():
+    for mode in ('local', 'off'):
+        recorder = MetricsRecorder('ENV', mode=mode)
+        recorder.record('WriteLatency', 12.0)
+        assert emitted(recorder) == []
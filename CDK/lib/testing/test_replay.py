@@ -0,0 +1,98 @@
+import csv
+import os
+import sys
+import threading
+
+import pytest
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+sys.path.insert(0, os.path.join(REPO, 'IoTMockSensors'))
+
+from common.fleet import BoundedPublisher
+from common.replay import replay, time_ordered
+
+# Grouped by animal like elk_movement.csv; elk 2's fixes interleave with elk 1's and tie at 60 s
+ROWS = [('1', 0, 45.0), ('1', 60, 45.1), ('1', 120, 45.2), ('2', 30, 46.0), ('2', 60, 46.1), ('2', 90, 46.2)]
+
+
+def write_csv(path, rows=ROWS):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Animal_ID', 'timestamp', 'Latitude', 'Longitude'])
+        for elk, t, lat in rows:
+            writer.writerow([elk, 1_700_000_000 + t, lat, -110.0])
+    return str(path)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_messages_follow_recorded_time_and_each_animals_order(tmp_path):
+    messages = []
+    replay('gps', write_csv(tmp_path / 'herd.csv'), 'IoT/GPS', messages.append, speed=0)
+
+    assert [m['timestamp'] - 1_700_000_000 for m in messages] == [0, 30, 60, 90, 120]
+    assert [(r['elk_id'], r['lat']) for r in messages[2]['payload']] == [(1, 45.1), (2, 46.1)]
+
+
+def test_external_sort_matches_in_memory_sort():
+    records = [(t % 7, i) for i, t in enumerate(range(50))]
+    assert list(time_ordered(records, sort_rows=4)) == sorted(records, key=lambda r: (r[0], r[1]))
+
+
+def test_replay_is_paced_at_the_requested_speed(tmp_path):
+    clock = Clock()
+    sent_at = []
+    replay('gps', write_csv(tmp_path / 'herd.csv'), 'IoT/GPS', lambda m: sent_at.append(clock.now), speed=10,
+           clock=clock, sleep=clock.sleep)
+    assert sent_at == pytest.approx([0, 3, 6, 9, 12])
+
+
+def test_presorted_input_out_of_order_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        replay('gps', write_csv(tmp_path / 'herd.csv'), 'IoT/GPS', lambda m: None, speed=0, presorted=True)
+
+
+class FakeMQTTClient:
+    """publishAsync that holds the PUBACKs until ack() is called."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def publishAsync(self, topic, payload, qos, ackCallback=None):
+        self.callbacks.append(ackCallback)
+
+    def ack(self):
+        while self.callbacks:
+            self.callbacks.pop(0)(len(self.callbacks))
+
+
+def test_publisher_waits_for_pubacks_beyond_the_in_flight_cap():
+    client = FakeMQTTClient()
+    publisher = BoundedPublisher(client, max_inflight=3, ack_timeout=5)
+    for i in range(3):
+        publisher.publish('IoT/GPS', f'm{i}')
+
+    fourth = threading.Thread(target=publisher.publish, args=('IoT/GPS', 'm3'))
+    fourth.start()
+    fourth.join(0.2)
+    assert fourth.is_alive() and len(client.callbacks) == 3  # Blocked on the cap
+
+    client.ack()
+    fourth.join(5)
+    assert not fourth.is_alive() and len(client.callbacks) == 1
+
+
+def test_publisher_gives_up_when_no_pubacks_come_back():
+    publisher = BoundedPublisher(FakeMQTTClient(), max_inflight=1, ack_timeout=0.05)
+    publisher.publish('IoT/GPS', 'm0')
+    with pytest.raises(TimeoutError):
+        publisher.publish('IoT/GPS', 'm1')
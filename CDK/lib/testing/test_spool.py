@@ -0,0 +1,54 @@
+import os
+import sys
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+sys.path.insert(0, os.path.join(REPO, 'IoTMockSensors'))
+
+from common.spool import Spool
+
+MESSAGE = 'x' * 90  # 110-byte frames with the 'IoT/GPS' topic
+
+
+def fill(spool, first, count):
+    for i in range(first, first + count):
+        spool.append('IoT/GPS', f"{i:04d}{MESSAGE}")
+
+
+def numbers(records):
+    return [int(message[:4]) for _, message, _ in records]
+
+
+def test_commit_of_a_segment_dropped_during_drain_is_ignored(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1100, segment_bytes=330)  # 3 records per segment, 10 in all
+    fill(spool, 0, 9)
+    batch = spool.peek(2)  # The drainer is sending 0 and 1 ...
+    fill(spool, 9, 4)  # ... while the spool fills up and drops the segment holding 0-2
+    assert spool.segments[0][0] != batch[-1][2][0]
+
+    spool.commit(batch[-1][2], len(batch))
+
+    assert spool.pending() == 10
+    assert numbers(spool.peek(100)) == list(range(3, 13))
+
+
+def test_commit_after_the_cursor_moved_within_a_kept_segment(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1100, segment_bytes=330)
+    fill(spool, 0, 9)
+    batch = spool.peek(5)  # 0-4: ends in the second segment
+    fill(spool, 9, 4)  # Drops the first segment; the cursor restarts at 3
+    spool.commit(batch[-1][2], len(batch))
+
+    # 3 and 4 went out with the batch; the rest are still pending, none deleted
+    assert numbers(spool.peek(100)) == list(range(5, 13))
+    assert spool.pending() == 8
+
+
+def test_drain_without_drops(tmp_path):
+    spool = Spool(str(tmp_path), max_bytes=1100, segment_bytes=330)
+    fill(spool, 0, 7)
+    while spool.pending():
+        batch = spool.peek(2)
+        spool.commit(batch[-1][2], len(batch))
+    assert spool.peek(10) == []
+    fill(spool, 7, 1)
+    assert numbers(Spool(str(tmp_path), max_bytes=1100, segment_bytes=330).peek(10)) == [7]
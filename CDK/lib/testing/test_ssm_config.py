@@ -0,0 +1,50 @@
+import os
+import sys
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+sys.path.insert(0, os.path.join(REPO, 'IoTMockSensors'))
+
+from common.ssm_config import RETRY_SECONDS, ParameterCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeSSM:
+    def __init__(self):
+        self.calls = 0
+        self.down = False
+
+    def get_parameter(self, Name, WithDecryption):
+        self.calls += 1
+        if self.down:
+            raise RuntimeError('ThrottlingException')
+        return {'Parameter': {'Name': Name, 'Value': '15'}}
+
+
+def test_failed_refresh_backs_off_with_the_last_known_value():
+    clock, ssm = Clock(), FakeSSM()
+    cache = ParameterCache(ttl=60, client=ssm, clock=clock)
+    assert cache.get_int('/iot-settings/gps-publish-interval', 30) == 15
+
+    ssm.down = True
+    clock.now = 100  # Expired
+    for _ in range(50):
+        assert cache.get_int('/iot-settings/gps-publish-interval', 30) == 15
+    assert ssm.calls == 2
+
+    clock.now += RETRY_SECONDS
+    ssm.down = False
+    assert cache.get_int('/iot-settings/gps-publish-interval', 30) == 15
+    assert ssm.calls == 3
+
+
+def test_default_until_the_parameter_was_ever_fetched():
+    ssm = FakeSSM()
+    ssm.down = True
+    assert ParameterCache(client=ssm, clock=Clock()).get_int('/iot-settings/gps-publish-interval', 30) == 30
@@ -1,40 +1,48 @@
-import boto3
-from colorama import Fore, Style, init
+from colorama import Fore, Style
+import os
+import sys
 import time
 import uuid
 
+# Make the shared IoTMockSensors/common package importable when run from the repo (the image copies it next to us)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.compact_codec import encode_payload
+from common.ssm_config import parameter_cache
+
 CLIENT_ID = "GnvCollar"
 ENV_TOPIC_NAME = None
 LOG_GROUP = "/docker/ENV"
 CERT_SECRET_NAME = "IoT/ENVThing/certs"
 TESTING = False
+# Opt-in compact columnar payload encoding (see common/compact_codec.py)
+COMPACT_ENCODING = os.environ.get('COMPACT_ENCODING', 'false').lower() == 'true'
 LOG_STREAM = "mqtt_connect"
 
 def setup_config():
     global ENV_TOPIC_NAME
-    ssm = boto3.client('ssm')
+    # Load all settings in one GetParametersByPath call; get_fresh_publish_interval then reads from the cache
+    try:
+        parameter_cache.load_path('/iot-settings')
+    except Exception as e:
+        print(f"⚠️ Failed to preload /iot-settings, falling back to per-parameter reads: {e}")
+
     # Get a parameter
-    response = ssm.get_parameter(
-        Name='/iot-topics/env-topic-name',  # Name of the parameter you want to retrieve
-        WithDecryption=False  # Set to True if it's a SecureString parameter
-    )
+    ENV_TOPIC_NAME = parameter_cache.get('/iot-topics/env-topic-name')
+    if ENV_TOPIC_NAME is None:
+        raise RuntimeError("Topic name parameter /iot-topics/env-topic-name is not available")
 
-    # Extract the value
-    ENV_TOPIC_NAME = response['Parameter']['Value']
+    # Keep the cached settings fresh without blocking the publish loop
+    parameter_cache.start_background_refresh()
     print(f"{Fore.RED}*******************Retrieved {ENV_TOPIC_NAME}{Style.RESET_ALL}")
 
 def get_fresh_publish_interval():
-    try:
-        ssm = boto3.client('ssm')
-        response = ssm.get_parameter(Name='/iot-settings/env-publish-interval', WithDecryption=False)
-        return int(response['Parameter']['Value'])
-    except Exception as e:
-        print(f"⚠️ Failed to fetch publish interval, using default: {e}")
-        return 15  # Fallback default
+    # Served from the TTL cache (refreshed in the background); last known value or 15 if SSM is unreachable
+    return parameter_cache.get_int('/iot-settings/env-publish-interval', 15)
 
 
 
-def create_topic(payload):
+def create_topic(payload, topic=None, first_id=0):
+    # topic / first_id let fleet mode (common/fleet.py) give each virtual device its own topic and ids
     transformed_payload = [
         {
             "sensor_id": sensor_id,
@@ -44,11 +52,15 @@ def create_topic(payload):
             "humidity": item['humidity'],
             "wind_direction": item['wind_direction']
         }
-        for sensor_id, item in enumerate(payload)
+        for sensor_id, item in enumerate(payload, first_id)
     ]
-    return {
+    message = {
         "messageId": str(uuid.uuid4()),
-        "topic": ENV_TOPIC_NAME,
+        "topic": topic or ENV_TOPIC_NAME,
         "timestamp": time.time(),
         "payload": transformed_payload
     }
+    if COMPACT_ENCODING and transformed_payload:
+        # Columnar + zlib, coordinates as delta-encoded 1e-7 degree fixed point
+        message.update(encode_payload(transformed_payload, decimals={"lat": 7, "lon": 7}))
+    return message
@@ -5,15 +5,17 @@ import math
 NUM_SENSORS = 10  # Adjust the number of sensors as needed
 RADIUS = 0.1  # Diameter for sensor coverage in degrees, approx 5 km
 
-# Initialize sensor positions with random starting points
-sensor_positions = []
-for _ in range(NUM_SENSORS):
+# Random sensor position within RADIUS of the central starting point
+def initial_position():
     start_lat, start_lon = 53.0, -127.0  # Central starting point for the sensors
     angle = random.uniform(0, 2 * math.pi)
     distance = random.uniform(0, RADIUS)
     delta_lat = distance * math.cos(angle) / 111  # Convert degrees to approximate km
     delta_lon = distance * math.sin(angle) / (111 * math.cos(math.radians(start_lat)))
-    sensor_positions.append([start_lat + delta_lat, start_lon + delta_lon])
+    return [start_lat + delta_lat, start_lon + delta_lon]
+
+# Initialize sensor positions with random starting points
+sensor_positions = [initial_position() for _ in range(NUM_SENSORS)]
 
 def get_wind_direction(base_direction="East"):
     variability = 10  # The wind can vary by +/- 10 degrees
@@ -24,17 +26,18 @@ def get_wind_direction(base_direction="East"):
     new_index = (base_index + int(direction_change // (360 / num_directions))) % num_directions
     return directions[new_index]
 
+# One reading of a single sensor
+def sensor_reading(lat, lon):
+    temperature = random.uniform(-5, 30)  # Temperature in Celsius
+    humidity = random.uniform(20, 100)  # Humidity in percentage
+    wind_direction = get_wind_direction()  # Get dynamic wind direction
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "temperature": temperature,
+        "humidity": humidity,
+        "wind_direction": wind_direction
+    }
+
 def update_environment_data():
-    environment_data = []
-    for lat, lon in sensor_positions:
-        temperature = random.uniform(-5, 30)  # Temperature in Celsius
-        humidity = random.uniform(20, 100)  # Humidity in percentage
-        wind_direction = get_wind_direction()  # Get dynamic wind direction
-        environment_data.append({
-            "latitude": lat,
-            "longitude": lon,
-            "temperature": temperature,
-            "humidity": humidity,
-            "wind_direction": wind_direction
-        })
-    return environment_data
+    return [sensor_reading(lat, lon) for lat, lon in sensor_positions]
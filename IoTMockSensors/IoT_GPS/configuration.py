@@ -1,46 +1,74 @@
-import boto3
-from colorama import Fore, Style, init
+from colorama import Fore, Style
+import os
+import sys
 import time
 import uuid
 
+# Make the shared IoTMockSensors/common package importable when run from the repo (the image copies it next to us)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.compact_codec import encode_payload
+from common.deadband import Deadband
+from common.ssm_config import parameter_cache
+
 CLIENT_ID = "GPSCollar"
 GPS_TOPIC_NAME = None
 LOG_GROUP = "/docker/GPS"
 CERT_SECRET_NAME = "IoT/GPSThing/certs"
 TESTING = False
+# Opt-in compact columnar payload encoding (see common/compact_codec.py)
+COMPACT_ENCODING = os.environ.get('COMPACT_ENCODING', 'false').lower() == 'true'
 LOG_STREAM = "mqtt_connect"
+# Edge dead-banding (see common/deadband.py): only publish elk that moved more than GPS_DEADBAND_METERS
+# since their last published fix, plus a heartbeat every DEADBAND_MAX_SILENCE seconds. 0 = publish everything
+deadband = Deadband("elk_id", distance=float(os.environ.get('GPS_DEADBAND_METERS', '0')))
 
 def setup_config():
     global GPS_TOPIC_NAME
-    ssm = boto3.client('ssm')
+    # Load all settings in one GetParametersByPath call; get_fresh_publish_interval then reads from the cache
+    try:
+        parameter_cache.load_path('/iot-settings')
+    except Exception as e:
+        print(f"⚠️ Failed to preload /iot-settings, falling back to per-parameter reads: {e}")
+
     # Get a parameter
-    response = ssm.get_parameter(
-        Name='/iot-topics/gps-topic-name',  # Name of the parameter you want to retrieve
-        WithDecryption=False  # Set to True if it's a SecureString parameter
-    )
+    GPS_TOPIC_NAME = parameter_cache.get('/iot-topics/gps-topic-name')
+    if GPS_TOPIC_NAME is None:
+        raise RuntimeError("Topic name parameter /iot-topics/gps-topic-name is not available")
 
-    # Extract the value
-    GPS_TOPIC_NAME = response['Parameter']['Value']
+    # Keep the cached settings fresh without blocking the publish loop
+    parameter_cache.start_background_refresh()
     print(f"{Fore.RED}*******************Retrieved {GPS_TOPIC_NAME}{Style.RESET_ALL}")
 
 
 def get_fresh_publish_interval():
-    try:
-        ssm = boto3.client('ssm')
-        response = ssm.get_parameter(Name='/iot-settings/gps-publish-interval', WithDecryption=False)
-        return int(response['Parameter']['Value'])
-    except Exception as e:
-        print(f"⚠️ Failed to fetch publish interval, using default: {e}")
-        return 15  # Fallback default
+    # Served from the TTL cache (refreshed in the background); last known value or 15 if SSM is unreachable
+    return parameter_cache.get_int('/iot-settings/gps-publish-interval', 15)
 
-def create_topic(payload):
+def create_topic(payload, topic=None, first_id=0):
+  # topic / first_id let fleet mode (common/fleet.py) give each virtual device its own topic and ids
   transformed_payload = [
     {"elk_id": elk_id, "lat": lat, "lon": lon}
-    for elk_id, (lat, lon) in enumerate(payload)
+    for elk_id, (lat, lon) in enumerate(payload, first_id)
   ]
-  return {
+  transformed_payload, suppressed = deadband.filter(transformed_payload)
+  message = {
     "messageId": str(uuid.uuid4()),
-    "topic": GPS_TOPIC_NAME,
+    "topic": topic or GPS_TOPIC_NAME,
     "timestamp": time.time(),
     "payload": transformed_payload
   }
+  deadband.annotate(message, suppressed)
+  if COMPACT_ENCODING and transformed_payload:
+    # Columnar + zlib, coordinates as delta-encoded 1e-7 degree fixed point
+    message.update(encode_payload(transformed_payload, decimals={"lat": 7, "lon": 7}))
+  return message
+
+def create_encoded_topic(fields, topic=None):
+  # Envelope around a payload that is already encoded (contentType + payload), e.g. a HerdModel chunk
+  message = {
+    "messageId": str(uuid.uuid4()),
+    "topic": topic or GPS_TOPIC_NAME,
+    "timestamp": time.time(),
+  }
+  message.update(fields)
+  return message
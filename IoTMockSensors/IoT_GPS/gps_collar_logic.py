@@ -1,5 +1,10 @@
-import random
 import math
+import os
+import random
+
+import numpy as np
+from common.array_columns import fixed_body, int_body
+from common.compact_codec import FIXED, INT, pack_columns, payload_fields
 
 #Summary: Initializes 8 elk in random positions within specific 'circle'.
 #   update_elk_positions will move the elk in a random faions (longitude wise) but to the east (latitude wise)
@@ -7,10 +12,22 @@ import math
 # Constants
 NUM_ELKS = 8  # Number of elk
 RADIUS = 0.025  # Roughly 1 km in latitude/longitude degrees
+START = (53.0, -127.0)  # Central starting point
+END = (53.2, -128.0)  # Central ending point
+STEP_FRACTION = 0.01  # Share of the remaining distance to the target covered per tick
+WANDER = 0.002  # Random walk, +/- degrees per tick
+COORDINATE_DECIMALS = 7  # Fixed point used for published coordinates (~1 cm)
 
-# Initialize elk positions without elk_id, only lat and lon
-elk_positions = []
-for _ in range(NUM_ELKS):
+# Region mode: HERD_ANIMALS > 0 simulates a whole region's collars with HerdModel
+HERD_ANIMALS = int(os.environ.get('HERD_ANIMALS', '0'))
+HERD_SIZE = int(os.environ.get('HERD_SIZE', '25'))  # Animals per herd (cohesion group)
+HERD_COHESION = float(os.environ.get('HERD_COHESION', '0.05'))  # Pull toward the herd centroid per tick, 0 = none
+HERD_REGION_RADIUS = float(os.environ.get('HERD_REGION_RADIUS', '0.5'))  # Herd centers spread, degrees
+HERD_CHUNK_SIZE = int(os.environ.get('HERD_CHUNK_SIZE', '2000'))  # Animals per published message
+HERD_SEED = os.environ.get('HERD_SEED')  # Set for reproducible runs
+
+# Random starting position within RADIUS of the central starting point
+def initial_position():
   start_lat, start_lon = 53.0, -127.0  # Central starting point
   angle = random.uniform(0, 2 * math.pi)
   distance = random.uniform(0, RADIUS)
@@ -18,22 +35,99 @@ for _ in range(NUM_ELKS):
   delta_lon = distance * math.sin(angle) / (111 * math.cos(math.radians(start_lat)))
   initial_lat = start_lat + delta_lat
   initial_lon = start_lon + delta_lon
-  elk_positions.append([initial_lat, initial_lon])
+  return [initial_lat, initial_lon]
 
-# Function to update elk positions
-def update_elk_positions():
-  for i, (lat, lon) in enumerate(elk_positions):
-    # Move each elk towards a final point, adding randomness for a meandering path
-    end_lat, end_lon = 53.2, -128.0  # Central ending point
-    lat_step = (end_lat - lat) / 100  # Smaller steps for more meandering
-    lon_step = (end_lon - lon) / 100
+# One meandering step of a single elk towards the ending point
+def step_position(lat, lon):
+  # Move each elk towards a final point, adding randomness for a meandering path
+  end_lat, end_lon = 53.2, -128.0  # Central ending point
+  lat_step = (end_lat - lat) / 100  # Smaller steps for more meandering
+  lon_step = (end_lon - lon) / 100
+
+  # Add randomness to each step
+  lat += lat_step + random.uniform(-0.002, 0.002)
+  lon += lon_step + random.uniform(-0.002, 0.002)
+  return [lat, lon]
+
+class HerdModel:
+  """Positions of many animals held in NumPy arrays and moved a tick at a time.
+
+  Each tick every animal drifts STEP_FRACTION of the way to its own target, is
+  pulled toward the centroid of its herd (herd_size consecutive ids) by
+  cohesion, and takes a uniform random step of up to WANDER degrees. Herds start
+  within region_radius degrees of START, animals within RADIUS of their herd's
+  center; each herd's target is END shifted by the same offset.
+  """
+
+  def __init__(self, num_animals, herd_size=HERD_SIZE, cohesion=HERD_COHESION, region_radius=0.0,
+               seed=None, start=START, target=END, step_fraction=STEP_FRACTION, wander=WANDER):
+    self.num_animals = num_animals
+    self.cohesion = cohesion
+    self.step_fraction = step_fraction
+    self.wander = wander
+    self.rng = np.random.default_rng(seed)
 
-    # Add randomness to each step
-    lat += lat_step + random.uniform(-0.002, 0.002)
-    lon += lon_step + random.uniform(-0.002, 0.002)
+    # Herd membership: herd k is animals [k * herd_size, (k + 1) * herd_size)
+    self.herd_starts = np.arange(0, num_animals, max(1, herd_size))
+    self.herd_counts = np.diff(np.append(self.herd_starts, num_animals))
+    num_herds = len(self.herd_starts)
 
-    # Update elk's position
-    elk_positions[i] = [lat, lon]
-  print(f"elk_positions {elk_positions}")
-  return elk_positions
+    # Herd centers spread over the region, then animals scattered around their herd's center
+    angle = self.rng.uniform(0, 2 * math.pi, num_herds)
+    distance = region_radius * np.sqrt(self.rng.uniform(0, 1, num_herds))
+    herd_dlat = np.repeat(distance * np.cos(angle), self.herd_counts)
+    herd_dlon = np.repeat(distance * np.sin(angle), self.herd_counts)
+    angle = self.rng.uniform(0, 2 * math.pi, num_animals)
+    distance = self.rng.uniform(0, RADIUS, num_animals)
+    self.lat = start[0] + herd_dlat + distance * np.cos(angle) / 111
+    self.lon = start[1] + herd_dlon + distance * np.sin(angle) / (111 * math.cos(math.radians(start[0])))
+    self.target_lat = target[0] + herd_dlat
+    self.target_lon = target[1] + herd_dlon
+    self.noise = np.empty(num_animals)  # Reused every tick
 
+  def set_targets(self, lat, lon, animals=slice(None)):
+    """Point some (default: all) animals at new targets; lat/lon are scalars or arrays."""
+    self.target_lat[animals] = lat
+    self.target_lon[animals] = lon
+
+  def walk(self, position):
+    self.rng.random(out=self.noise)
+    self.noise *= 2 * self.wander
+    self.noise -= self.wander
+    position += self.noise
+
+  def step(self):
+    """Move every animal one tick, in place."""
+    self.lat += (self.target_lat - self.lat) * self.step_fraction
+    self.lon += (self.target_lon - self.lon) * self.step_fraction
+    if self.cohesion and len(self.herd_starts) < self.num_animals:
+      for position in (self.lat, self.lon):
+        centroid = np.add.reduceat(position, self.herd_starts) / self.herd_counts
+        position += self.cohesion * (np.repeat(centroid, self.herd_counts) - position)
+    self.walk(self.lat)
+    self.walk(self.lon)
+
+  def positions(self):
+    return np.column_stack((self.lat, self.lon)).tolist()
+
+  def encode_chunk(self, start, stop, first_id=0):
+    """Compact payload bytes (elk_id, lat, lon) for animals [start, stop), built from the arrays."""
+    ids = np.arange(first_id + start, first_id + stop, dtype=np.int64)
+    return pack_columns(stop - start, [
+      ('elk_id', INT, int_body(ids)),
+      ('lat', FIXED, fixed_body(self.lat[start:stop], COORDINATE_DECIMALS)),
+      ('lon', FIXED, fixed_body(self.lon[start:stop], COORDINATE_DECIMALS)),
+    ])
+
+  def payload_chunks(self, chunk_size=HERD_CHUNK_SIZE, first_id=0):
+    """Envelope fields ({'contentType', 'payload'}) for the whole herd, chunk_size animals each."""
+    for start in range(0, self.num_animals, chunk_size):
+      yield payload_fields(self.encode_chunk(start, min(start + chunk_size, self.num_animals), first_id))
+
+# The classic herd of NUM_ELKS, kept together in one herd without cohesion
+herd = HerdModel(NUM_ELKS, herd_size=NUM_ELKS, cohesion=0.0)
+
+# Function to update elk positions
+def update_elk_positions():
+  herd.step()
+  return herd.positions()
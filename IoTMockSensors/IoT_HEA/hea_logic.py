@@ -1,35 +1,268 @@
 import json
+import os
 import random
+import sys
 import time
 
+import numpy as np
+
+# Make the shared IoTMockSensors/common package importable when run on its own (python hea_logic.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.array_columns import fixed_body, int_body, string_body
+from common.compact_codec import FIXED, INT, STRING, pack_columns, payload_fields
+
 # Constants
 NUM_ELKS = 8  # Number of elk being tracked
+POSTURES = ("Standing", "Lying Down", "On Side")
+
+# Region mode: HEALTH_ANIMALS > 0 simulates a whole region's health collars with HealthModel
+HEALTH_ANIMALS = int(os.environ.get('HEALTH_ANIMALS', '0'))
+HEALTH_CHUNK_SIZE = int(os.environ.get('HEALTH_CHUNK_SIZE', '2000'))  # Animals per published message
+HEALTH_SEED = os.environ.get('HEALTH_SEED')  # Set for reproducible runs
+# Scripted fever/outbreak events: a JSON list, or the path of a JSON file holding one, e.g.
+#   [{"type": "fever", "start": 10, "animals": [3, 5], "peak": 1.8, "onset": 6, "duration": 40},
+#    {"type": "outbreak", "start": 20, "seed": 5, "group": 25, "transmission": 0.03, "duration": 60}]
+# start/onset/duration are in ticks; see HealthModel.schedule
+HEALTH_SCENARIO = os.environ.get('HEALTH_SCENARIO', '')
+
+# Function to generate one independent health reading for a single elk (fleet mode: one collar per device)
+def elk_health(elk_id):
+    return {
+        "elk_id": elk_id,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "body_temperature": round(random.uniform(36.5, 39.5), 1),  # Normal: 37.0 - 39.0°C
+        "heart_rate": random.randint(30, 50),  # Normal: 30 - 45 BPM
+        "respiration_rate": random.randint(10, 35),  # Normal: 10 - 30 breaths per min
+        "activity_level": round(random.uniform(0, 1), 2),  # 0 (resting) to 1 (high movement)
+        "posture": random.choice(POSTURES),
+        "hydration_level": round(random.uniform(50, 100), 1),  # Percentage
+        "stress_level": round(random.uniform(0, 10), 2),  # 0 (calm) to 10 (high stress)
+    }
+
+def load_scenario(text):
+    """Scenario events from inline JSON or a JSON file path; [] when unset."""
+    if not text:
+        return []
+    if os.path.exists(text):
+        with open(text) as f:
+            return json.load(f)
+    return json.loads(text)
+
+# Posture transitions per tick (rows: from Standing / Lying Down / On Side), healthy and febrile
+POSTURE_TRANSITIONS = np.array([[0.90, 0.09, 0.01], [0.12, 0.85, 0.03], [0.20, 0.30, 0.50]])
+FEVER_POSTURE_TRANSITIONS = np.array([[0.75, 0.20, 0.05], [0.05, 0.85, 0.10], [0.05, 0.25, 0.70]])
+ACTIVITY_BY_POSTURE = np.array([0.45, 0.10, 0.05])  # Mean activity level each posture settles toward
+
+class HealthModel:
+  """Vitals of many animals held in NumPy arrays and advanced a tick at a time.
+
+  Each animal has its own baselines. Activity follows its posture (a Markov
+  chain); body temperature relaxes toward baseline + activity heat + fever;
+  heart and respiration rates follow activity and temperature; hydration falls
+  with activity and fever until the animal drinks; stress rises with fever and
+  exertion. All of it is autocorrelated, so consecutive readings look like one
+  animal rather than independent draws.
+
+  Fevers are scripted with schedule(): a fixed set of animals, or an outbreak
+  that spreads within contact groups (group consecutive ids) until it burns out.
+  """
+
+  def __init__(self, num_animals, seed=None, scenario=()):
+    self.num_animals = num_animals
+    self.rng = np.random.default_rng(seed)
+    self.tick = 0
+    n = num_animals
+    self.base_temperature = self.rng.normal(38.3, 0.25, n)
+    self.base_heart_rate = self.rng.normal(36.0, 3.0, n)
+    self.base_respiration = self.rng.normal(16.0, 2.0, n)
+    self.posture = self.rng.choice(len(POSTURES), n, p=[0.6, 0.35, 0.05])
+    self.activity = ACTIVITY_BY_POSTURE[self.posture] + self.rng.normal(0, 0.05, n)
+    self.temperature = self.base_temperature.copy()
+    self.heart_rate = self.base_heart_rate.copy()
+    self.respiration = self.base_respiration.copy()
+    self.hydration = self.rng.uniform(70, 100, n)
+    self.stress = self.rng.uniform(0.5, 2.5, n)
+
+    # Fever course per animal: infected at tick (-1 = healthy), peak degrees, ramp and plateau ticks
+    self.infected_at = np.full(n, -1, dtype=np.int64)
+    self.fever_peak = np.zeros(n)
+    self.fever_onset = np.ones(n)
+    self.fever_duration = np.zeros(n)
+    self.recovered = np.zeros(n, dtype=bool)  # Immune after an outbreak infection
+    self.fever = np.zeros(n)
+    self.events = sorted(scenario, key=lambda event: event['start'])
+    self.outbreaks = []
+
+  def schedule(self, event):
+    """Add one scenario event (see HEALTH_SCENARIO): type 'fever' or 'outbreak', from tick event['start']."""
+    self.events.append(event)
+    self.events.sort(key=lambda event: event['start'])
+
+  def select(self, event):
+    """Animals an event applies to: explicit ids, a random fraction, or a random count."""
+    if 'animals' in event:
+      return np.asarray(event['animals'], dtype=np.int64) % self.num_animals
+    count = int(event.get('count', round(event.get('fraction', 0.01) * self.num_animals)))
+    return self.rng.choice(self.num_animals, min(max(count, 1), self.num_animals), replace=False)
+
+  def infect(self, animals, event):
+    animals = animals[self.infected_at[animals] < 0]
+    self.infected_at[animals] = self.tick
+    self.fever_peak[animals] = self.rng.normal(event.get('peak', 1.5), 0.2, len(animals))
+    self.fever_onset[animals] = max(1, event.get('onset', 6))
+    self.fever_duration[animals] = event.get('duration', 40)
+
+  def start_events(self):
+    while self.events and self.events[0]['start'] <= self.tick:
+      event = self.events.pop(0)
+      if event['type'] == 'fever':
+        self.infect(self.select(event), event)
+      elif event['type'] == 'outbreak':
+        # Patient zero(s) drawn at random unless given explicitly
+        self.infect(self.select(dict(event, count=event.get('seed', 1))), event)
+        self.outbreaks.append(event)
+      else:
+        raise ValueError(f"Unknown scenario event type {event['type']!r}")
+
+  def spread(self):
+    """Each susceptible animal catches each outbreak with 1 - (1 - transmission)^(febrile group mates)."""
+    for event in self.outbreaks:
+      group = max(1, event.get('group', 25))
+      starts = np.arange(0, self.num_animals, group)
+      counts = np.diff(np.append(starts, self.num_animals))
+      contagious = (self.fever > 0.5).astype(np.int64)
+      exposure = np.repeat(np.add.reduceat(contagious, starts), counts)
+      susceptible = (self.infected_at < 0) & ~self.recovered & (exposure > 0)
+      risk = 1 - (1 - event.get('transmission', 0.02)) ** exposure
+      caught = np.flatnonzero(susceptible & (self.rng.random(self.num_animals) < risk))
+      if caught.size:
+        self.infect(caught, event)
+
+  def update_fever(self):
+    """Ramp up over onset ticks, hold for duration, ramp down over onset ticks, then recover."""
+    sick = self.infected_at >= 0
+    age = np.where(sick, self.tick - self.infected_at, 0).astype(float)
+    rising = np.clip(age / self.fever_onset, 0, 1)
+    falling = np.clip((self.fever_onset * 2 + self.fever_duration - age) / self.fever_onset, 0, 1)
+    self.fever = np.where(sick, self.fever_peak * np.minimum(rising, falling), 0.0)
+    over = sick & (age >= self.fever_onset * 2 + self.fever_duration)
+    self.recovered |= over
+    self.infected_at[over] = -1
+
+  def step(self):
+    """Advance every animal one tick, in place."""
+    n = self.num_animals
+    self.tick += 1
+    self.start_events()
+    self.update_fever()
+    self.spread()
+    febrile = self.fever > 0.5
+    noise = self.rng.standard_normal((5, n))
+
+    # Posture: one Markov step, with the febrile animals using the lying-down-heavy matrix
+    cumulative = np.where(febrile[:, None], np.cumsum(FEVER_POSTURE_TRANSITIONS, 1)[self.posture],
+                          np.cumsum(POSTURE_TRANSITIONS, 1)[self.posture])
+    self.posture = np.minimum((self.rng.random(n)[:, None] > cumulative).sum(1), len(POSTURES) - 1)
+
+    target = ACTIVITY_BY_POSTURE[self.posture] / (1 + self.fever)
+    self.activity += 0.3 * (target - self.activity) + 0.05 * noise[0]
+    np.clip(self.activity, 0, 1, out=self.activity)
+
+    self.temperature += 0.3 * (self.base_temperature + 0.6 * self.activity + self.fever - self.temperature) + 0.05 * noise[1]
+    heat = self.temperature - self.base_temperature
+    self.heart_rate += 0.5 * (self.base_heart_rate + 25 * self.activity + 8 * heat - self.heart_rate) + 1.5 * noise[2]
+    self.respiration += 0.5 * (self.base_respiration + 12 * self.activity + 4 * heat - self.respiration) + noise[3]
+
+    drinking = self.rng.random(n) < 0.02
+    self.hydration -= 0.05 + 0.15 * self.activity + 0.2 * self.fever
+    self.hydration[drinking] += self.rng.uniform(10, 30, int(drinking.sum()))
+    np.clip(self.hydration, 40, 100, out=self.hydration)
+
+    self.stress += 0.2 * (1.5 + 3 * self.fever + 2 * (self.activity > 0.8) - self.stress) + 0.2 * noise[4]
+    np.clip(self.stress, 0, 10, out=self.stress)
+
+  def columns(self, start=0, stop=None):
+    """Rounded published values for animals [start, stop), as arrays."""
+    window = slice(start, stop)
+    return {
+      "body_temperature": np.round(self.temperature[window], 1),
+      "heart_rate": np.rint(self.heart_rate[window]).astype(np.int64),
+      "respiration_rate": np.rint(self.respiration[window]).astype(np.int64),
+      "activity_level": np.round(self.activity[window], 2),
+      "posture": self.posture[window],
+      "hydration_level": np.round(self.hydration[window], 1),
+      "stress_level": np.round(self.stress[window], 2),
+    }
+
+  def records(self, start=0, stop=None, first_id=0):
+    """Readings for animals [start, stop) shaped like elk_health(), ids from first_id + start."""
+    stop = self.num_animals if stop is None else stop
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    columns = self.columns(start, stop)
+    rows = zip(range(first_id + start, first_id + stop), *(column.tolist() for column in columns.values()))
+    return [
+      {"elk_id": elk_id, "timestamp": timestamp, "body_temperature": temperature, "heart_rate": heart_rate,
+       "respiration_rate": respiration, "activity_level": activity, "posture": POSTURES[posture],
+       "hydration_level": hydration, "stress_level": stress}
+      for elk_id, temperature, heart_rate, respiration, activity, posture, hydration, stress in rows
+    ]
+
+  def encode_chunk(self, start, stop, first_id=0):
+    """Compact payload bytes for animals [start, stop) in the HEA processor's shape, built from the arrays."""
+    ids = np.arange(first_id + start, first_id + stop, dtype=np.int64)
+    columns = self.columns(start, stop)
+    return pack_columns(stop - start, [
+      ('sensor_id', INT, int_body(ids)),
+      ('elk_id', INT, int_body(ids)),
+      ('timestamp', STRING, string_body([time.strftime("%Y-%m-%d %H:%M:%S")], np.zeros(stop - start))),
+      ('body_temperature', FIXED, fixed_body(columns['body_temperature'], 1)),
+      ('heart_rate', INT, int_body(columns['heart_rate'])),
+      ('respiration_rate', INT, int_body(columns['respiration_rate'])),
+      ('activity_level', FIXED, fixed_body(columns['activity_level'], 2)),
+      ('posture', STRING, string_body(POSTURES, columns['posture'])),
+      ('hydration_level', FIXED, fixed_body(columns['hydration_level'], 1)),
+      ('stress_level', FIXED, fixed_body(columns['stress_level'], 2)),
+    ])
+
+  def payload_chunks(self, chunk_size=HEALTH_CHUNK_SIZE, first_id=0):
+    """Envelope fields ({'contentType', 'payload'}) for every animal, chunk_size animals each."""
+    for start in range(0, self.num_animals, chunk_size):
+      yield payload_fields(self.encode_chunk(start, min(start + chunk_size, self.num_animals), first_id))
+
+  def stats(self):
+    return {
+      'tick': self.tick,
+      'febrile': int((self.fever > 0.5).sum()),
+      'recovered': int(self.recovered.sum()),
+      'pending_events': len(self.events),
+    }
+
+# The classic herd of NUM_ELKS collars (ids 1..NUM_ELKS)
+health_model = HealthModel(NUM_ELKS, scenario=load_scenario(HEALTH_SCENARIO) if HEALTH_ANIMALS <= 0 else ())
 
 # Function to generate health data for elk
 def generate_health_data():
-    elk_health_data = []
-    
-    for elk_id in range(1, NUM_ELKS + 1):
-        elk_data = {
-            "elk_id": elk_id,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "body_temperature": round(random.uniform(36.5, 39.5), 1),  # Normal: 37.0 - 39.0°C
-            "heart_rate": random.randint(30, 50),  # Normal: 30 - 45 BPM
-            "respiration_rate": random.randint(10, 35),  # Normal: 10 - 30 breaths per min
-            "activity_level": round(random.uniform(0, 1), 2),  # 0 (resting) to 1 (high movement)
-            "posture": random.choice(["Standing", "Lying Down", "On Side"]),
-            "hydration_level": round(random.uniform(50, 100), 1),  # Percentage
-            "stress_level": round(random.uniform(0, 10), 2),  # 0 (calm) to 10 (high stress)
-        }
-        elk_health_data.append(elk_data)
-    
-    return elk_health_data
-
-# Generate sample data
-health_data = generate_health_data()
-
-# Save to JSON file
-with open("elk_health_data.json", "w") as json_file:
-    json.dump(health_data, json_file, indent=4)
-
-print("Elk health data saved to elk_health_data.json")
+    health_model.step()
+    return health_model.records(first_id=1)
+
+if __name__ == "__main__":
+    # Local check: run the model for a while, report ticks/s and write the last tick as sample data
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the elk health model locally')
+    parser.add_argument('--animals', type=int, default=100_000)
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument('--scenario', default=HEALTH_SCENARIO, help='JSON events or a JSON file (see HEALTH_SCENARIO)')
+    parser.add_argument('--output', default='elk_health_data.json')
+    args = parser.parse_args()
+
+    model = HealthModel(args.animals, seed=int(HEALTH_SEED) if HEALTH_SEED else None, scenario=load_scenario(args.scenario))
+    started = time.perf_counter()
+    for _ in range(args.ticks):
+        model.step()
+    elapsed = time.perf_counter() - started
+    print(f"{args.animals} animals x {args.ticks} ticks in {elapsed:.2f} s "
+          f"({args.animals * args.ticks / elapsed:,.0f} readings/s), {model.stats()}")
+    with open(args.output, "w") as json_file:
+        json.dump(model.records(stop=min(args.animals, 1000), first_id=1), json_file, indent=4)
+    print(f"Elk health data saved to {args.output}")
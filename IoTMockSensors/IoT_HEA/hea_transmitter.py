@@ -2,9 +2,13 @@ import json
 import logging
 import time
 from datetime import datetime
-from setup_mqtt import mqtt_connect, log_to_cloudwatch
-from hea_logic import generate_health_data 
+from setup_mqtt import mqtt_connect, log_to_cloudwatch, connection_manager, spooler
+from hea_logic import generate_health_data, elk_health, HealthModel, load_scenario
+from hea_logic import HEALTH_ANIMALS, HEALTH_CHUNK_SIZE, HEALTH_SCENARIO, HEALTH_SEED
 import configuration
+from common.fleet import FLEET_DEVICES, BoundedPublisher, run_fleet
+from common.replay import REPLAY_FILE, replay
+from common.spool import SPOOL_RECONNECT_SECONDS
 from colorama import Fore, Style, init
 import traceback
 
@@ -29,15 +33,23 @@ def publish_message(mqtt_client):
     payload = configuration.create_topic(env_data)  # Use env_data here
     print(f"{Fore.GREEN}The payload: {json.dumps(payload, indent=2)}{Style.RESET_ALL}")
 
-    if configuration.TESTING:
+    if not payload["payload"]:
+      # Every animal was dead-banded this interval (unchanged and not due for a heartbeat)
+      print(f"Nothing changed, skipping publish ({configuration.deadband.stats()})")
+    elif configuration.TESTING:
       print(f"{Fore.BLUE}Testing mode: Payload generated but not publishing to AWS IoT Core.{Style.RESET_ALL}")
     else:
       # Ensure the mqtt_client is valid before trying to publish
       if mqtt_client:
-        print(f'Publishing topic: {Fore.GREEN}{configuration.ENV_TOPIC_NAME}{Style.RESET_ALL}')
-        mqtt_client.publish(configuration.ENV_TOPIC_NAME, json.dumps(payload), 1)
-        logging.info(f"Published: {json.dumps(payload)} to {configuration.ENV_TOPIC_NAME}")
-        log_to_cloudwatch(f"Published: {json.dumps(payload)} to {configuration.ENV_TOPIC_NAME}")
+        print(f'Publishing topic: {Fore.GREEN}{configuration.HEA_TOPIC_NAME}{Style.RESET_ALL}')
+        if spooler.publish(configuration.HEA_TOPIC_NAME, json.dumps(payload)):
+          logging.info(f"Published: {json.dumps(payload)} to {configuration.HEA_TOPIC_NAME}")
+          log_to_cloudwatch(f"Published: {json.dumps(payload)} to {configuration.HEA_TOPIC_NAME}")
+        else:
+          # Offline (or still draining the backlog): spooled to disk, sent in order once reconnected
+          logging.warning(f"Spooled message for {configuration.HEA_TOPIC_NAME}: {spooler.stats()}")
+          if spooler.offline_seconds() > SPOOL_RECONNECT_SECONDS:
+            raise Exception(f"Offline for {spooler.offline_seconds():.0f} s")
       else:
         logging.error(f"MQTT client is None. Cannot publish message.")
   except Exception as e:
@@ -45,35 +57,81 @@ def publish_message(mqtt_client):
     raise
 
 
+# Region mode: one vectorized health model stands in for HEALTH_ANIMALS collars. Each tick advances
+# every animal (plus any scripted fevers/outbreaks) and publishes it in compact chunks of HEALTH_CHUNK_SIZE.
+def publish_region(publisher, region_health):
+  started = time.perf_counter()
+  region_health.step()
+  chunks = 0
+  for fields in region_health.payload_chunks(HEALTH_CHUNK_SIZE):
+    message = json.dumps(configuration.create_encoded_topic(fields))
+    chunks += 1
+    if not configuration.TESTING and publisher:
+      publisher.publish(configuration.HEA_TOPIC_NAME, message)
+  summary = (f"Region tick: {region_health.num_animals} animals in {chunks} messages, "
+             f"{time.perf_counter() - started:.2f} s, {region_health.stats()}")
+  logging.info(summary)
+  log_to_cloudwatch(summary)
+
+# Fleet mode (common/fleet.py): every virtual device is the health collar of one elk
+def make_fleet_message(device):
+  return configuration.create_topic([elk_health(device.index)], topic=device.topic, first_id=device.index)
+
+# Replay mode (common/replay.py): stream a recorded dataset with its original timestamps
+def run_replay(mqtt_client):
+  publisher = BoundedPublisher(mqtt_client) if mqtt_client else None  # Waits for PUBACKs at high replay speeds
+  def publish(message):
+    if publisher:
+      publisher.publish(configuration.HEA_TOPIC_NAME, json.dumps(message))
+  stats = replay('hea', REPLAY_FILE, configuration.HEA_TOPIC_NAME, publish, compact=configuration.COMPACT_ENCODING)
+  log_to_cloudwatch(f"Replay finished: {json.dumps(stats)}")
+
 # Function to attempt preamble setup and connection
 def attempt_preamble_setup():
-    while True:
-        try:
-            logging.info("Attempting to connect to AWS IoT Core...")
-            mqtt_client = mqtt_connect()  # Try connecting
-            logging.info("MQTT connection successful. Entering message publish loop.")
-            return mqtt_client  # Return the client if successful
-        except Exception as e:
-            logging.error(f"Connection failed: {e}. Retrying in 10 seconds...")
-            log_to_cloudwatch(f"Connection failed: {e}. Retrying in 10 seconds...")
-            time.sleep(10)  # Wait 10 seconds before retrying
+    # Retries with jittered exponential backoff until connected; credentials and endpoint are cached across reconnects
+    logging.info("Attempting to connect to AWS IoT Core...")
+    mqtt_client = mqtt_connect()
+    logging.info("MQTT connection successful. Entering message publish loop.")
+    return mqtt_client
 
 if __name__ == "__main__":
     configuration.setup_config()
+    if FLEET_DEVICES > 0:
+        # One process, FLEET_DEVICES virtual devices multiplexed over a pool of connections
+        run_fleet(configuration.CLIENT_ID, configuration.HEA_TOPIC_NAME, make_fleet_message, connection_manager,
+                  configuration.get_fresh_publish_interval, log=log_to_cloudwatch)
+    elif REPLAY_FILE:
+        run_replay(None if configuration.TESTING else attempt_preamble_setup())
+    elif HEALTH_ANIMALS > 0:
+        region_health = HealthModel(HEALTH_ANIMALS, seed=int(HEALTH_SEED) if HEALTH_SEED else None,
+                                    scenario=load_scenario(HEALTH_SCENARIO))
+        # Chunks are published as fast as PUBACKs come back, never more than FLEET_MAX_INFLIGHT unacked
+        publisher = None if configuration.TESTING else BoundedPublisher(attempt_preamble_setup())
+        while True:
+            try:
+                publish_region(publisher, region_health)
+                time.sleep(configuration.get_fresh_publish_interval())
+            except Exception as e:
+                logging.error(f"Error during region publish: {e}. Retrying connection...")
+                log_to_cloudwatch(f"Error during region publish: {e}. Retrying connection...")
+                publisher = BoundedPublisher(attempt_preamble_setup())
     # Continuously try to establish connection until successful
-    if(configuration.TESTING):
+    elif(configuration.TESTING):
          while True:
             publish_message('') 
             time.sleep(15)
     else:
+        # Offline publishes go to the disk spool rather than the SDK's in-memory queue
+        connection_manager.offline_queue_size = 0
         mqtt_client = attempt_preamble_setup()
 
         # Infinite loop to publish messages every 15 seconds
         while True:
             try:
                 publish_message(mqtt_client)  # Publish message
-                print(f"Publish Interval Value: {configuration.get_fresh_publish_interval()}")
-                time.sleep(configuration.get_fresh_publish_interval())
+                publish_interval = configuration.get_fresh_publish_interval()  # Cached, no SSM call per loop
+                print(f"Publish Interval Value: {publish_interval}")
+                time.sleep(publish_interval)
             except Exception as e:
                 logging.error(f"Error during message publish: {e}. Retrying connection...")
                 log_to_cloudwatch(f"Error during message publish: {e}. Retrying connection...")
@@ -0,0 +1,2 @@
+# Code shared by the GPS, ENV and HEA transmitters. The Dockerfiles copy this
+# package into each image next to the transmitter's own modules.
@@ -0,0 +1,28 @@
+import json
+import struct
+
+import numpy as np
+
+# compact_codec column bodies built straight from NumPy arrays, for the array-backed
+# simulators (GPS HerdModel, HEA HealthModel) that publish whole regions per tick.
+# The layouts are the ones compact_codec.encode_column writes; pass the bodies to
+# compact_codec.pack_columns.
+
+
+def int_body(values):
+    """INT column body (int64 first value + int32/int64 deltas) from an int64 array."""
+    deltas = np.diff(values)
+    wide = deltas.size > 0 and (deltas.min() < -2 ** 31 or deltas.max() >= 2 ** 31)
+    return struct.pack('<qB', int(values[0]), 8 if wide else 4) + deltas.astype('<i8' if wide else '<i4').tobytes()
+
+
+def fixed_body(values, places):
+    """FIXED column body from a float array."""
+    return struct.pack('<B', places) + int_body(np.rint(values * 10 ** places).astype(np.int64))
+
+
+def string_body(dictionary, indexes):
+    """STRING column body from the distinct values and an index array into them."""
+    header = json.dumps(list(dictionary), separators=(',', ':')).encode()
+    wide = len(dictionary) >= 2 ** 16
+    return struct.pack('<IB', len(header), 4 if wide else 2) + header + np.asarray(indexes).astype('<u4' if wide else '<u2').tobytes()
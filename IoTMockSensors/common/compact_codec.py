@@ -0,0 +1,194 @@
+# Compact columnar encoding for sensor message payloads.
+#
+# The same module ships with the transmitters (IoTMockSensors/common/compact_codec.py)
+# and the topic processors (CDK/lib/lambda/compact_codec.py); keep the two copies identical.
+#
+# The MQTT envelope stays JSON so the IoT rule can still route it:
+#   {"messageId": ..., "topic": ..., "timestamp": ...,
+#    "contentType": "application/vnd.wildlife.columnar+zlib", "payload": "<base64>"}
+#
+# The payload list of records is turned into columns, one per key, and zlib compressed:
+#   magic b'WC1', uint32 record count, uint16 column count, then per column
+#   uint8 name length, name, uint8 kind, uint32 body length, body.
+# Column kinds:
+#   INT / FIXED  int64 first value + int32/int64 deltas (FIXED also stores the decimal
+#                places it was scaled by, so 53.1234567 with 7 places is exact)
+#   FLOAT        raw float64
+#   STRING       JSON dictionary of distinct values + uint16/uint32 indexes
+#   JSON         JSON list (fallback for anything else, e.g. None or nested values)
+import base64
+import json
+import math
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+
+CONTENT_TYPE = 'application/vnd.wildlife.columnar+zlib'
+MAGIC = b'WC1'
+
+INT, FIXED, FLOAT, STRING, JSON = range(5)
+MAX_DECIMALS = 7
+BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def to_bytes(values, typecode):
+    data = array(typecode, values)
+    if BIG_ENDIAN:
+        data.byteswap()
+    return data.tobytes()
+
+
+def from_bytes(data, typecode):
+    values = array(typecode)
+    values.frombytes(data)
+    if BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def encode_ints(values):
+    deltas = [b - a for a, b in zip(values, values[1:])]
+    wide = any(d < -2 ** 31 or d >= 2 ** 31 for d in deltas)
+    return struct.pack('<qB', values[0], 8 if wide else 4) + to_bytes(deltas, 'q' if wide else 'i')
+
+
+def decode_ints(body):
+    first, width = struct.unpack_from('<qB', body, 0)
+    deltas = from_bytes(body[9:], 'q' if width == 8 else 'i')
+    return list(accumulate(deltas, initial=first))
+
+
+def decimal_places(values, limit=MAX_DECIMALS):
+    """Smallest number of decimal places that represents every float exactly, or None."""
+    for places in range(limit + 1):
+        scale = 10 ** places
+        if all(round(v * scale) / scale == v for v in values):
+            return places
+    return None
+
+
+def encode_column(values, places=None):
+    """Pick the most compact kind for one column. Returns (kind, body)."""
+    kinds = {type(v) for v in values}
+    if kinds == {int}:
+        return INT, encode_ints(values)
+    if kinds <= {int, float} and all(math.isfinite(v) for v in values):
+        if places is None:
+            places = decimal_places(values)
+        if places is not None:
+            scale = 10 ** places
+            return FIXED, struct.pack('<B', places) + encode_ints([round(v * scale) for v in values])
+        return FLOAT, to_bytes(values, 'd')
+    if kinds == {str}:
+        dictionary = list(dict.fromkeys(values))
+        lookup = {value: index for index, value in enumerate(dictionary)}
+        header = json.dumps(dictionary, separators=(',', ':')).encode()
+        typecode = 'H' if len(dictionary) < 2 ** 16 else 'I'
+        return STRING, struct.pack('<IB', len(header), 2 if typecode == 'H' else 4) + header + to_bytes([lookup[v] for v in values], typecode)
+    return JSON, json.dumps(values, separators=(',', ':')).encode()
+
+
+def decode_column(kind, body):
+    if kind == INT:
+        return decode_ints(body)
+    if kind == FIXED:
+        scale = 10 ** body[0]
+        return [q / scale for q in decode_ints(body[1:])]
+    if kind == FLOAT:
+        return from_bytes(body, 'd').tolist()
+    if kind == STRING:
+        header_length, width = struct.unpack_from('<IB', body, 0)
+        dictionary = json.loads(body[5:5 + header_length])
+        indexes = from_bytes(body[5 + header_length:], 'H' if width == 2 else 'I')
+        return [dictionary[i] for i in indexes]
+    if kind == JSON:
+        return json.loads(body)
+    raise ValueError(f"Unknown column kind {kind}")
+
+
+def encode_records(records, decimals=None):
+    """Encode a list of flat dicts sharing the same keys into compressed columnar bytes.
+
+    decimals maps keys to the decimal places they may be quantized to
+    (e.g. {'lat': 7, 'lon': 7}); other float columns are only stored as fixed
+    point when that is lossless.
+    """
+    decimals = decimals or {}
+    keys = list(records[0]) if records else []
+    key_set = set(keys)
+    if any(set(record) != key_set for record in records):
+        raise ValueError("records must all have the same keys")
+    columns = [(key, *encode_column([record[key] for record in records], decimals.get(key))) for key in keys]
+    return pack_columns(len(records), columns)
+
+
+def pack_columns(count, columns):
+    """Compressed columnar bytes from already encoded [(name, kind, body), ...] columns.
+
+    Lets producers that hold their data as arrays (e.g. the GPS herd model) build
+    column bodies directly instead of going through per-record dicts.
+    """
+    parts = [MAGIC, struct.pack('<IH', count, len(columns))]
+    for key, kind, body in columns:
+        name = key.encode()
+        parts.append(struct.pack('<B', len(name)) + name + struct.pack('<BI', kind, len(body)))
+        parts.append(body)
+    return zlib.compress(b''.join(parts))
+
+
+def decode_records(data):
+    """Inverse of encode_records: compressed columnar bytes -> list of dicts.
+
+    Raises ValueError (or zlib.error) for a malformed payload, including valid zlib
+    around truncated or corrupt columns, so callers can reject just that message.
+    """
+    raw = zlib.decompress(data)
+    try:
+        return unpack_records(raw)
+    except (struct.error, IndexError, KeyError, TypeError) as e:
+        raise ValueError(f"malformed columnar payload: {e}") from e
+
+
+def unpack_records(raw):
+    if raw[:3] != MAGIC:
+        raise ValueError("not a columnar payload")
+    count, num_columns = struct.unpack_from('<IH', raw, 3)
+    offset = 9
+    keys = []
+    columns = []
+    for _ in range(num_columns):
+        name_length = raw[offset]
+        keys.append(raw[offset + 1:offset + 1 + name_length].decode())
+        offset += 1 + name_length
+        kind, body_length = struct.unpack_from('<BI', raw, offset)
+        offset += 5
+        column = decode_column(kind, raw[offset:offset + body_length])
+        offset += body_length
+        if len(column) != count:
+            raise ValueError(f"column {keys[-1]} has {len(column)} values, expected {count}")
+        columns.append(column)
+    if offset != len(raw):
+        raise ValueError(f"columns end at byte {offset} of {len(raw)}")
+    if not columns:
+        return [{} for _ in range(count)]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def encode_payload(records, decimals=None):
+    """Envelope fields for a compact payload: {'contentType': ..., 'payload': base64 text}."""
+    return payload_fields(encode_records(records, decimals))
+
+
+def payload_fields(data):
+    """Envelope fields for bytes from encode_records / pack_columns."""
+    return {'contentType': CONTENT_TYPE, 'payload': base64.b64encode(data).decode('ascii')}
+
+
+def decode_payload(message):
+    """Return the message's payload list, decoding it if the envelope says it is compact."""
+    payload = message.get('payload', [])
+    if message.get('contentType') == CONTENT_TYPE:
+        return decode_records(base64.b64decode(payload))
+    return payload
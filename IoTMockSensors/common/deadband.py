@@ -0,0 +1,120 @@
+import math
+import os
+import time
+
+# Edge-side change detection: a record is only published when its animal moved more
+# than DEADBAND_METERS, a watched field changed by more than its delta, or nothing was
+# sent for that animal for DEADBAND_MAX_SILENCE seconds (heartbeat). Messages then
+# carry {"deadband": {"maxSilence": s, "validFor": v, "suppressed": n}} so the processors
+# know each stored reading stays the animal's current value until the next one arrives.
+# The heartbeat goes out on the first reading at or past maxSilence, up to one reading
+# interval later, and then has to reach the table: validFor adds that interval and
+# DEADBAND_SLACK seconds of delivery latency to maxSilence.
+#
+#   GPS_DEADBAND_METERS=25                         (0 = off)
+#   HEA_DEADBAND_DELTAS="body_temperature=0.3,heart_rate=5,respiration_rate=3,stress_level=1,posture"
+#                                                  (field without a delta: any change counts)
+DEADBAND_MAX_SILENCE = int(os.environ.get('DEADBAND_MAX_SILENCE', '300'))
+DEADBAND_SLACK = int(os.environ.get('DEADBAND_SLACK', '30'))
+METERS_PER_DEGREE_LAT = 110_540
+METERS_PER_DEGREE_LON = 111_320  # At the equator, scaled by cos(latitude)
+
+
+def parse_deltas(text):
+    """'a=0.5,b=2,c' -> {'a': 0.5, 'b': 2.0, 'c': 0.0}."""
+    deltas = {}
+    for part in (text or '').split(','):
+        name, _, delta = part.strip().partition('=')
+        if name:
+            deltas[name] = float(delta) if delta else 0.0
+    return deltas
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    """Equirectangular approximation, accurate to well under a metre at deadband distances."""
+    dy = (lat2 - lat1) * METERS_PER_DEGREE_LAT
+    dx = (lon2 - lon1) * METERS_PER_DEGREE_LON * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(dx, dy)
+
+
+class Deadband:
+    """Per-animal change detection against the last *published* record.
+
+    Comparing with the last published value (not the last reading) means slow
+    drift still gets through once it adds up to the threshold.
+    """
+
+    def __init__(self, key, distance=0.0, deltas=None, max_silence=DEADBAND_MAX_SILENCE,
+                 position=('lat', 'lon'), clock=time.monotonic, slack=DEADBAND_SLACK):
+        self.key = key
+        self.distance = distance
+        self.deltas = dict(deltas or {})
+        self.max_silence = max_silence
+        self.position = position
+        self.clock = clock
+        self.slack = slack
+        self.last = {}  # animal -> (published at, record)
+        self.read_at = {}  # animal -> time of its latest reading, published or not
+        self.interval = None  # Longest gap between two readings of an animal in the latest filter call
+        self.published = 0
+        self.suppressed = 0
+
+    @property
+    def enabled(self):
+        return self.distance > 0 or bool(self.deltas)
+
+    def changed(self, record, previous):
+        if self.distance > 0:
+            lat, lon = self.position
+            if distance_meters(previous[lat], previous[lon], record[lat], record[lon]) > self.distance:
+                return True
+        for name, delta in self.deltas.items():
+            old, new = previous.get(name), record.get(name)
+            if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+                if abs(new - old) > delta:
+                    return True
+            elif new != old:
+                return True
+        return False
+
+    def filter(self, records):
+        """Records worth publishing now. Returns (records, number suppressed)."""
+        if not self.enabled:
+            return records, 0
+        now = self.clock()
+        kept = []
+        interval = None
+        for record in records:
+            animal = record[self.key]
+            previous = self.read_at.get(animal)
+            if previous is not None:
+                interval = max(interval or 0, now - previous)
+            self.read_at[animal] = now
+            last = self.last.get(animal)
+            if last is None or now - last[0] >= self.max_silence or self.changed(record, last[1]):
+                self.last[animal] = (now, record)
+                kept.append(record)
+        if interval is not None:
+            self.interval = interval
+        suppressed = len(records) - len(kept)
+        self.published += len(kept)
+        self.suppressed += suppressed
+        return kept, suppressed
+
+    def valid_for(self):
+        """Seconds a published reading stays current: until the next heartbeat can have arrived.
+
+        Until an animal has been read twice the reading interval is unknown and taken to be max_silence.
+        """
+        interval = self.max_silence if self.interval is None else self.interval
+        return int(math.ceil(self.max_silence + interval + self.slack))
+
+    def annotate(self, message, suppressed):
+        """Tell the processors the readings are change-only, valid until the next heartbeat is due."""
+        if self.enabled:
+            message["deadband"] = {"maxSilence": self.max_silence, "validFor": self.valid_for(),
+                                   "suppressed": suppressed}
+        return message
+
+    def stats(self):
+        return {'published': self.published, 'suppressed': self.suppressed, 'animals': len(self.last)}
@@ -0,0 +1,242 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+# Fleet mode: one process drives FLEET_DEVICES independent virtual devices instead of
+# one herd behind a single client. Each device has its own device id (<CLIENT_ID>-<n>),
+# topic (<base topic>/<device id>, matched by the 'IoT/<X>/+' rule) and jittered schedule.
+# Devices are multiplexed over a pool of FLEET_CONNECTIONS MQTT connections; the
+# connections keep the transmitter's client id and <CLIENT_ID>-pool-<k>, so a device id
+# never appears as an MQTT client id, however many connections there are.
+#
+#   FLEET_DEVICES=2000 FLEET_CONNECTIONS=8 python GPS_transmitter.py
+#   python -m common.fleet --devices 5000 --interval 1 --seconds 10   (local, no MQTT)
+FLEET_DEVICES = int(os.environ.get('FLEET_DEVICES', '0'))  # 0 = classic single-client mode
+FLEET_CONNECTIONS = int(os.environ.get('FLEET_CONNECTIONS', '8'))
+FLEET_MAX_INFLIGHT = int(os.environ.get('FLEET_MAX_INFLIGHT', '100'))  # Unacked QoS 1 publishes per connection
+FLEET_TARGET_PER_CORE = float(os.environ.get('FLEET_TARGET_PER_CORE', '1000'))  # messages/s per CPU second
+FLEET_REPORT_SECONDS = float(os.environ.get('FLEET_REPORT_SECONDS', '30'))
+FLEET_JITTER = 0.1  # Each period is interval * uniform(0.9, 1.1)
+ACK_TIMEOUT_SECONDS = 10
+
+
+class VirtualDevice:
+    __slots__ = ('index', 'client_id', 'topic', 'state')
+
+    def __init__(self, index, client_id, topic):
+        self.index = index
+        self.client_id = client_id
+        self.topic = topic
+        self.state = None  # Whatever the transmitter's make_message keeps per device
+
+
+def build_devices(count, client_id, base_topic):
+    width = len(str(count))
+    devices = []
+    for index in range(count):
+        device_client_id = f"{client_id}-{index:0{width}d}"
+        devices.append(VirtualDevice(index, device_client_id, f"{base_topic}/{device_client_id}"))
+    return devices
+
+
+class FleetStats:
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.cpu_started = time.process_time()
+        self.sent = 0
+        self.acked = 0
+        self.failed = 0
+        self.suppressed = 0
+        self.bytes = 0
+        self.lag_total = 0.0  # How late publishes were against their schedule
+        self.lag_max = 0.0
+
+    def report(self):
+        elapsed = max(self.clock() - self.started, 1e-9)
+        cpu = max(time.process_time() - self.cpu_started, 1e-9)
+        per_core = self.sent / cpu
+        return {
+            'sent': self.sent,
+            'acked': self.acked,
+            'failed': self.failed,
+            'suppressed': self.suppressed,
+            'messages_per_second': round(self.sent / elapsed, 1),
+            'messages_per_cpu_second': round(per_core, 1),
+            'target_per_core': FLEET_TARGET_PER_CORE,
+            'meets_target': per_core >= FLEET_TARGET_PER_CORE,
+            'bytes_per_message': round(self.bytes / self.sent, 1) if self.sent else 0,
+            'mean_lag_ms': round(self.lag_total / self.sent * 1000, 2) if self.sent else 0,
+            'max_lag_ms': round(self.lag_max * 1000, 2),
+        }
+
+
+class PooledPublisher:
+    """Publishes for many devices over a small pool of MQTT connections.
+
+    Devices are pinned to a connection by index. publishAsync hands the message to
+    the SDK without blocking the event loop; the PUBACK callback (SDK thread)
+    resolves an asyncio future. In-flight publishes are bounded per connection.
+    """
+
+    def __init__(self, clients, max_inflight=FLEET_MAX_INFLIGHT, ack_timeout=ACK_TIMEOUT_SECONDS):
+        self.clients = clients
+        self.max_inflight = max_inflight
+        self.ack_timeout = ack_timeout
+        self.slots = None
+
+    async def publish(self, device, payload):
+        loop = asyncio.get_running_loop()
+        if self.slots is None:
+            self.slots = [asyncio.Semaphore(self.max_inflight) for _ in self.clients]
+        connection = device.index % len(self.clients)
+        async with self.slots[connection]:
+            acked = loop.create_future()
+
+            def on_ack(mid):
+                loop.call_soon_threadsafe(lambda: acked.done() or acked.set_result(mid))
+
+            self.clients[connection].publishAsync(device.topic, payload, 1, ackCallback=on_ack)
+            await asyncio.wait_for(acked, self.ack_timeout)
+
+
+class BoundedPublisher:
+    """Blocking counterpart of FleetPublisher for the replay and region loops: at most
+    max_inflight unacked QoS 1 publishes on one connection, so a fast loop waits for
+    PUBACKs instead of growing the SDK's queue.
+
+    A slot is taken before publishAsync and given back by its ackCallback (SDK thread).
+    """
+
+    def __init__(self, client, max_inflight=FLEET_MAX_INFLIGHT, ack_timeout=ACK_TIMEOUT_SECONDS):
+        self.client = client
+        self.max_inflight = max_inflight
+        self.ack_timeout = ack_timeout
+        self.slots = threading.BoundedSemaphore(max_inflight)
+
+    def publish(self, topic, payload, qos=1):
+        if not self.slots.acquire(timeout=self.ack_timeout):
+            raise TimeoutError(f"No PUBACK for {self.max_inflight} publishes within {self.ack_timeout} s")
+        try:
+            self.client.publishAsync(topic, payload, qos, ackCallback=lambda mid: self.slots.release())
+        except Exception:
+            self.slots.release()
+            raise
+
+
+class NullPublisher:
+    """Publisher for local runs: the message is built and serialized but goes nowhere."""
+
+    async def publish(self, device, payload):
+        return None
+
+
+async def run_schedule(devices, make_message, publisher, interval_fn, stats, duration=None, log=None):
+    """Publish one message per device per interval (jittered) until duration runs out."""
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    interval = interval_fn()
+    # Random phase per device so the fleet doesn't publish in lockstep
+    schedule = [(now + random.uniform(0, interval), device.index) for device in devices]
+    heapq.heapify(schedule)
+    deadline = None if duration is None else now + duration
+    next_report = now + FLEET_REPORT_SECONDS
+    pending = set()
+
+    async def send(device, due):
+        try:
+            message = make_message(device)
+            if not message.get('payload'):
+                stats.suppressed += 1  # Dead-banded: nothing changed for this device
+                return
+            message['deviceId'] = device.client_id
+            payload = json.dumps(message)
+            stats.bytes += len(payload)
+            lag = loop.time() - due
+            stats.lag_total += lag
+            stats.lag_max = max(stats.lag_max, lag)
+            stats.sent += 1
+            await publisher.publish(device, payload)
+            stats.acked += 1
+        except Exception as e:
+            stats.failed += 1
+            logging.error(f"Fleet publish failed for {device.client_id}: {e}")
+
+    while schedule:
+        due, index = schedule[0]
+        if deadline is not None and due >= deadline:
+            break
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        heapq.heappop(schedule)
+        task = loop.create_task(send(devices[index], due))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        heapq.heappush(schedule, (due + interval * random.uniform(1 - FLEET_JITTER, 1 + FLEET_JITTER), index))
+
+        if loop.time() >= next_report:
+            interval = interval_fn()  # Picks up publish interval changes (cached SSM value)
+            next_report = loop.time() + FLEET_REPORT_SECONDS
+            report = stats.report()
+            logging.info(f"Fleet: {report}")
+            if log:
+                log(f"Fleet stats: {json.dumps(report)}")
+
+    if pending:
+        await asyncio.wait(pending)
+    return stats.report()
+
+
+async def connect_pool(connection_manager, client_id, connections):
+    """Connect the pool concurrently, reusing the first connection's CA, certificate and endpoint."""
+    loop = asyncio.get_running_loop()
+    first = await loop.run_in_executor(None, connection_manager.connect_with_retry)
+    managers = [connection_manager.clone(f"{client_id}-pool-{k}") for k in range(1, connections)]
+    others = await asyncio.gather(*(loop.run_in_executor(None, manager.connect_with_retry) for manager in managers))
+    return [first, *others]
+
+
+def run_fleet(client_id, base_topic, make_message, connection_manager, interval_fn,
+              devices=FLEET_DEVICES, connections=FLEET_CONNECTIONS, duration=None, log=None):
+    """Entry point for the transmitters: connect the pool and run the fleet."""
+    fleet = build_devices(devices, client_id, base_topic)
+    connections = max(1, min(connections, devices))
+
+    async def main():
+        started = time.monotonic()
+        clients = await connect_pool(connection_manager, client_id, connections)
+        logging.info(f"Fleet: {connections} connections up in {time.monotonic() - started:.2f} s for {devices} devices")
+        return await run_schedule(fleet, make_message, PooledPublisher(clients), interval_fn, FleetStats(),
+                                  duration=duration, log=log)
+
+    return asyncio.run(main())
+
+
+if __name__ == '__main__':
+    # Local throughput check: GPS-shaped messages, serialized but not sent
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Measure fleet mode throughput without MQTT')
+    parser.add_argument('--devices', type=int, default=5000)
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    def make_message(device):
+        if device.state is None:
+            device.state = [53.0 + random.uniform(-0.01, 0.01), -127.0 + random.uniform(-0.01, 0.01)]
+        device.state[0] += random.uniform(-0.002, 0.002)
+        device.state[1] += random.uniform(-0.002, 0.002)
+        return {'messageId': f"{device.client_id}-{time.time()}", 'topic': device.topic, 'timestamp': time.time(),
+                'payload': [{'elk_id': device.index, 'lat': device.state[0], 'lon': device.state[1]}]}
+
+    logging.basicConfig(level=logging.INFO)
+    report = asyncio.run(run_schedule(build_devices(args.devices, 'GPSCollar', 'IoT/GPS'), make_message,
+                                      NullPublisher(), lambda: args.interval, FleetStats(), duration=args.seconds))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,82 @@
+import time
+
+from botocore.exceptions import ClientError
+
+from common.log_shipper import EVENT_OVERHEAD_BYTES, MAX_BATCH_BYTES, MAX_BATCH_EVENTS, MAX_BATCH_SPAN_MS
+
+# Local stand-in for the CloudWatch Logs client, for exercising the log shipper
+# without AWS. It enforces the PutLogEvents limits the shipper has to respect,
+# can add per-call latency and can throttle the first few puts.
+#
+#   client = LocalLogsClient(latency=0.05)
+#   shipper = CloudWatchLogShipper('/docker/GPS', 'mqtt_connect', client=client)
+#   shipper.log('hello'); shipper.flush()
+#   client.events[('/docker/GPS', 'mqtt_connect')]
+
+
+def client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class LocalLogsClient:
+    def __init__(self, latency=0.0, throttle_first=0):
+        self.latency = latency
+        self.throttle_first = throttle_first  # Number of put_log_events calls answered with ThrottlingException
+        self.groups = set()
+        self.events = {}  # (group, stream) -> list of events
+        self.calls = {}
+
+    def call(self, operation):
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def create_log_group(self, logGroupName):
+        self.call('CreateLogGroup')
+        if logGroupName in self.groups:
+            raise client_error('ResourceAlreadyExistsException', 'CreateLogGroup')
+        self.groups.add(logGroupName)
+
+    def create_log_stream(self, logGroupName, logStreamName):
+        self.call('CreateLogStream')
+        if logGroupName not in self.groups:
+            raise client_error('ResourceNotFoundException', 'CreateLogStream')
+        if (logGroupName, logStreamName) in self.events:
+            raise client_error('ResourceAlreadyExistsException', 'CreateLogStream')
+        self.events[(logGroupName, logStreamName)] = []
+
+    def put_log_events(self, logGroupName, logStreamName, logEvents, sequenceToken=None):
+        self.call('PutLogEvents')
+        if self.throttle_first > 0:
+            self.throttle_first -= 1
+            raise client_error('ThrottlingException', 'PutLogEvents')
+        stream = self.events.get((logGroupName, logStreamName))
+        if stream is None:
+            raise client_error('ResourceNotFoundException', 'PutLogEvents')
+
+        size = sum(len(event['message'].encode('utf-8')) + EVENT_OVERHEAD_BYTES for event in logEvents)
+        timestamps = [event['timestamp'] for event in logEvents]
+        if not logEvents or len(logEvents) > MAX_BATCH_EVENTS or size > MAX_BATCH_BYTES:
+            raise client_error('InvalidParameterException', 'PutLogEvents')
+        if timestamps != sorted(timestamps) or timestamps[-1] - timestamps[0] >= MAX_BATCH_SPAN_MS:
+            raise client_error('InvalidParameterException', 'PutLogEvents')
+        stream.extend(logEvents)
+        return {'nextSequenceToken': str(len(stream))}
+
+
+if __name__ == '__main__':
+    # python -m common.local_logs (from IoTMockSensors/): cost of logging on the publish thread
+    from common.log_shipper import CloudWatchLogShipper
+
+    lines = 200
+    client = LocalLogsClient(latency=0.02)
+    shipper = CloudWatchLogShipper('/docker/GPS', 'mqtt_connect', client=client, flush_interval=0.5)
+    start = time.perf_counter()
+    for i in range(lines):
+        shipper.log(f"Published: message {i}")
+    enqueue_ms = (time.perf_counter() - start) * 1000
+    shipper.flush()
+    print(f"{lines} lines: {enqueue_ms / lines:.4f} ms per log() call on the caller, "
+          f"{sum(client.calls.values())} API calls {client.calls} "
+          f"(the synchronous log_to_cloudwatch made 4 per line: ~{4 * 0.02 * 1000:.0f} ms each at this latency)")
+    print(shipper.stats())
@@ -0,0 +1,204 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import boto3
+from botocore.exceptions import ClientError
+
+# PutLogEvents limits
+MAX_BATCH_EVENTS = 10_000
+MAX_BATCH_BYTES = 1_048_576  # Sum of UTF-8 message sizes + 26 bytes per event
+EVENT_OVERHEAD_BYTES = 26
+MAX_EVENT_BYTES = 256 * 1024 - EVENT_OVERHEAD_BYTES
+MAX_BATCH_SPAN_MS = 24 * 60 * 60 * 1000  # Events in one batch must fall within 24 hours
+
+FLUSH_SECONDS = float(os.environ.get('LOG_FLUSH_SECONDS', '5'))
+QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+# What log() does when the queue is full: 'drop' the line, or 'block' the caller
+# (backpressure) for up to LOG_BLOCK_SECONDS before dropping it.
+FULL_POLICY = os.environ.get('LOG_QUEUE_FULL_POLICY', 'drop')
+BLOCK_SECONDS = float(os.environ.get('LOG_BLOCK_SECONDS', '1'))
+MAX_ATTEMPTS = 5
+RETRYABLE_ERRORS = {'ThrottlingException', 'ServiceUnavailableException', 'InternalFailure'}
+
+
+class CloudWatchLogShipper:
+    """Ships log lines to one CloudWatch log stream from a background thread.
+
+    log() only timestamps the line and puts it on an in-memory queue. The worker
+    thread batches queued lines until a batch is full (PutLogEvents count/size/span
+    limits) or FLUSH_SECONDS have passed since its first line, then sends it with a
+    single PutLogEvents call. The log group and stream are created once, on the
+    first send (and again only if CloudWatch reports them missing).
+    """
+
+    def __init__(self, log_group, log_stream, client=None, queue_size=QUEUE_SIZE,
+                 flush_interval=FLUSH_SECONDS, policy=FULL_POLICY, block_seconds=BLOCK_SECONDS,
+                 max_attempts=MAX_ATTEMPTS, sleep=time.sleep):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown queue full policy {policy!r}, expected 'drop' or 'block'")
+        self.log_group = log_group
+        self.log_stream = log_stream
+        self.client = client
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_seconds = block_seconds
+        self.max_attempts = max_attempts
+        self.sleep = sleep
+        self.stream_ready = False
+        self.carry = None  # Event that didn't fit in the previous batch
+        self.worker = None
+        self.start_lock = threading.Lock()
+        self.queued = 0
+        self.sent = 0
+        self.batches = 0
+        self.dropped_full = 0
+        self.dropped_failed = 0
+
+    def logs(self):
+        if self.client is None:
+            self.client = boto3.client('logs', region_name='us-east-1')
+        return self.client
+
+    def start(self):
+        with self.start_lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name='cloudwatch-log-shipper', daemon=True)
+                self.worker.start()
+
+    def log(self, message):
+        """Queue one line. Never calls CloudWatch; returns False if the line was dropped."""
+        if self.worker is None:
+            self.start()
+        data = str(message).encode('utf-8')
+        if len(data) > MAX_EVENT_BYTES:
+            message = data[:MAX_EVENT_BYTES].decode('utf-8', errors='ignore')
+        else:
+            message = data.decode('utf-8')
+        event = (int(time.time() * 1000), message)
+        try:
+            if self.policy == 'block':
+                self.queue.put(event, timeout=self.block_seconds)
+            else:
+                self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped_full += 1
+            return False
+        self.queued += 1
+        return True
+
+    def flush(self, timeout=10):
+        """Send everything queued so far. Returns False if the worker didn't get there in time."""
+        if self.worker is None or not self.worker.is_alive():
+            return self.queue.empty()
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def next_batch(self):
+        """Block until a batch is due. Returns (events, flush_marker or None)."""
+        events = []
+        size = 0
+        deadline = None
+        while True:
+            if self.carry is not None:
+                item, self.carry = self.carry, None
+            else:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    return events, None
+            if isinstance(item, threading.Event):
+                return events, item
+
+            timestamp, message = item
+            event_size = len(message.encode('utf-8')) + EVENT_OVERHEAD_BYTES
+            if events and (len(events) >= MAX_BATCH_EVENTS or size + event_size > MAX_BATCH_BYTES
+                           or abs(timestamp - events[0]['timestamp']) >= MAX_BATCH_SPAN_MS):
+                self.carry = item
+                return events, None
+            events.append({'timestamp': timestamp, 'message': message})
+            size += event_size
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+
+    def run(self):
+        while True:
+            events, marker = self.next_batch()
+            if events:
+                self.send(events)
+            if marker is not None:
+                marker.set()
+
+    def ensure_stream(self):
+        for create, kwargs in (
+            (self.logs().create_log_group, {'logGroupName': self.log_group}),
+            (self.logs().create_log_stream, {'logGroupName': self.log_group, 'logStreamName': self.log_stream}),
+        ):
+            try:
+                create(**kwargs)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'ResourceAlreadyExistsException':
+                    raise
+        self.stream_ready = True
+
+    def send(self, events):
+        # Lines logged from several threads can interleave out of order; PutLogEvents wants them sorted
+        events.sort(key=lambda event: event['timestamp'])
+        error = None
+        for attempt in range(self.max_attempts):
+            try:
+                if not self.stream_ready:
+                    self.ensure_stream()
+                # Sequence tokens are no longer required (or checked) by PutLogEvents
+                self.logs().put_log_events(logGroupName=self.log_group, logStreamName=self.log_stream, logEvents=events)
+                self.sent += len(events)
+                self.batches += 1
+                return True
+            except ClientError as e:
+                error = e
+                code = e.response.get('Error', {}).get('Code')
+                if code == 'ResourceNotFoundException':
+                    self.stream_ready = False  # Group or stream was deleted, recreate on the next attempt
+                elif code not in RETRYABLE_ERRORS:
+                    break
+            except Exception as e:  # Network errors, expired credentials, ...
+                error = e
+            if attempt + 1 < self.max_attempts:
+                self.sleep(min(10.0, 0.2 * 2 ** attempt) * random.uniform(0.5, 1.0))
+        self.dropped_failed += len(events)
+        logging.error(f"Failed to ship {len(events)} log lines to CloudWatch: {error}")
+        return False
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'sent': self.sent,
+            'batches': self.batches,
+            'pending': self.queue.qsize(),
+            'dropped_full': self.dropped_full,
+            'dropped_failed': self.dropped_failed,
+        }
+
+
+shippers = {}
+shippers_lock = threading.Lock()
+
+
+def get_shipper(log_group, log_stream, client=None):
+    """One shipper per (group, stream) per process, flushed when the process exits."""
+    with shippers_lock:
+        shipper = shippers.get((log_group, log_stream))
+        if shipper is None:
+            shipper = shippers[(log_group, log_stream)] = CloudWatchLogShipper(log_group, log_stream, client=client)
+            atexit.register(shipper.flush, 5)
+        return shipper
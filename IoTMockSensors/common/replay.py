@@ -0,0 +1,262 @@
+import csv
+import heapq
+import logging
+import os
+import pickle
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+from common.compact_codec import encode_payload
+
+# Replay mode: stream recorded GPS/ENV/HEA records from CSV or Parquet back through
+# the pipeline at 1x-1000x wall clock speed (0 = as fast as possible). Records keep
+# their original timestamps (the envelope timestamp is the recorded time) and each
+# animal's records are sent in their recorded order.
+#
+#   REPLAY_FILE=testing/elk_movement.csv REPLAY_SPEED=100 python GPS_transmitter.py
+#   python -m common.replay gps IoT_GPS/testing/elk_movement.csv --speed 0   (dry run, no MQTT)
+#
+# Reading is streaming and memory-bounded: files already in time order are read
+# row by row (--presorted); anything else (e.g. elk_movement.csv, grouped by animal)
+# goes through an external merge sort that keeps at most REPLAY_SORT_ROWS rows in memory.
+REPLAY_FILE = os.environ.get('REPLAY_FILE')
+REPLAY_SPEED = float(os.environ.get('REPLAY_SPEED', '1'))
+REPLAY_PRESORTED = os.environ.get('REPLAY_PRESORTED', 'false').lower() == 'true'
+REPLAY_SORT_ROWS = int(os.environ.get('REPLAY_SORT_ROWS', '200000'))
+REPLAY_MAX_RECORDS = int(os.environ.get('REPLAY_MAX_RECORDS', '500'))  # Records per message
+MAX_SPEED = 1000
+
+# Payload keys per sensor kind: key -> (type, column names accepted in recorded files)
+FORMATS = {
+    'gps': {
+        'elk_id': (int, ('elk_id', 'Animal_ID', 'ElkId')),
+        'lat': (float, ('lat', 'Latitude')),
+        'lon': (float, ('lon', 'Longitude')),
+    },
+    'env': {
+        'sensor_id': (int, ('sensor_id', 'SensorId')),
+        'lat': (float, ('lat', 'latitude', 'Latitude')),
+        'lon': (float, ('lon', 'longitude', 'Longitude')),
+        'temperature': (float, ('temperature', 'Temperature')),
+        'humidity': (float, ('humidity', 'Humidity')),
+        'wind_direction': (str, ('wind_direction', 'WindDirection')),
+    },
+    'hea': {
+        'sensor_id': (int, ('sensor_id', 'SensorId')),
+        'elk_id': (int, ('elk_id', 'ElkId', 'Animal_ID')),
+        'body_temperature': (float, ('body_temperature', 'BodyTemperature')),
+        'heart_rate': (int, ('heart_rate', 'HeartRate')),
+        'respiration_rate': (int, ('respiration_rate', 'RespirationRate')),
+        'activity_level': (float, ('activity_level', 'ActivityLevel')),
+        'posture': (str, ('posture', 'Posture')),
+        'hydration_level': (float, ('hydration_level', 'HydrationLevel')),
+        'stress_level': (float, ('stress_level', 'StressLevel')),
+    },
+}
+TIMESTAMP_COLUMNS = ('timestamp', 'Timestamp', 'time')
+DECIMALS = {'gps': {'lat': 7, 'lon': 7}, 'env': {'lat': 7, 'lon': 7}, 'hea': None}
+
+
+def parse_timestamp(value):
+    """Recorded timestamp (epoch seconds, ISO or 'YYYY-MM-DD HH:MM:SS', naive = UTC) -> epoch seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        value = str(value).strip()
+        try:
+            return float(value)
+        except ValueError:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def read_rows(path, batch_size=10000):
+    """Stream dict rows from a CSV or Parquet file."""
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Replaying Parquet files needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+    else:
+        with open(path, newline='') as f:
+            yield from csv.DictReader(f)
+
+
+def record_converter(kind, columns):
+    """Build row -> (epoch, payload record) for the columns present in the file."""
+    fields = []
+    for key, (cast, names) in FORMATS[kind].items():
+        column = next((name for name in names if name in columns), None)
+        if column is None:
+            raise ValueError(f"{kind} replay needs one of the columns {names}")
+        fields.append((key, cast, column))
+    time_column = next((name for name in TIMESTAMP_COLUMNS if name in columns), None)
+    if time_column is None:
+        raise ValueError(f"replay needs a timestamp column, one of {TIMESTAMP_COLUMNS}")
+
+    def convert(row):
+        epoch = parse_timestamp(row[time_column])
+        record = {key: cast(row[column]) for key, cast, column in fields}
+        if kind == 'hea':
+            # The HEA processor reads each record's own timestamp
+            record['timestamp'] = datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return epoch, record
+
+    return convert
+
+
+def spill(rows):
+    rows.sort(key=lambda row: row[:2])
+    temp = tempfile.TemporaryFile()
+    for row in rows:
+        pickle.dump(row, temp, protocol=pickle.HIGHEST_PROTOCOL)
+    temp.seek(0)
+    return temp
+
+
+def read_spill(temp):
+    try:
+        while True:
+            yield pickle.load(temp)
+    except EOFError:
+        temp.close()
+
+
+def time_ordered(records, sort_rows=REPLAY_SORT_ROWS, presorted=False):
+    """Yield (epoch, record) in time order, keeping recorded order for equal times.
+
+    Unsorted input is sorted externally: runs of sort_rows rows are sorted and
+    spilled to temporary files, then k-way merged, so memory stays bounded.
+    """
+    if presorted:
+        last = None
+        for epoch, record in records:
+            if last is not None and epoch < last:
+                raise ValueError("replay input is not in time order; drop REPLAY_PRESORTED to sort it")
+            last = epoch
+            yield epoch, record
+        return
+
+    runs = []
+    rows = []
+    for sequence, (epoch, record) in enumerate(records):
+        rows.append((epoch, sequence, record))
+        if len(rows) >= sort_rows:
+            runs.append(spill(rows))
+            rows = []
+    rows.sort(key=lambda row: row[:2])
+    # The sequence number breaks ties, so each animal's records keep their recorded order
+    for epoch, _, record in heapq.merge(*(read_spill(run) for run in runs), rows, key=lambda row: row[:2]):
+        yield epoch, record
+
+
+def group_messages(ordered, max_records=REPLAY_MAX_RECORDS):
+    """Group records sharing a timestamp into one message: yields (epoch, [records])."""
+    batch_epoch, batch = None, []
+    for epoch, record in ordered:
+        if batch and (epoch != batch_epoch or len(batch) >= max_records):
+            yield batch_epoch, batch
+            batch = []
+        batch_epoch = epoch
+        batch.append(record)
+    if batch:
+        yield batch_epoch, batch
+
+
+def build_message(kind, topic, epoch, records, compact=False):
+    message = {
+        "messageId": str(uuid.uuid4()),
+        "topic": topic,
+        "timestamp": epoch,  # Recorded time, not replay time
+        "payload": records,
+    }
+    if compact and records:
+        message.update(encode_payload(records, decimals=DECIMALS[kind]))
+    return message
+
+
+def replay(kind, path, topic, publish, speed=REPLAY_SPEED, presorted=REPLAY_PRESORTED,
+           sort_rows=REPLAY_SORT_ROWS, max_records=REPLAY_MAX_RECORDS, compact=False,
+           clock=time.monotonic, sleep=time.sleep):
+    """Replay a recorded file through publish(message), paced at speed x the recorded rate.
+
+    speed 0 sends as fast as possible. Returns replay statistics.
+    """
+    if speed < 0 or speed > MAX_SPEED:
+        raise ValueError(f"replay speed must be between 0 (unthrottled) and {MAX_SPEED}")
+    rows = read_rows(path)
+    first = next(rows, None)
+    if first is None:
+        return {'messages': 0, 'records': 0}
+    convert = record_converter(kind, set(first))
+
+    def records():
+        yield convert(first)
+        for row in rows:
+            yield convert(row)
+
+    started = clock()
+    first_epoch = last_epoch = None
+    messages = count = 0
+    max_behind = 0.0
+    for epoch, batch in group_messages(time_ordered(records(), sort_rows, presorted), max_records):
+        if first_epoch is None:
+            first_epoch = epoch
+        if speed:
+            due = started + (epoch - first_epoch) / speed
+            delay = due - clock()
+            if delay > 0:
+                sleep(delay)
+            else:
+                max_behind = max(max_behind, -delay)
+        publish(build_message(kind, topic, epoch, batch, compact))
+        last_epoch = epoch
+        messages += 1
+        count += len(batch)
+
+    elapsed = clock() - started
+    stats = {
+        'messages': messages,
+        'records': count,
+        'recorded_seconds': round(last_epoch - first_epoch, 3),
+        'replay_seconds': round(elapsed, 3),
+        'effective_speed': round((last_epoch - first_epoch) / elapsed, 1) if elapsed > 0 else None,
+        'records_per_second': round(count / elapsed, 1) if elapsed > 0 else None,
+        'max_behind_seconds': round(max_behind, 3),  # How far publishing fell behind the schedule
+    }
+    logging.info(f"Replay of {path} finished: {stats}")
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Replay a recorded sensor file without MQTT (dry run)')
+    parser.add_argument('kind', choices=sorted(FORMATS))
+    parser.add_argument('path')
+    parser.add_argument('--speed', type=float, default=REPLAY_SPEED)
+    parser.add_argument('--presorted', action='store_true')
+    parser.add_argument('--sort-rows', type=int, default=REPLAY_SORT_ROWS)
+    parser.add_argument('--compact', action='store_true')
+    parser.add_argument('--show', type=int, default=0, help='print the first N messages')
+    args = parser.parse_args()
+
+    shown = []
+
+    def publish(message):
+        if len(shown) < args.show:
+            shown.append(message)
+            print(json.dumps(message))
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(replay(args.kind, args.path, f"IoT/{args.kind.upper()}", publish, speed=args.speed,
+                            presorted=args.presorted, sort_rows=args.sort_rows, compact=args.compact), indent=2))
@@ -0,0 +1,332 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Store-and-forward for offline transmitters. Instead of the SDK's in-memory offline
+# queue (which grows until the task is OOM-killed), publishes that can't go out now
+# are appended to a size-bounded spool of segment files on disk and drained in
+# batches, at a controlled rate, once the connection is back. The spool survives
+# process restarts: segments and the read cursor are reopened from SPOOL_DIR (mount
+# a volume there for it to also survive the container being replaced).
+#
+#   SPOOL_DIR=/data/spool SPOOL_MAX_MB=64 SPOOL_DRAIN_RATE=50 python GPS_transmitter.py
+#
+# When the spool is full the oldest segment is dropped (ring buffer): recent
+# readings are worth more than old ones after a long outage.
+SPOOL_DIR = os.environ.get('SPOOL_DIR', 'spool')
+SPOOL_MAX_BYTES = int(float(os.environ.get('SPOOL_MAX_MB', '64')) * 1024 * 1024)
+SPOOL_SEGMENT_BYTES = int(float(os.environ.get('SPOOL_SEGMENT_MB', '4')) * 1024 * 1024)
+SPOOL_DRAIN_RATE = float(os.environ.get('SPOOL_DRAIN_RATE', '50'))  # Messages/s while catching up
+SPOOL_DRAIN_BATCH = int(os.environ.get('SPOOL_DRAIN_BATCH', '100'))
+SPOOL_RETRY_SECONDS = float(os.environ.get('SPOOL_RETRY_SECONDS', '5'))  # Drain attempts while offline
+# Offline for longer than this, the publish loop stops waiting on the SDK's auto-reconnect and connects afresh
+SPOOL_RECONNECT_SECONDS = float(os.environ.get('SPOOL_RECONNECT_SECONDS', '300'))
+SPOOL_FSYNC = os.environ.get('SPOOL_FSYNC', 'false').lower() == 'true'  # fsync every append (power-loss safe)
+
+# Frame: payload length, CRC32 of the payload, payload (topic + '\n' + message)
+FRAME_HEADER = struct.Struct('<II')
+SEGMENT_SUFFIX = '.seg'
+CURSOR_FILE = 'cursor'
+
+
+class Spool:
+    """Persistent FIFO of (topic, message) records in append-only segment files.
+
+    Records are appended to the newest segment, which rolls over at segment_bytes.
+    The read cursor (segment, byte offset) is rewritten atomically on commit, and
+    fully read segments are deleted. A torn frame at the end of the last segment
+    (crash mid-append) is truncated away when the spool is reopened.
+    """
+
+    def __init__(self, directory=SPOOL_DIR, max_bytes=SPOOL_MAX_BYTES, segment_bytes=SPOOL_SEGMENT_BYTES,
+                 fsync=SPOOL_FSYNC):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self.segments = []  # [[sequence, size in bytes, record count], ...], oldest first
+        self.cursor = (None, 0, 0)  # (segment sequence, byte offset, records already read in it)
+        self.writer = None
+        self.appended = 0
+        self.committed = 0
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        self.recover()
+
+    def path(self, sequence):
+        return os.path.join(self.directory, f"{sequence:012d}{SEGMENT_SUFFIX}")
+
+    @staticmethod
+    def scan(path):
+        """(valid byte length, record count) of a segment file."""
+        offset = records = 0
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    break
+                length, crc = FRAME_HEADER.unpack(header)
+                data = f.read(length)
+                if len(data) < length or zlib.crc32(data) != crc:
+                    break
+                offset += FRAME_HEADER.size + length
+                records += 1
+        return offset, records
+
+    def recover(self):
+        sequences = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory)
+                           if name.endswith(SEGMENT_SUFFIX))
+        for sequence in sequences:
+            size, records = self.scan(self.path(sequence))
+            if os.path.getsize(self.path(sequence)) != size:
+                with open(self.path(sequence), 'r+b') as f:
+                    f.truncate(size)  # Drop the torn tail
+            self.segments.append([sequence, size, records])
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                sequence, offset, read = (int(value) for value in f.read().split())
+        except (OSError, ValueError):
+            sequence, offset, read = None, 0, 0
+        known = [segment[0] for segment in self.segments]
+        if sequence not in known:
+            # Cursor missing, or its segment was dropped while we were down: start at the oldest
+            sequence, offset, read = (known[0] if known else None), 0, 0
+        for segment in list(self.segments):
+            if sequence is not None and segment[0] < sequence:
+                self.remove_segment(segment)
+        self.cursor = (sequence, offset, read)
+
+    def total_bytes(self):
+        return sum(segment[1] for segment in self.segments)
+
+    def pending(self):
+        with self.lock:
+            return sum(segment[2] for segment in self.segments) - self.cursor[2]
+
+    def remove_segment(self, segment):
+        if self.writer is not None and self.segments and segment is self.segments[-1]:
+            self.writer.close()
+            self.writer = None
+        self.segments.remove(segment)
+        try:
+            os.remove(self.path(segment[0]))
+        except FileNotFoundError:
+            pass
+
+    def write_cursor(self):
+        temp = os.path.join(self.directory, CURSOR_FILE + '.tmp')
+        with open(temp, 'w') as f:
+            f.write('%s %d %d' % (self.cursor[0] if self.cursor[0] is not None else -1, self.cursor[1], self.cursor[2]))
+        os.replace(temp, os.path.join(self.directory, CURSOR_FILE))
+
+    def append(self, topic, message):
+        data = topic.encode('utf-8') + b'\n' + message.encode('utf-8')
+        frame = FRAME_HEADER.pack(len(data), zlib.crc32(data)) + data
+        with self.lock:
+            if len(frame) > self.max_bytes:
+                self.dropped += 1
+                return False
+            # Make room: drop whole oldest segments (and the records in them not read yet)
+            while self.segments and self.total_bytes() + len(frame) > self.max_bytes:
+                oldest = self.segments[0]
+                lost = oldest[2] - (self.cursor[2] if self.cursor[0] == oldest[0] else 0)
+                self.dropped += lost
+                self.remove_segment(oldest)
+                self.cursor = (self.segments[0][0] if self.segments else None, 0, 0)
+                self.write_cursor()
+                logging.warning(f"Spool full: dropped {lost} oldest messages")
+            if not self.segments or self.segments[-1][1] + len(frame) > self.segment_bytes:
+                sequence = self.segments[-1][0] + 1 if self.segments else 0
+                if self.writer is not None:
+                    self.writer.close()
+                    self.writer = None
+                self.segments.append([sequence, 0, 0])
+                current = self.segments[0]
+                if self.cursor[0] is None:
+                    self.cursor = (sequence, 0, 0)
+                elif len(self.segments) > 1 and self.cursor[0] == current[0] and self.cursor[2] >= current[2]:
+                    # Everything in the segment we just closed was delivered already
+                    self.remove_segment(current)
+                    self.cursor = (sequence, 0, 0)
+                    self.write_cursor()
+            head = self.segments[-1]
+            if self.writer is None:
+                self.writer = open(self.path(head[0]), 'ab')
+            self.writer.write(frame)
+            self.writer.flush()
+            if self.fsync:
+                os.fsync(self.writer.fileno())
+            head[1] += len(frame)
+            head[2] += 1
+            self.appended += 1
+            return True
+
+    def peek(self, limit):
+        """Up to `limit` records from the cursor on, as [(topic, message, position after it), ...]."""
+        with self.lock:
+            records = []
+            sequence, offset, read = self.cursor
+            for segment in self.segments:
+                if sequence is None or segment[0] < sequence:
+                    continue
+                if segment[0] > sequence:
+                    sequence, offset, read = segment[0], 0, 0
+                if read >= segment[2]:
+                    continue
+                with open(self.path(segment[0]), 'rb') as f:
+                    f.seek(offset)
+                    while read < segment[2] and len(records) < limit:
+                        length, _ = FRAME_HEADER.unpack(f.read(FRAME_HEADER.size))
+                        topic, _, message = f.read(length).partition(b'\n')
+                        offset += FRAME_HEADER.size + length
+                        read += 1
+                        records.append((topic.decode('utf-8'), message.decode('utf-8'), (sequence, offset, read)))
+                if len(records) >= limit:
+                    break
+            return records
+
+    def commit(self, position, count):
+        """Mark the `count` records up to `position` (from peek) as delivered.
+
+        append() may drop the oldest segments while a peeked batch is being sent
+        (spool full). A position in a segment that is gone, or behind the cursor
+        append() moved on, is stale: the cursor stays where it is.
+        """
+        with self.lock:
+            self.committed += count
+            if (position[0] not in [segment[0] for segment in self.segments]
+                    or (position[0], position[1]) <= (self.cursor[0], self.cursor[1])):
+                logging.warning("Spool commit skipped: its segment was dropped while the batch was sent")
+                return
+            for segment in list(self.segments):
+                if segment[0] < position[0]:
+                    self.remove_segment(segment)
+            self.cursor = position
+            current = self.segments[0]
+            if position[2] >= current[2] and len(self.segments) > 1:
+                # Read segment finished and a newer one exists
+                self.remove_segment(current)
+                self.cursor = (self.segments[0][0], 0, 0)
+            self.write_cursor()
+
+    def stats(self):
+        return {
+            'pending': self.pending(),
+            'bytes': self.total_bytes(),
+            'segments': len(self.segments),
+            'appended': self.appended,
+            'delivered': self.committed,
+            'dropped': self.dropped,
+        }
+
+
+class SpoolingPublisher:
+    """Publishes directly while online, spools while offline, drains on reconnect.
+
+    While the spool holds anything, new messages are appended behind it so the
+    backlog goes out in order. A background thread drains the spool in batches of
+    drain_batch, pacing itself to drain_rate messages/s so a reconnect doesn't
+    flood IoT Core (or the processors) with the whole outage at once.
+    """
+
+    def __init__(self, directory=SPOOL_DIR, client=None, drain_rate=SPOOL_DRAIN_RATE, drain_batch=SPOOL_DRAIN_BATCH,
+                 retry_seconds=SPOOL_RETRY_SECONDS, log=None, sleep=time.sleep, clock=time.monotonic):
+        self.directory = directory
+        self.client = client  # Set by mqtt_connect() after every (re)connect
+        self.drain_rate = drain_rate
+        self.drain_batch = drain_batch
+        self.retry_seconds = retry_seconds
+        self.log = log or (lambda message: None)
+        self.sleep = sleep
+        self.clock = clock
+        self.spool = None  # Opened on first use, so importing setup_mqtt doesn't touch the disk
+        self.wake = threading.Event()
+        self.worker = None
+        self.start_lock = threading.Lock()
+        self.offline_since = None
+        self.sent_direct = 0
+        self.drained = 0
+
+    def open(self):
+        with self.start_lock:
+            if self.spool is None:
+                self.spool = Spool(self.directory)
+                if self.spool.pending():
+                    self.log(f"Spool reopened with {self.spool.pending()} undelivered messages")
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name='spool-drainer', daemon=True)
+                self.worker.start()
+        return self.spool
+
+    def set_client(self, client):
+        self.client = client
+        self.wake.set()  # Reconnected: start draining now
+
+    def publish(self, topic, message):
+        """Send or spool one message. Returns True if it was sent now, False if spooled."""
+        spool = self.spool or self.open()
+        if self.client and not spool.pending():
+            try:
+                self.client.publish(topic, message, 1)
+                self.sent_direct += 1
+                self.offline_since = None
+                return True
+            except Exception as e:
+                if self.offline_since is None:
+                    self.offline_since = self.clock()
+                    self.log(f"Publish failed ({e}), spooling to disk until the connection is back")
+        spool.append(topic, message)
+        self.wake.set()
+        return False
+
+    def offline_seconds(self):
+        return 0.0 if self.offline_since is None else self.clock() - self.offline_since
+
+    def drain_once(self):
+        """Send one batch from the spool. Returns the number of messages delivered."""
+        if not self.client:
+            return 0
+        records = self.spool.peek(self.drain_batch)
+        delivered = 0
+        position = None
+        for topic, message, after in records:
+            try:
+                self.client.publish(topic, message, 1)
+            except Exception as e:
+                if self.offline_since is None:
+                    self.offline_since = self.clock()
+                logging.debug(f"Spool drain paused: {e}")
+                break
+            delivered += 1
+            position = after
+        if position is not None:
+            self.spool.commit(position, delivered)
+            self.drained += delivered
+        if delivered and delivered == len(records):
+            self.offline_since = None
+        return delivered
+
+    def run(self):
+        while True:
+            self.wake.wait(self.retry_seconds)
+            self.wake.clear()
+            while self.spool.pending():
+                started = self.clock()
+                delivered = self.drain_once()
+                if not delivered:
+                    break  # Still offline; try again on the next reconnect or retry tick
+                if not self.spool.pending():
+                    self.log(f"Spool drained: {json.dumps(self.stats())}")
+                self.sleep(max(0.0, delivered / self.drain_rate - (self.clock() - started)))
+
+    def stats(self):
+        stats = self.spool.stats() if self.spool else {}
+        stats.update({'sent_direct': self.sent_direct, 'drained': self.drained,
+                      'offline_seconds': round(self.offline_seconds(), 1)})
+        return stats
+
@@ -0,0 +1,149 @@
+import logging
+import random
+import threading
+import time
+
+import boto3
+
+DEFAULT_TTL_SECONDS = 60
+RETRY_SECONDS = 5  # After a failed refresh the last known value is served this long before trying again
+GET_PARAMETERS_LIMIT = 10  # SSM GetParameters accepts at most 10 names per call
+
+
+class ParameterCache:
+    """TTL cache in front of SSM Parameter Store, shared by everything in one process.
+
+    - get() answers from memory while a value is fresh. Once it expires the value
+      is refetched (or, with the background refresher running, the stale value
+      is served while the refresher catches up).
+    - If SSM can't be reached the last known value is used (and kept for
+      RETRY_SECONDS before the next attempt), and the default only when a
+      parameter was never fetched.
+    - load_path() pulls a whole hierarchy (e.g. /iot-settings) with paginated
+      GetParametersByPath, so N settings cost one call instead of N.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, client=None, clock=time.monotonic):
+        self.ttl = ttl
+        self.client = client
+        self.clock = clock
+        self.values = {}   # name -> value
+        self.expires = {}  # name -> clock time the value goes stale
+        self.paths = set()  # hierarchies loaded with load_path, refreshed in bulk
+        self.lock = threading.Lock()
+        self.refresher = None
+        self.stop_event = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def ssm(self):
+        if self.client is None:
+            self.client = boto3.client('ssm')
+        return self.client
+
+    def store(self, name, value):
+        # Spread expiry a little so a fleet of processes doesn't refresh in lockstep
+        with self.lock:
+            self.values[name] = value
+            self.expires[name] = self.clock() + self.ttl * random.uniform(0.9, 1.1)
+
+    def get(self, name, default=None):
+        now = self.clock()
+        with self.lock:
+            value = self.values.get(name)
+            fresh = name in self.values and now < self.expires[name]
+            background = self.refresher is not None and self.refresher.is_alive()
+        if fresh or (background and name in self.values):
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        try:
+            response = self.ssm().get_parameter(Name=name, WithDecryption=False)
+            value = response['Parameter']['Value']
+            self.store(name, value)
+            return value
+        except Exception as e:
+            self.errors += 1
+            with self.lock:
+                if name in self.values:
+                    # Back off rather than calling SSM again on every get() while it is unreachable/throttling
+                    self.expires[name] = self.clock() + min(self.ttl, RETRY_SECONDS)
+                    logging.warning(f"⚠️ Failed to refresh {name}, using last known value: {e}")
+                    return self.values[name]
+            logging.warning(f"⚠️ Failed to fetch {name}, using default {default}: {e}")
+            return default
+
+    def get_int(self, name, default):
+        value = self.get(name, default)
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return default
+
+    def prefetch(self, names):
+        """Fetch several parameters with batched GetParameters calls."""
+        names = list(names)
+        for start in range(0, len(names), GET_PARAMETERS_LIMIT):
+            response = self.ssm().get_parameters(Names=names[start:start + GET_PARAMETERS_LIMIT], WithDecryption=False)
+            for parameter in response.get('Parameters', []):
+                self.store(parameter['Name'], parameter['Value'])
+
+    def load_path(self, path):
+        """Fetch every parameter under a path (paginated) and keep the path for bulk refreshes."""
+        values = {}
+        kwargs = {'Path': path, 'Recursive': True, 'WithDecryption': False}
+        while True:
+            response = self.ssm().get_parameters_by_path(**kwargs)
+            for parameter in response.get('Parameters', []):
+                values[parameter['Name']] = parameter['Value']
+                self.store(parameter['Name'], parameter['Value'])
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+        with self.lock:
+            self.paths.add(path)
+        return values
+
+    def refresh(self):
+        """Refresh every cached parameter: whole paths in bulk, the rest with GetParameters."""
+        with self.lock:
+            paths = set(self.paths)
+            names = set(self.values)
+        for path in paths:
+            try:
+                names -= set(self.load_path(path))
+            except Exception as e:
+                self.errors += 1
+                logging.warning(f"⚠️ Background refresh of {path} failed, keeping last known values: {e}")
+        if names:
+            try:
+                self.prefetch(sorted(names))
+            except Exception as e:
+                self.errors += 1
+                logging.warning(f"⚠️ Background refresh failed, keeping last known values: {e}")
+
+    def start_background_refresh(self, interval=None):
+        """Refresh the cache from a daemon thread so get() never waits on SSM."""
+        if self.refresher is not None and self.refresher.is_alive():
+            return
+        interval = interval or self.ttl * 0.8
+
+        def run():
+            while not self.stop_event.wait(interval * random.uniform(0.9, 1.1)):
+                self.refresh()
+
+        self.stop_event.clear()
+        self.refresher = threading.Thread(target=run, name='ssm-config-refresh', daemon=True)
+        self.refresher.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'errors': self.errors, 'cached': len(self.values)}
+
+
+# One cache per process; every transmitter (or simulated device) in the process shares it
+parameter_cache = ParameterCache()
@@ -1,6 +1,8 @@
 # app.py
 from flask import Flask, jsonify
 import boto3
+from gps_bucket_decoder import expand_items
+from last_known import latest_per_animal
 
 app = Flask(__name__)
 
@@ -13,7 +15,17 @@ table = dynamodb.Table('GpsDataTable')
 def get_gps_data():
     try:
         response = table.scan()  # Fetch all items from the table
-        return jsonify(response['Items'])
+        # Bucketed GPS items are decoded back into one entry per fix
+        return jsonify(list(expand_items(response['Items'])))
+    except Exception as e:
+        return jsonify({'error': str(e)})
+
+# Current position of every elk (last known value, with Stale past the heartbeat window)
+@app.route('/gps-latest', methods=['GET'])
+def get_gps_latest():
+    try:
+        response = table.scan()
+        return jsonify(latest_per_animal(expand_items(response['Items'])))
     except Exception as e:
         return jsonify({'error': str(e)})
 
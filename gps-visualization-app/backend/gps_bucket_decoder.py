@@ -0,0 +1,37 @@
+# Decoder for the bucketed GPS layout written by GPSTopicProcessor when
+# GPS_STORAGE_MODE=bucketed. The chunk codec is the Lambdas' own (CDK/lib/lambda/gps_bucket_codec.py).
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'CDK', 'lib', 'lambda'))
+from gps_bucket_codec import LAYOUT, decode_chunk
+
+
+def decode_bucket(item):
+    """Expand one bucket item into per-fix dicts shaped like the per-fix items."""
+    bucket_start = int(item['BucketStart'])
+    fixes = []
+    for chunk in item.get('Chunks', []):
+        fixes.extend(decode_chunk(chunk, bucket_start))
+    fixes.sort()
+    return [
+        {
+            'SensorId': item['SensorId'],
+            'ElkId': item['SensorId'],
+            'Topic': item.get('Topic'),
+            'Timestamp': datetime.fromtimestamp(t, tz=timezone.utc).replace(tzinfo=None).isoformat(),
+            'Latitude': lat,
+            'Longitude': lon,
+        }
+        for t, lat, lon in fixes
+    ]
+
+
+def expand_items(items):
+    """Pass per-fix items through, expand bucket items and skip the processors' dedup markers."""
+    for item in items:
+        if item.get('Layout') == LAYOUT:
+            yield from decode_bucket(item)
+        elif 'Latitude' in item:
+            yield item
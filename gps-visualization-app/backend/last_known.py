@@ -0,0 +1,56 @@
+# "Last known value" view over change-only GPS data. With edge dead-banding on
+# (GPS_DEADBAND_METERS, see IoTMockSensors/common/deadband.py) a resting elk is only
+# stored when it moves or its heartbeat is due, so its current position is its latest
+# stored fix. Items carry ValidFor (seconds); past Timestamp + ValidFor with nothing
+# newer the collar has gone quiet and the position is reported as stale.
+from datetime import datetime, timedelta
+
+
+def parse_time(value):
+    return datetime.fromisoformat(str(value).replace('Z', ''))
+
+
+def latest_per_animal(items, now=None):
+    """One entry per elk: its latest fix, with Stale set when the fix is past ValidFor."""
+    now = now or datetime.utcnow()
+    latest = {}
+    for item in items:
+        elk = item.get('ElkId', item.get('SensorId'))
+        if elk not in latest or parse_time(item['Timestamp']) > parse_time(latest[elk]['Timestamp']):
+            latest[elk] = item
+    result = []
+    for elk, item in latest.items():
+        entry = dict(item)
+        valid_for = item.get('ValidFor')
+        entry['Stale'] = (valid_for is not None
+                          and now > parse_time(item['Timestamp']) + timedelta(seconds=float(valid_for)))
+        result.append(entry)
+    return result
+
+
+def fill_forward(items, times):
+    """Each elk's last known fix at each of `times` (datetimes), for a time-aligned track.
+
+    Instants before an elk's first fix, or past its fix's ValidFor, are left out.
+    """
+    tracks = {}
+    for item in items:
+        tracks.setdefault(item.get('ElkId', item.get('SensorId')), []).append((parse_time(item['Timestamp']), item))
+    filled = []
+    for elk, fixes in tracks.items():
+        fixes.sort(key=lambda fix: fix[0])
+        position = 0
+        for at in sorted(times):
+            while position + 1 < len(fixes) and fixes[position + 1][0] <= at:
+                position += 1
+            fixed_at, item = fixes[position]
+            if fixed_at > at:
+                continue
+            valid_for = item.get('ValidFor')
+            if valid_for is not None and at > fixed_at + timedelta(seconds=float(valid_for)):
+                continue
+            entry = dict(item)
+            entry['Timestamp'] = at.isoformat()
+            entry['FixTimestamp'] = item['Timestamp']
+            filled.append(entry)
+    return filled
@@ -1,31 +1,233 @@
-import boto3
-from decimal import Decimal
+import argparse
+import gzip
 import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Shares the item conversion and typed columns of the ETL jobs (bucketed GPS items are
+# expanded to one row per fix, bookkeeping items dropped)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CDK', 'lib', 'scripts'))
+from incremental_export import record_item
+from parquet_output import TABLE_COLUMNS, arrow_schema, table_rows
+
+# Exports a whole table with a parallel scan: TotalSegments segments, each paginated to
+# the end by a worker thread. Reads are paced by an adaptive limit on consumed read
+# capacity: it grows while the table keeps up and halves when DynamoDB throttles.
+# Rows are streamed to the output as they arrive (bounded queue, fixed-size Parquet row
+# groups), so memory doesn't grow with the table.
+#
+#   python gps_data_loader.py                                        (GpsDataTable -> gps_data.ndjson)
+#   python gps_data_loader.py --table hea --format parquet --output hea.parquet --segments 16 --max-rcu 2000
+TABLES = {'gps': 'GpsDataTable', 'env': 'EnvDataTable', 'hea': 'HeaDataTable'}
+THROTTLING_ERRORS = {'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded'}
+QUEUE_PAGES = 32  # Pages waiting for the writer; workers block when it is full
+ROW_GROUP_ROWS = 100_000
+MAX_RETRIES = 8
+
+
+class AdaptiveRateLimiter:
+    """Read capacity budget shared by the scan workers (additive increase, multiplicative decrease).
+
+    Pages are paid for after the fact with their ConsumedCapacity; a worker waits
+    before its next request until the budget is out of debt.
+    """
+
+    def __init__(self, rate, max_rate, min_rate=1.0, increase=0.05, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase  # Fraction of max_rate added per unthrottled second
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = 0.0
+        self.updated = clock()
+        self.lock = threading.Lock()
+        self.consumed = 0.0
+        self.throttles = 0
+
+    def refill(self):
+        now = self.clock()
+        elapsed = now - self.updated
+        self.updated = now
+        self.tokens = min(self.tokens + elapsed * self.rate, self.rate)  # At most one second of burst
+        self.rate = min(self.max_rate, self.rate + elapsed * self.increase * self.max_rate)
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 0:
+                    return
+                wait = -self.tokens / self.rate
+            self.sleep(wait)
+
+    def consume(self, units):
+        with self.lock:
+            self.tokens -= units
+            self.consumed += units
+
+    def throttled(self):
+        with self.lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class NdjsonWriter:
+    def __init__(self, path, columns):
+        self.names = [name for name, _ in columns] + ['dt']
+        self.file = gzip.open(path, 'wt', encoding='utf-8') if path.endswith('.gz') else open(path, 'w', encoding='utf-8')
+
+    def write(self, rows):
+        for row in rows:
+            record = dict(zip(self.names, row))
+            record['Timestamp'] = record['Timestamp'].isoformat()
+            self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """One Parquet file, written a row group at a time."""
+
+    def __init__(self, path, table_name, row_group_rows=ROW_GROUP_ROWS):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.schema = arrow_schema(table_name)
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='snappy')
+        self.row_group_rows = row_group_rows
+        self.buffer = []
+
+    def write(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_rows:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            columns = {field.name: [row[i] for row in self.buffer] for i, field in enumerate(self.schema)}
+            self.writer.write_table(self.pyarrow.Table.from_pydict(columns, schema=self.schema))
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def scan_segment(client, table_name, segment, segments, limiter, pages, page_items=None, stop=None, sleep=time.sleep):
+    """Scan one segment to its last page (or until stop is set), handing each page's rows to the writer."""
+    request = {'TableName': table_name, 'Segment': segment, 'TotalSegments': segments, 'ReturnConsumedCapacity': 'TOTAL'}
+    if page_items:
+        request['Limit'] = page_items
+    count = 0
+    while True:
+        for attempt in range(MAX_RETRIES):
+            limiter.acquire()
+            try:
+                response = client.scan(**request)
+                break
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in THROTTLING_ERRORS or attempt + 1 == MAX_RETRIES:
+                    raise
+                limiter.throttled()
+                sleep(min(0.05 * 2 ** attempt, 5.0))
+        limiter.consume(response.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+        rows = []
+        for image in response.get('Items', []):
+            item = record_item({'Item': image})
+            if item is not None:
+                rows.extend(table_rows(table_name, item))
+        pages.put((len(response.get('Items', [])), rows))  # Blocks while the writer is behind
+        count += 1
+        if 'LastEvaluatedKey' not in response or (stop is not None and stop.is_set()):
+            return count
+        request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def export_table(table_name, writer, segments=8, workers=None, max_rcu=1000.0, start_rcu=None, page_items=None,
+                 client=None, limiter=None):
+    """Scan the whole table into writer. Returns the run's numbers."""
+    client = client or boto3.client('dynamodb', config=Config(retries={'max_attempts': 2, 'mode': 'standard'}))
+    limiter = limiter or AdaptiveRateLimiter(start_rcu or max_rcu / 4, max_rcu)
+    pages = queue.Queue(maxsize=QUEUE_PAGES)
+    started = time.monotonic()
+    stop = threading.Event()
+    done = object()
+
+    def run_segment(segment):
+        try:
+            return scan_segment(client, table_name, segment, segments, limiter, pages, page_items, stop)
+        except BaseException:
+            stop.set()  # No point scanning the other segments of a failed export
+            raise
+        finally:
+            pages.put(done)
 
-# Initialize DynamoDB client
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table('GpsDataTable')
+    items = rows = finished = 0
+    with ThreadPoolExecutor(max_workers=workers or segments) as pool:
+        futures = [pool.submit(run_segment, segment) for segment in range(segments)]
+        try:
+            while finished < segments:
+                page = pages.get()
+                if page is done:
+                    finished += 1
+                    continue
+                items += page[0]
+                rows += len(page[1])
+                writer.write(page[1])
+        except BaseException:
+            stop.set()  # The writer failed: let the workers finish their current page and quit
+            while finished < segments:
+                finished += pages.get() is done
+            raise
+        page_count = sum(future.result() for future in futures)  # Re-raises a failed segment
+    writer.close()
 
-def get_gps_data():
-    # Scan the DynamoDB table (or use Query if partition/sort keys are known)
-    response = table.scan()
-    data = response.get('Items', [])
+    seconds = time.monotonic() - started
+    return {
+        'table': table_name,
+        'segments': segments,
+        'pages': page_count,
+        'items': items,
+        'rows': rows,
+        'consumed_rcu': round(limiter.consumed, 1),
+        'throttles': limiter.throttles,
+        'final_rcu_limit': round(limiter.rate, 1),
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(rows / seconds, 1) if seconds else 0,
+    }
 
-    gps_coordinates = []
 
-    # Extract GPS coordinates from the DynamoDB items
-    for item in data:
-        # Assuming each 'Data' field in DynamoDB contains 'lat' and 'lon'
-        for gps_data in item['Data']:  # If 'Data' contains the payload array
-            lat = float(gps_data['lat'])
-            lon = float(gps_data['lon'])
-            gps_coordinates.append([lat, lon])
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export a wildlife table with a parallel, rate-limited scan')
+    parser.add_argument('--table', choices=sorted(TABLES), default='gps')
+    parser.add_argument('--format', choices=['ndjson', 'parquet'], default='ndjson')
+    parser.add_argument('--output', help='output file (.ndjson, .ndjson.gz or .parquet); default <table>_data.<format>')
+    parser.add_argument('--segments', type=int, default=8, help='TotalSegments, one worker thread each')
+    parser.add_argument('--max-rcu', type=float, default=1000.0, help='ceiling for the read capacity used per second')
+    parser.add_argument('--page-items', type=int, help='items per Scan page (default: 1 MB pages)')
+    args = parser.parse_args(argv)
 
-    return gps_coordinates
+    table_name = TABLES[args.table]
+    output = args.output or f"{args.table}_data.{args.format}"
+    if args.format == 'parquet':
+        writer = ParquetWriter(output, table_name)
+    else:
+        writer = NdjsonWriter(output, TABLE_COLUMNS[table_name])
+    result = export_table(table_name, writer, segments=args.segments, max_rcu=args.max_rcu, page_items=args.page_items)
+    print(json.dumps(dict(result, output=output)))
 
-# Get GPS data from DynamoDB
-gps_data = get_gps_data()
 
-# Optionally, save to a file for debugging
-with open('gps_data.json', 'w') as f:
-    json.dump(gps_data, f, indent=4)
+if __name__ == '__main__':
+    main()